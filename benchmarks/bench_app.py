@@ -0,0 +1,325 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Замеры open_file / save_file / save_to_db / view_db для V1.1 и V2.1.
+# Приложение запускается без участия человека: диалоги подменяются заглушками,
+# каждая операция выполняется в отдельном процессе, а базу заметок для неё заранее
+# строит родительский процесс. RSS снимается прямо перед операцией, и отчёт показывает
+# пик за время операции и его прирост над этим уровнем. Без дисплея скрипт перезапускает
+# себя через xvfb-run.
+#
+#   python benchmarks/bench_app.py --sizes 1K,1M,64M --rows 10,10000,1000000
+#   python benchmarks/bench_app.py --sizes 1G --ops open_file --json results.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = {
+    'V1.1': os.path.join(ROOT, 'file_manager_V1.1.py'),
+    'V2.1': os.path.join(ROOT, 'file_manager V2.1.py'),
+}
+FILE_OPERATIONS = ('open_file', 'save_file', 'save_file_append')
+DB_OPERATIONS = ('save_to_db', 'view_db')
+NOTE_SIZE = 1024
+PUMP_TIMEOUT = 600
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+class FakeDialogs:
+    # Подменяет filedialog и messagebox: отвечает заранее заданными путями
+    # и ничего не показывает. Ошибки запоминаются, чтобы провалить замер
+    def __init__(self):
+        self.open_path = None
+        self.save_path = None
+        self.directory = None
+        self.errors = []
+
+    def askopenfilename(self, *args, **kwargs):
+        return self.open_path
+
+    def asksaveasfilename(self, *args, **kwargs):
+        return self.save_path
+
+    def askdirectory(self, *args, **kwargs):
+        return self.directory
+
+    def askyesno(self, *args, **kwargs):
+        return True
+
+    def showinfo(self, *args, **kwargs):
+        pass
+
+    def showwarning(self, *args, **kwargs):
+        pass
+
+    def showerror(self, *args, **kwargs):
+        self.errors.append(args)
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for unit in ('G', 'M', 'K'):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return str(size)
+
+
+def load_app(version):
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)  # приложения импортируют fm_common из своей папки
+    spec = importlib.util.spec_from_file_location('file_manager_' + version.replace('.', '_'), APPS[version])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_text_file(path, size):
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return
+    line = ("0123456789 abcdefghij klmnopqrst uvwxyz АБВГДЕЖЗИЙ " * 2)[:79] + "\n"
+    block = line * (1024 * 1024 // len(line.encode('utf-8')))
+    block_bytes = block.encode('utf-8')
+    with open(path, 'wb') as f:
+        written = 0
+        while written + len(block_bytes) <= size:
+            f.write(block_bytes)
+            written += len(block_bytes)
+        f.write(b'x' * (size - written))
+
+
+def make_notes_db(module, db_path, rows):
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    db = module.NotesDB(db_path)
+    body = ("note text " * (NOTE_SIZE // 10))[:NOTE_SIZE]
+    for start in range(0, rows, 5000):
+        notes = [(f"{i} {body}", module.note_hash(f"{i} {body}")) for i in range(start, min(rows, start + 5000))]
+        db.run(lambda conn: db.insert_notes(conn, notes))
+    db.close()
+
+
+def rss_mb():
+    # (текущий RSS, пиковый RSS) в МБ; текущий известен только на Linux
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['VmRSS'].split()[0]) / 1024, int(fields['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        pass
+    if resource is None:
+        return None, None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return None, peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def rss_baseline_mb():
+    # Уровень памяти перед операцией. На Linux пик сбрасывается до текущего RSS, чтобы
+    # после операции он относился только к ней; иначе прирост считается от пика процесса
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+    except OSError:
+        pass
+    current, peak = rss_mb()
+    return current if current is not None else peak
+
+
+def pump(root, until):
+    deadline = time.perf_counter() + PUMP_TIMEOUT
+    while not until():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('operation did not finish')
+        root.update()
+        time.sleep(0.001)
+
+
+def run_single(spec):
+    import tkinter as tk
+
+    version, op, param = spec['version'], spec['op'], spec['param']
+    module = load_app(version)
+    os.chdir(spec['workdir'])
+    with open('fm_config.json', 'w', encoding='utf-8') as f:
+        json.dump({'first_run': False, 'language': 'EN', 'theme': 'light'}, f)
+
+    dialogs = FakeDialogs()
+
+    class App(module.FileManagerApp):
+        filedialog = dialogs
+        messagebox = dialogs
+
+    root = tk.Tk()
+    root.geometry('800x600')
+    app = App(root)
+    pump(root, lambda: not app.startup_pending)  # база и прочая отложенная инициализация
+
+    def open_and_wait(path):
+        dialogs.open_path = path
+        app.open_file()
+        pump(root, lambda: not app.loading)
+
+    def wait_saved():
+        app.save_worker.wait_idle()
+        root.update()
+
+    result = {'version': version, 'op': op, 'param': param, 'bytes': 0, 'first_screen_ms': None}
+    if op == 'open_file':
+        dialogs.open_path = spec['file']
+        first = []
+        baseline = rss_baseline_mb()
+        start = time.perf_counter()
+        app.open_file()
+
+        def loaded():
+            if not first and (app.viewer is not None or app.text_area.compare('end-1c', '>', '1.0')):
+                first.append(time.perf_counter())
+            return first and not app.loading
+
+        pump(root, loaded)
+        elapsed = time.perf_counter() - start
+        result['first_screen_ms'] = (first[0] - start) * 1000
+        result['bytes'] = param
+    elif op in ('save_file', 'save_file_append'):
+        target = os.path.join(spec['workdir'], 'saved.txt')
+        shutil.copyfile(spec['file'], target)
+        open_and_wait(target)
+        if app.viewer is not None:
+            result['skipped'] = 'read-only viewer'
+            app.exit_app()
+            return result
+        if op == 'save_file':
+            app.text_area.insert('1.0', 'x')  # правка в начале - полная перезапись
+        else:
+            app.text_area.insert('end-1c', 'appended line\n')  # правка в конце - дописывание
+        baseline = rss_baseline_mb()
+        start = time.perf_counter()
+        app.save_file()
+        wait_saved()
+        elapsed = time.perf_counter() - start
+        result['bytes'] = os.path.getsize(target) if op == 'save_file' else len('appended line\n')
+    elif op == 'save_to_db':
+        note = ("benchmark note " * (NOTE_SIZE // 15))[:NOTE_SIZE]
+        app.text_area.insert('1.0', note)
+        baseline = rss_baseline_mb()
+        start = time.perf_counter()
+        app.save_to_db()
+        app.db.run(lambda conn: None)  # запись из очереди базы завершена
+        root.update()
+        elapsed = time.perf_counter() - start
+        result['bytes'] = NOTE_SIZE
+    elif op == 'view_db':
+        baseline = rss_baseline_mb()
+        start = time.perf_counter()
+        app.view_db()
+        root.update_idletasks()
+        root.update()
+        elapsed = time.perf_counter() - start
+    else:
+        raise ValueError(f"Unknown operation: {op}")
+
+    if dialogs.errors:
+        result['error'] = str(dialogs.errors[0])
+    result['ms'] = elapsed * 1000
+    result['mb_per_s'] = result['bytes'] / 2**20 / elapsed if result['bytes'] and elapsed else None
+    result['peak_rss_mb'] = rss_mb()[1]
+    if baseline is not None and result['peak_rss_mb'] is not None:
+        result['rss_increase_mb'] = max(0.0, result['peak_rss_mb'] - baseline)
+    app.exit_app()
+    return result
+
+
+def ensure_display(argv):
+    # Без X-сервера перезапускаемся под xvfb-run (если он есть)
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY') and not os.environ.get('FM_BENCH_XVFB'):
+        xvfb = shutil.which('xvfb-run')
+        if xvfb is None:
+            sys.exit('No DISPLAY and xvfb-run not found: run under Xvfb or a desktop session')
+        env = dict(os.environ, FM_BENCH_XVFB='1')
+        sys.exit(subprocess.call([xvfb, '-a', sys.executable, os.path.abspath(__file__)] + argv, env=env))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark file manager operations headlessly')
+    parser.add_argument('--versions', default='V1.1,V2.1')
+    parser.add_argument('--ops', default=','.join(FILE_OPERATIONS + DB_OPERATIONS))
+    parser.add_argument('--sizes', default='1K,1M,16M', help='file sizes, e.g. 1K,1M,1G')
+    parser.add_argument('--rows', default='10,10000', help='notes.db sizes, e.g. 10,100000,1000000')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'fm_bench_data'))
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(json.loads(args.single))))
+        return 0
+
+    ensure_display(sys.argv[1:])
+    os.makedirs(args.data_dir, exist_ok=True)
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    rows = [int(r) for r in args.rows.split(',')]
+    ops = args.ops.split(',')
+
+    results = []
+    print(f"{'version':<8} {'operation':<17} {'param':>9} {'ms':>10} {'first ms':>9} {'MB/s':>9} {'RSS MB':>8} {'+RSS MB':>8}")
+    for version in args.versions.split(','):
+        for op in ops:
+            if op in DB_OPERATIONS:
+                if version == 'V2.1':
+                    continue  # в V2.1 нет базы заметок
+                params = rows
+            else:
+                params = sizes
+            for param in params:
+                spec = {'version': version, 'op': op, 'param': param, 'workdir': tempfile.mkdtemp(prefix='fm_bench_')}
+                if op in FILE_OPERATIONS:
+                    spec['file'] = os.path.join(args.data_dir, f"file_{param}.txt")
+                    make_text_file(spec['file'], param)
+                else:
+                    # База строится здесь: в процессе замера она раздула бы его RSS
+                    make_notes_db(load_app(version), os.path.join(spec['workdir'], 'notes_data', 'notes.db'), param)
+                try:
+                    proc = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), '--single', json.dumps(spec)],
+                        capture_output=True, text=True
+                    )
+                finally:
+                    shutil.rmtree(spec['workdir'], ignore_errors=True)
+                if proc.returncode != 0:
+                    result = {'version': version, 'op': op, 'param': param, 'error': proc.stderr.strip().splitlines()[-1:]}
+                else:
+                    result = json.loads(proc.stdout.strip().splitlines()[-1])
+                results.append(result)
+                label = format_size(param) if op in FILE_OPERATIONS else f"{param} rows"
+                if 'error' in result or 'skipped' in result:
+                    print(f"{version:<8} {op:<17} {label:>9} {result.get('error') or result.get('skipped')}")
+                    continue
+                first = f"{result['first_screen_ms']:.1f}" if result.get('first_screen_ms') is not None else '-'
+                speed = f"{result['mb_per_s']:.1f}" if result.get('mb_per_s') else '-'
+                rss = f"{result['peak_rss_mb']:.1f}" if result.get('peak_rss_mb') is not None else '-'
+                increase = f"{result['rss_increase_mb']:.1f}" if result.get('rss_increase_mb') is not None else '-'
+                print(f"{version:<8} {op:<17} {label:>9} {result['ms']:10.1f} {first:>9} {speed:>9} {rss:>8} {increase:>8}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import importlib.util
+
+# Сравнение режимов хранения заметок: размер notes.db и скорость записи/чтения.
+# Запуск: python benchmarks/bench_note_compression.py --notes 20000
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'file_manager_V1.1.py')
+
+WORDS = (
+    "заметка файл строка ошибка журнал сервер запрос ответ время данные "
+    "note file line error log server request response time data user "
+    "config backup report status value result start stop retry timeout"
+).split()
+
+
+def load_app():
+    if os.path.dirname(APP_PATH) not in sys.path:
+        sys.path.insert(0, os.path.dirname(APP_PATH))  # приложение импортирует fm_common из своей папки
+    spec = importlib.util.spec_from_file_location('file_manager_v11', APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_notes(count, seed=1):
+    # Смесь похожих на журналы заметок, обычного текста, коротких записей и дубликатов
+    rng = random.Random(seed)
+    notes = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.1 and notes:
+            notes.append(rng.choice(notes))
+        elif kind < 0.4:
+            lines = rng.randint(20, 400)
+            notes.append(''.join(
+                f"2024-05-{rng.randint(1, 28):02d} 12:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} "
+                f"[{rng.choice(('INFO', 'WARN', 'ERROR'))}] {rng.choice(WORDS)} {rng.choice(WORDS)} id={rng.randint(1, 10**6)}\n"
+                for _ in range(lines)
+            ))
+        elif kind < 0.8:
+            notes.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(100, 3000))))
+        else:
+            notes.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 30))))
+    return notes
+
+
+def bench(app, codec, notes, batch_size):
+    folder = tempfile.mkdtemp(prefix=f'fm_bench_{codec}_')
+    path = os.path.join(folder, 'notes.db')
+    db = app.NotesDB(path, codec)
+    raw_bytes = sum(len(n.encode('utf-8')) for n in notes)
+
+    start = time.perf_counter()
+    for batch in app.batched(notes, batch_size):
+        rows = [(n, app.note_hash(n)) for n in batch]
+        db.run(lambda conn: db._insert_unique(conn, rows))
+    write_time = time.perf_counter() - start
+    db.reader.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    start = time.perf_counter()
+    read_bytes = 0
+    last_id = 0
+    while True:
+        rows = db.query(app.SQL_EXPORT_PAGE, (last_id, app.EXPORT_PAGE_SIZE)).fetchall()
+        if not rows:
+            break
+        read_bytes += sum(len(content) for _, content in rows)
+        last_id = rows[-1][0]
+    read_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    db.query(app.SQL_NOTES_PAGE, (app.NOTE_PREVIEW_CHARS, 0, app.NOTES_PAGE_SIZE)).fetchall()
+    page_time = time.perf_counter() - start
+
+    db.close()
+    size = os.path.getsize(path)
+    shutil.rmtree(folder, ignore_errors=True)
+    return {
+        'codec': codec,
+        'raw_mb': raw_bytes / 2**20,
+        'db_mb': size / 2**20,
+        'write_mbs': raw_bytes / 2**20 / write_time,
+        'read_mbs': raw_bytes / 2**20 / read_time,
+        'page_ms': page_time * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark note storage codecs')
+    parser.add_argument('--notes', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--codecs', default='none,zlib,lzma')
+    args = parser.parse_args()
+
+    app = load_app()
+    notes = make_notes(args.notes)
+    print(f"{'codec':<6} {'raw MB':>8} {'db MB':>8} {'saved':>7} {'write MB/s':>11} {'read MB/s':>10} {'page ms':>8}")
+    for codec in args.codecs.split(','):
+        r = bench(app, codec, notes, args.batch)
+        saved = 100 * (1 - r['db_mb'] / r['raw_mb'])
+        print(f"{r['codec']:<6} {r['raw_mb']:8.1f} {r['db_mb']:8.1f} {saved:6.1f}% "
+              f"{r['write_mbs']:11.1f} {r['read_mbs']:10.1f} {r['page_ms']:8.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
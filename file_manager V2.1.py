@@ -1,46 +1,141 @@
 import os
-import json
+import sys
+import argparse
+import queue
+import time
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk
 
+from fm_common import (
+    BUFFER_CACHE_MB, CONFIG_PATH, NEWLINES, SAVE_EXIT_TIMEOUT, UI_POLL_MS, UNDO_HISTORY_MB,
+    BufferCache, cli_transcode, ConfigStore, DirectoryPane, FileManagerBase, FindBar, OpStats,
+    SaveWorker, TextFormat, Translations,
+)
 
-class FileManagerApp:
-    def __init__(self, root):
+
+class FileManagerApp(FileManagerBase):
+    def __init__(self, root, profile_startup=False, instrument=False, stats_file=None):
         self.root = root
+        self.profile_startup = profile_startup
+        self.stats = OpStats() if instrument or stats_file else None
+        self.stats_file = stats_file  # куда записать замеры при выходе
+        self.load_started = None
+        self.load_size = 0
+        self.startup_started = time.perf_counter()
+        self.startup_phases = []
+        self.startup_pending = {'translations'}  # что ещё делается после первой отрисовки
         self.current_file = None
-        self.config = self.load_config()
-        self.translations = self.load_translations()
-        self.current_theme = self.config.get('theme', 'light')
-        self.language = self.config.get('language', 'RU')
+        self.modified = False
+        self.saved_path = None  # файл, с которым совпадает текст до метки saved_end
+        self.append_only = False  # правки были только после метки saved_end
+        self.text_format = TextFormat()  # кодировка и переводы строк файла в text_area
+        self.loading = False
+        self.load_cancel = None
+        self.load_queue = None
+        self.viewer = None
+        self.pending_line = None  # строка, к которой перейти, когда файл догрузится
+        self.find_window = None
+        self.document = None  # активная вкладка
+        self.journal = None  # журнал, в который сейчас пишутся правки text_area
+        self.journal_job = None
+        self.journal_lock = None  # открытый .lck этого процесса
+        self.history = None  # история правок активного документа; None - правки не записываются
+        self.history_job = None
+        self.tabs = {}  # имя виджета вкладки -> Document
+        self.ui_calls = queue.Queue()
+        self.save_worker = SaveWorker()
 
+        phase = time.perf_counter()
+        self.config = self.load_config()
+        self.record_phase('load_config', phase)
+        self.current_theme = self.config['theme']
+        self.language = self.config['language']
+        self.buffer_cache = BufferCache(self.config['buffer_cache_mb'] * 1024 * 1024)
+        phase = time.perf_counter()
+        self.translations = Translations(self.load_translations)
+        self.translations[self.language]  # активный язык нужен сразу
+        self.record_phase('translations', phase)
+        phase = time.perf_counter()
         self.setup_ui()
-        self.check_first_run()
+        self.record_phase('setup_ui', phase)
+        # Второй язык и приветствие - только после того, как окно отрисовано
+        self.root.bind('<Map>', self.on_first_map)
+
+    def after_first_paint(self):
+        self.startup_phases.append(('first_paint', (time.perf_counter() - self.startup_started) * 1000))
+        self.root.after_idle(self.preload_translations)
+        self.root.after_idle(self.check_first_run)
+        self.root.after_idle(self.offer_recovery)
 
     def load_config(self):
-        config_path = 'fm_config.json'
-        if os.path.exists(config_path):
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        # Изначальные настройки
-        return {'first_run': True, 'language': 'RU', 'theme': 'light', 'language_changed': False}
-
-    def save_config(self):
-        with open('fm_config.json', 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, ensure_ascii=False, indent=2)
-
-    def load_translations(self):
-        return {
-            'EN': {
+        # Изначальные настройки и допустимые значения
+        return ConfigStore(CONFIG_PATH, self.root, {
+            'first_run': (True, (True, False)),
+            'language': ('RU', ('RU', 'EN')),
+            'theme': ('light', ('light', 'dark')),
+            'buffer_cache_mb': (BUFFER_CACHE_MB, range(1, 64 * 1024)),
+            'undo_history_mb': (UNDO_HISTORY_MB, range(1, 64 * 1024)),
+            'persist_undo': (False, None),
+            'show_folders': (False, (True, False)),
+            'folders_root': ('', None),
+        })
+
+    def load_translations(self, language):
+        # Строится только запрошенный язык, остальные - по первому обращению
+        if language == 'EN':
+            return {
                 'title': 'File Manager',
                 'file': 'File',
                 'new': 'New',
                 'open': 'Open',
                 'save': 'Save',
+                'close_tab': 'Close tab',
+                'untitled': 'Untitled',
+                'find_in_files': 'Find in files',
+                'find': 'Find:',
+                'folder': 'Folder:',
+                'match_case': 'Match case',
+                'start_search': 'Search',
+                'searching': 'Searching',
+                'search_cancelled': 'Search cancelled.',
+                'found': 'Found',
+                'files_searched': 'Files searched',
+                'text': 'Text',
+                'dump_stats': 'Save performance stats',
+                'recover_prompt': 'Unsaved changes from the previous session were found ({count}). Restore them?',
+                'recover_failed': 'Cannot restore unsaved changes',
+                'undo': 'Undo',
+                'redo': 'Redo',
+                'rows': 'rows',
+                'find_replace': 'Find and replace',
+                'replace_with': 'Replace:',
+                'find_next': 'Next',
+                'find_prev': 'Previous',
+                'regex': 'Regex',
+                'replace': 'Replace',
+                'replace_all': 'Replace all',
+                'replaced': 'Replaced',
+                'no_matches': 'No matches',
+                'bad_pattern': 'Invalid pattern',
+                'open_folder': 'Open folder',
+                'folders': '📁 Folders',
+                'name': 'Name',
+                'size': 'Size',
                 'rename': 'Rename',
                 'delete': 'Delete',
                 'exit': 'Exit',
                 'theme': '🌓 Theme',
                 'language': '🌐 Language',
+                'loading': 'Loading',
+                'cancel': 'Cancel',
+                'load_cancelled': 'Loading cancelled.',
+                'mixed_newlines': 'The file mixes line endings; saving will convert them all to {}',
+                'read_only': 'Read only',
+                'line': 'Line',
+                'indexing': 'indexing',
+                'saving': 'Saving',
+                'saved': 'Saved',
+                'no_changes': 'No changes to save',
                 'tutorial_title': 'Tutorial',
                 'tutorial_text': (
                     "1. New file: Ctrl+N\n"
@@ -50,28 +145,69 @@ class FileManagerApp:
                     "5. Change language: Language button"
                 ),
                 'good_luck': 'Good luck!'
-            },
-            'RU': {
-                'title': 'Файловый менеджер',
-                'file': 'Файл',
-                'new': 'Новый',
-                'open': 'Открыть',
-                'save': 'Сохранить',
-                'rename': 'Переименовать',
-                'delete': 'Удалить',
-                'exit': 'Выход',
-                'theme': '🌓 Тема',
-                'language': '🌐 Язык',
-                'tutorial_title': 'Обучение',
-                'tutorial_text': (
-                    "1. Новый файл: Ctrl+N\n"
-                    "2. Открыть файл: Ctrl+O\n"
-                    "3. Сохранить файл: Ctrl+S\n"
-                    "4. Переключение темы: кнопка Тема\n"
-                    "5. Смена языка: кнопка Язык"
-                ),
-                'good_luck': 'Удачной работы!'
             }
+        return {
+            'title': 'Файловый менеджер',
+            'file': 'Файл',
+            'new': 'Новый',
+            'open': 'Открыть',
+            'save': 'Сохранить',
+            'close_tab': 'Закрыть вкладку',
+            'untitled': 'Без имени',
+            'find_in_files': 'Найти в файлах',
+            'find': 'Найти:',
+            'folder': 'Папка:',
+            'match_case': 'Учитывать регистр',
+            'start_search': 'Искать',
+            'searching': 'Поиск',
+            'search_cancelled': 'Поиск отменён.',
+            'found': 'Найдено',
+            'files_searched': 'Просмотрено файлов',
+            'text': 'Текст',
+            'dump_stats': 'Сохранить замеры',
+            'recover_prompt': 'Найдены несохранённые изменения прошлого сеанса ({count}). Восстановить?',
+            'recover_failed': 'Не удалось восстановить несохранённые изменения',
+            'undo': 'Отменить',
+            'redo': 'Повторить',
+            'rows': 'строк',
+            'find_replace': 'Найти и заменить',
+            'replace_with': 'Заменить:',
+            'find_next': 'Далее',
+            'find_prev': 'Назад',
+            'regex': 'Рег. выражение',
+            'replace': 'Заменить',
+            'replace_all': 'Заменить все',
+            'replaced': 'Заменено',
+            'no_matches': 'Совпадений нет',
+            'bad_pattern': 'Ошибка в выражении',
+            'open_folder': 'Открыть папку',
+            'folders': '📁 Папки',
+            'name': 'Имя',
+            'size': 'Размер',
+            'rename': 'Переименовать',
+            'delete': 'Удалить',
+            'exit': 'Выход',
+            'theme': '🌓 Тема',
+            'language': '🌐 Язык',
+            'loading': 'Загрузка',
+            'cancel': 'Отмена',
+            'load_cancelled': 'Загрузка отменена.',
+            'mixed_newlines': 'В файле разные переводы строк; при сохранении все станут {}',
+            'read_only': 'Только чтение',
+            'line': 'Строка',
+            'indexing': 'индексация',
+            'saving': 'Сохранение',
+            'saved': 'Сохранено',
+            'no_changes': 'Нет изменений',
+            'tutorial_title': 'Обучение',
+            'tutorial_text': (
+                "1. Новый файл: Ctrl+N\n"
+                "2. Открыть файл: Ctrl+O\n"
+                "3. Сохранить файл: Ctrl+S\n"
+                "4. Переключение темы: кнопка Тема\n"
+                "5. Смена языка: кнопка Язык"
+            ),
+            'good_luck': 'Удачной работы!'
         }
 
     def setup_ui(self):
@@ -80,37 +216,79 @@ class FileManagerApp:
 
         # Меню
         self.menu_bar = tk.Menu(self.root)
+        self.menu_labels = []  # (меню, индекс пункта, ключ перевода) для смены языка
         self.file_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(
             menu=self.file_menu,
             label=self.translations[self.language]['file']
         )
-        self.file_menu.add_command(
-            label=self.translations[self.language]['new'],
+        self.menu_labels.append((self.menu_bar, self.menu_bar.index(tk.END), 'file'))
+        self.add_menu_command(
+            self.file_menu, 'new',
             command=self.new_file,
             accelerator='Ctrl+N'
         )
-        self.file_menu.add_command(
-            label=self.translations[self.language]['open'],
+        self.add_menu_command(
+            self.file_menu, 'open',
             command=self.open_file,
             accelerator='Ctrl+O'
         )
-        self.file_menu.add_command(
-            label=self.translations[self.language]['save'],
+        self.add_menu_command(
+            self.file_menu, 'open_folder',
+            command=self.open_folder
+        )
+        self.add_menu_command(
+            self.file_menu, 'undo',
+            command=self.undo,
+            accelerator='Ctrl+Z'
+        )
+        self.add_menu_command(
+            self.file_menu, 'redo',
+            command=self.redo,
+            accelerator='Ctrl+Y'
+        )
+        self.add_menu_command(
+            self.file_menu, 'find_replace',
+            command=self.show_find_bar,
+            accelerator='Ctrl+F'
+        )
+        self.add_menu_command(
+            self.file_menu, 'find_in_files',
+            command=self.find_in_files,
+            accelerator='Ctrl+Shift+F'
+        )
+        self.add_menu_command(
+            self.file_menu, 'save',
             command=self.save_file,
             accelerator='Ctrl+S'
         )
+        self.add_menu_command(
+            self.file_menu, 'close_tab',
+            command=self.close_tab,
+            accelerator='Ctrl+W'
+        )
+        if self.stats is not None:
+            self.add_menu_command(
+                self.file_menu, 'dump_stats',
+                command=self.dump_stats
+            )
         self.file_menu.add_separator()
-        self.file_menu.add_command(
-            label=self.translations[self.language]['exit'],
-            command=self.root.quit
+        self.add_menu_command(
+            self.file_menu, 'exit',
+            command=self.exit_app
         )
         self.root.config(menu=self.menu_bar)
+        self.root.protocol('WM_DELETE_WINDOW', self.exit_app)
 
         # Горячие клавиши
         self.root.bind('<Control-n>', lambda e: self.new_file())
         self.root.bind('<Control-o>', lambda e: self.open_file())
         self.root.bind('<Control-s>', lambda e: self.save_file())
+        self.root.bind('<Control-w>', lambda e: self.close_tab())
+        self.root.bind('<Control-Shift-F>', lambda e: self.find_in_files())
+        self.root.bind('<Control-f>', self.show_find_bar)
+        self.root.bind('<F3>', lambda e: self.find_bar.find_next())
+        self.root.bind('<Shift-F3>', lambda e: self.find_bar.find_prev())
 
         # Панель инструментов
         self.toolbar = ttk.Frame(self.root)
@@ -124,130 +302,130 @@ class FileManagerApp:
             text=self.translations[self.language]['language'],
             command=self.toggle_language
         )
+        self.folders_btn = ttk.Button(
+            self.toolbar,
+            text=self.translations[self.language]['folders'],
+            command=self.toggle_folders
+        )
         self.theme_btn.pack(side=tk.LEFT, padx=5, pady=5)
         self.lang_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        self.folders_btn.pack(side=tk.LEFT, padx=5, pady=5)
         self.toolbar.pack(side=tk.TOP, fill=tk.X)
 
+        # Строка состояния (прогресс загрузки и т.п.)
+        self.status_bar = ttk.Frame(self.root)
+        self.status_label = ttk.Label(self.status_bar, text='')
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        self.progress = ttk.Progressbar(self.status_bar, mode='determinate', maximum=100, length=200)
+        self.cancel_btn = ttk.Button(
+            self.status_bar,
+            text=self.translations[self.language]['cancel'],
+            command=self.cancel_load
+        )
+        # Длительность последней операции (только с --instrument)
+        self.stats_label = ttk.Label(self.status_bar, text='')
+        if self.stats is not None:
+            self.stats_label.pack(side=tk.RIGHT, padx=5)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.widget_labels = [
+            (self.theme_btn, 'theme'), (self.lang_btn, 'language'), (self.folders_btn, 'folders'), (self.cancel_btn, 'cancel')
+        ]
+
+        # Слева панель папок (скрываемая), справа вкладки и текст
+        self.paned = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
+        self.dir_pane = DirectoryPane(self, self.paned)
+        self.editor = ttk.Frame(self.paned)
+        self.paned.add(self.editor, weight=3)
+        self.paned.pack(expand=True, fill=tk.BOTH)
+        if self.config['show_folders']:
+            self.show_folders()
+
+        # Вкладки документов
+        self.notebook = ttk.Notebook(self.editor)
+        self.notebook.enable_traversal()  # Ctrl+Tab / Ctrl+Shift+Tab
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        self.notebook.pack(side=tk.TOP, fill=tk.X)
+
         # Текстовое поле с прокруткой
-        self.text_area = tk.Text(self.root, wrap=tk.WORD)
-        self.scrollbar = ttk.Scrollbar(self.root, command=self.text_area.yview)
-        self.text_area.configure(yscrollcommand=self.scrollbar.set)
+        self.text_area = tk.Text(self.editor, wrap=tk.WORD)
+        self.scrollbar = ttk.Scrollbar(self.editor, command=self.text_area.yview)
+        self.text_area.configure(yscrollcommand=self.on_text_scroll)
+        # Все правки текста проходят через прокси: так видно, где именно правили
+        self.text_orig = self.text_area._w + '_orig'
+        self.root.tk.call('rename', self.text_area._w, self.text_orig)
+        self.root.tk.createcommand(self.text_area._w, self._text_proxy)
+        self.text_area.mark_set('saved_end', 1.0)
+        self.text_area.mark_gravity('saved_end', tk.LEFT)
+        self.text_area.bind('<<Modified>>', self.on_modified)
+        # Ctrl+F в tk.Text - сдвиг курсора; перехватываем до привязок класса
+        self.text_area.bind('<Control-f>', self.show_find_bar)
+        # Встроенная история tk.Text выключена (undo=False) - её место занимает EditHistory
+        self.text_area.bind('<<Undo>>', self.undo)
+        self.text_area.bind('<<Redo>>', self.redo)
+        self.text_area.bind('<Control-y>', self.redo)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.text_area.pack(expand=True, fill=tk.BOTH)
+        self.find_bar = FindBar(self, self.editor)
+        self.widget_labels.extend(self.find_bar.labels)
+        self.add_tab()
 
         self.apply_theme()
+        self.root.after(UI_POLL_MS, self.process_ui_calls)
 
-    def apply_theme(self):
-        if self.current_theme == 'dark':
-            bg = '#2d2d2d'
-            fg = 'white'
-            insertbackground = 'white'  # курсор
-        else:
-            bg = 'white'
-            fg = 'black'
-            insertbackground = 'black'
-        self.text_area.config(bg=bg, fg=fg, insertbackground=insertbackground)
-        style = ttk.Style()
-        style.theme_use('default')
-        style.configure('TButton', background=bg, foreground=fg)
-        style.configure('TFrame', background=bg)
-        self.toolbar.config(style='TFrame')
-
-    def check_first_run(self):
-        # Если сменили язык - не показываем сообщение
-        if self.config.get('language_changed', False):
-            self.config['language_changed'] = False
-            self.save_config()
-            return
-
-        if self.config.get('first_run', True):
-            messagebox.showinfo(
-                self.translations[self.language]['tutorial_title'],
-                self.translations[self.language]['tutorial_text']
-            )
-            self.config['first_run'] = False
-            self.save_config()
-        else:
-            messagebox.showinfo(
-                self.translations[self.language]['title'],
-                self.translations[self.language]['good_luck']
-            )
-
-    def new_file(self):
-        if self.confirm_discard_changes():
-            self.text_area.delete(1.0, tk.END)
-            self.current_file = None
-            self.root.title(self.translations[self.language]['title'])
-
-    def open_file(self):
-        if not self.confirm_discard_changes():
-            return
-        file_path = filedialog.askopenfilename()
-        if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                self.text_area.delete(1.0, tk.END)
-                self.text_area.insert(1.0, content)
-                self.current_file = file_path
-                self.root.title(f"{os.path.basename(file_path)} - {self.translations[self.language]['title']}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Cannot open file:\n{e}")
-
-    def save_file(self):
-        if self.current_file:
+    def exit_app(self):
+        # Не даём закрыть окно, пока фоновое сохранение не дописало файл
+        self.stop_loading()
+        self.close_viewer()
+        if self.find_window is not None and self.find_window.win.winfo_exists():
+            self.find_window.stop()
+        self.flush_journal()
+        for doc in self.tabs.values():
+            if not (self.modified if doc is self.document else doc.modified):
+                self.discard_journal(doc)
+            self.persist_history(doc)
+        self.save_worker.wait_idle(SAVE_EXIT_TIMEOUT)
+        if self.journal_lock is not None:
+            # Оставшиеся журналы без .lck - брошенные, их предложит восстановить следующий запуск
+            self.journal_lock.close()
             try:
-                content = self.text_area.get(1.0, tk.END)
-                with open(self.current_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                messagebox.showinfo(self.translations[self.language]['title'], "File saved.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Cannot save file:\n{e}")
-        else:
-            self.save_file_as()
-
-    def save_file_as(self):
-        file_path = filedialog.asksaveasfilename(
-            defaultextension='.txt',
-            filetypes=[('Text Files', '*.txt'), ('All Files', '*.*')]
-        )
-        if file_path:
+                os.remove(self.journal_lock.name)
+            except OSError:
+                pass
+        if self.stats_file:
             try:
-                content = self.text_area.get(1.0, tk.END)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                self.current_file = file_path
-                self.root.title(f"{os.path.basename(file_path)} - {self.translations[self.language]['title']}")
-                messagebox.showinfo(self.translations[self.language]['title'], "File saved.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Cannot save file:\n{e}")
-
-    def confirm_discard_changes(self):
-        # Можно расширить, чтобы проверять изменения, сейчас просто вопрос
-        return messagebox.askyesno(
-            self.translations[self.language]['title'],
-            "Discard current changes?" if self.language == 'EN' else "Отменить текущие изменения?"
-        )
+                self.stats.dump(self.stats_file)
+            except OSError as e:
+                print(f"Cannot save stats: {e}", file=sys.stderr)
+        self.flush_config()
+        self.root.destroy()
 
-    def toggle_theme(self):
-        self.current_theme = 'dark' if self.current_theme == 'light' else 'light'
-        self.config['theme'] = self.current_theme
-        self.save_config()
-        self.apply_theme()
 
-    def toggle_language(self):
-        self.language = 'EN' if self.language == 'RU' else 'RU'
-        self.config['language'] = self.language
-        self.config['language_changed'] = True
-        self.save_config()
-        # Перезапускаем приложение, чтобы обновить интерфейс
-        self.root.destroy()
-        root = tk.Tk()
-        FileManagerApp(root)
-        root.mainloop()
+def add_cli_commands(parser):
+    # Без команды запускается окно; с командой работа идёт без Tk и без дисплея
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    command = commands.add_parser('transcode', help='convert text files to another encoding or newline style')
+    command.add_argument('sources', nargs='+', metavar='SOURCE', help='file to convert, or - for stdin')
+    command.add_argument('-o', '--output', default='-', help='output file, or directory for several sources (default: stdout)')
+    command.add_argument('--to', default='utf-8', help='target encoding (default: utf-8)')
+    command.add_argument('--from', dest='source_encoding', help='source encoding (default: detected)')
+    command.add_argument('--bom', choices=('keep', 'yes', 'no'), default='keep')
+    command.add_argument('--newline', choices=tuple(NEWLINES), default='keep')
+    command.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='files converted in parallel')
+    command.set_defaults(run=cli_transcode)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='File manager')
+    parser.add_argument('--profile-startup', action='store_true', help='print time spent in each startup phase')
+    parser.add_argument('--instrument', action='store_true', help='time file and database operations')
+    parser.add_argument('--stats-file', help='write operation timings here on exit (.json or .csv); implies --instrument')
+    add_cli_commands(parser)
+    args = parser.parse_args()
+    if args.command is not None:
+        sys.exit(args.run(args))
     root = tk.Tk()
-    app = FileManagerApp(root)
+    app = FileManagerApp(
+        root, profile_startup=args.profile_startup, instrument=args.instrument, stats_file=args.stats_file
+    )
     root.mainloop()
@@ -1,60 +1,787 @@
 import os
+import sys
+import re
 import json
+import argparse
+import hashlib
+import zlib
+import lzma
+import unicodedata
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
+from itertools import islice
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, simpledialog
+from tkinter import ttk
 import sqlite3
 
-DB_FOLDER = "notes_data"
-DB_PATH = os.path.join(DB_FOLDER, "notes.db")
+from fm_common import (
+    BINARY_SNIFF_SIZE, BUFFER_CACHE_MB, CONFIG_PATH, DATA_FOLDER, NEWLINES, SAVE_EXIT_TIMEOUT,
+    UI_POLL_MS, UNDO_HISTORY_MB, BufferCache, cli_transcode, ConfigStore, DirectoryPane,
+    FileManagerBase, FindBar, OpStats, SaveWorker, TextFormat, Translations,
+)
 
-class FileManagerApp:
-    def __init__(self, root):
+DB_PATH = os.path.join(DATA_FOLDER, "notes.db")
+DB_BUSY_TIMEOUT = 5.0  # секунд ждать, пока другая копия приложения держит блокировку
+DB_STATEMENT_CACHE = 256  # подготовленных запросов на соединение
+
+# Запросы держим в константах: sqlite3 кэширует подготовленные выражения по тексту
+SQL_CREATE_NOTES = '''
+    CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content TEXT NOT NULL
+    )
+'''
+SQL_INSERT_NOTE = "INSERT INTO notes (content, content_hash, blob_hash) VALUES (?, ?, ?)"
+SQL_INSERT_BLOB = "INSERT OR IGNORE INTO note_blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)"
+SQL_HAS_BLOB = "SELECT 1 FROM note_blobs WHERE hash = ?"
+SQL_BLOB_STATS = "SELECT count(*), coalesce(sum(size), 0), coalesce(sum(length(data)), 0) FROM note_blobs"
+SQL_SCHEMA_VERSION = "PRAGMA user_version"
+SCHEMA_VERSION = 5
+SQL_HAS_FTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+# Версия 1: полнотекстовый индекс FTS5 поверх notes, синхронизируется триггерами.
+# rebuild заполняет индекс для уже существующих баз
+SQL_MIGRATE_FTS = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        content, content='notes', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, content) VALUES (new.id, new.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO notes_fts(rowid, content) VALUES (new.id, new.content);
+    END;
+    INSERT INTO notes_fts(notes_fts) VALUES ('rebuild');
+'''
+# Версия 2: хэш содержимого для быстрой проверки дубликатов при импорте
+SQL_MIGRATE_HASH = '''
+    ALTER TABLE notes ADD COLUMN content_hash TEXT;
+    UPDATE notes SET content_hash = note_hash(content);
+    CREATE INDEX IF NOT EXISTS notes_content_hash ON notes(content_hash);
+'''
+# Версия 3: сжатые тексты заметок хранятся один раз в note_blobs по хэшу,
+# notes.blob_hash ссылается на них (content тогда пустой)
+SQL_MIGRATE_BLOBS = '''
+    CREATE TABLE IF NOT EXISTS note_blobs (
+        hash TEXT PRIMARY KEY,
+        codec TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        data BLOB NOT NULL
+    );
+    ALTER TABLE notes ADD COLUMN blob_hash TEXT;
+'''
+# Текст заметки; сжатые распаковывает note_unpack. Функция есть только в соединениях
+# приложения, поэтому она встречается лишь в запросах, а схема (триггеры) обходится без неё
+# и база остаётся доступной обычному sqlite3
+SQL_NOTE_TEXT = "CASE WHEN n.blob_hash IS NULL THEN n.content ELSE note_unpack(b.codec, b.data) END"
+SQL_NOTES_JOIN = "FROM notes n LEFT JOIN note_blobs b ON b.hash = n.blob_hash"
+# Версия 4: базы версии 3 теряют представление notes_text, вызывавшее note_unpack
+SQL_DROP_NOTES_TEXT = "DROP VIEW IF EXISTS notes_text;"
+# Версия 5: FTS без своей копии текста (content=''), иначе сжатие заметок ничего бы
+# не экономило. Несжатые заметки индексируют триггеры, сжатые - insert_notes сам.
+# Команде 'delete' нужен прежний текст, а у сжатой заметки его знает только note_unpack,
+# поэтому удалённые и изменённые в обход приложения сжатые заметки остаются в индексе
+# лишними словами: поиск соединяет найденное с notes и удалённые id отбрасывает
+SQL_MIGRATE_FTS_CONTENTLESS = f'''
+    DROP TRIGGER IF EXISTS notes_fts_insert;
+    DROP TRIGGER IF EXISTS notes_fts_delete;
+    DROP TRIGGER IF EXISTS notes_fts_update;
+    DROP TABLE IF EXISTS notes_fts;
+    CREATE VIRTUAL TABLE notes_fts USING fts5(content, content='', tokenize='unicode61 remove_diacritics 2');
+    CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes WHEN new.blob_hash IS NULL BEGIN
+        INSERT INTO notes_fts(rowid, content) VALUES (new.id, new.content);
+    END;
+    CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes WHEN old.blob_hash IS NULL BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END;
+    CREATE TRIGGER notes_fts_update AFTER UPDATE OF content, blob_hash ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content) SELECT 'delete', old.id, old.content WHERE old.blob_hash IS NULL;
+        INSERT INTO notes_fts(rowid, content) SELECT new.id, new.content WHERE new.blob_hash IS NULL;
+    END;
+    INSERT INTO notes_fts(rowid, content) SELECT n.id, {SQL_NOTE_TEXT} {SQL_NOTES_JOIN};
+'''
+SQL_INDEX_NOTE = "INSERT INTO notes_fts(rowid, content) VALUES (?, ?)"
+SQL_KNOWN_HASHES = "SELECT content_hash FROM notes WHERE content_hash IN ({})"
+SQL_EXPORT_PAGE = f"SELECT n.id, {SQL_NOTE_TEXT} {SQL_NOTES_JOIN} WHERE n.id > ? ORDER BY n.id LIMIT ?"
+# Текст найденных заметок читается из notes: индекс его не хранит
+SQL_SEARCH_NOTES = (
+    f"SELECT n.id, {SQL_NOTE_TEXT} "
+    "FROM (SELECT rowid, rank FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank LIMIT ?) f "
+    "JOIN notes n ON n.id = f.rowid LEFT JOIN note_blobs b ON b.hash = n.blob_hash ORDER BY f.rank"
+)
+SQL_SEARCH_NOTES_LIKE = (
+    f"SELECT id, substr(content, 1, ?) FROM (SELECT n.id AS id, {SQL_NOTE_TEXT} AS content {SQL_NOTES_JOIN}) "
+    "WHERE content LIKE ? ESCAPE '\\' ORDER BY id LIMIT ?"
+)
+SQL_ANY_NOTE = "SELECT 1 FROM notes LIMIT 1"
+# Для списка сжатые заметки распаковываются только на длину превью
+SQL_NOTES_PAGE = (
+    "SELECT n.id, CASE WHEN n.blob_hash IS NULL THEN substr(n.content, 1, ?1) "
+    f"ELSE note_preview(b.codec, b.data, ?1) END {SQL_NOTES_JOIN} "
+    "WHERE n.id > ?2 ORDER BY n.id LIMIT ?3"
+)
+SQL_NOTE_CONTENT = f"SELECT {SQL_NOTE_TEXT} {SQL_NOTES_JOIN} WHERE n.id = ?"
+
+# Окно просмотра заметок
+NOTES_PAGE_SIZE = 200
+NOTE_PREVIEW_CHARS = 80
+NOTES_PREFETCH_AT = 0.9  # подгружать следующую страницу, когда список прокручен на 90%
+SEARCH_LIMIT = 500  # лучших результатов поиска
+SEARCH_SNIPPET_TOKENS = 12
+SEARCH_DEBOUNCE_MS = 250
+
+# Массовый импорт и экспорт заметок
+IMPORT_BATCH_SIZE = 2000  # файлов на одну транзакцию
+IMPORT_JOBS = 8  # потоков чтения файлов
+SQL_VARS_LIMIT = 500  # параметров в одном запросе IN (...)
+EXPORT_PAGE_SIZE = 500
+
+# Сжатие текстов заметок: 'none', 'zlib' или 'lzma' (настройка notes_compression)
+NOTE_CODECS = ('none', 'zlib', 'lzma')
+DEFAULT_NOTE_CODEC = 'zlib'
+COMPRESS_MIN_CHARS = 512  # короткие заметки сжимать невыгодно
+ZLIB_LEVEL = 6
+LZMA_PRESET = 6
+
+
+def note_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def pack_note(codec, content):
+    raw = content.encode('utf-8')
+    if codec == 'zlib':
+        return zlib.compress(raw, ZLIB_LEVEL)
+    if codec == 'lzma':
+        return lzma.compress(raw, preset=LZMA_PRESET)
+    raise ValueError(f"Unknown note codec: {codec}")
+
+
+def unpack_note(codec, data):
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    if codec == 'lzma':
+        return lzma.decompress(data).decode('utf-8')
+    raise ValueError(f"Unknown note codec: {codec}")
+
+
+def unpack_preview(codec, data, chars):
+    # Распаковываем только начало - на символ UTF-8 не больше 4 байт
+    if codec == 'zlib':
+        raw = zlib.decompressobj().decompress(data, chars * 4)
+    elif codec == 'lzma':
+        raw = lzma.LZMADecompressor().decompress(data, chars * 4)
+    else:
+        raise ValueError(f"Unknown note codec: {codec}")
+    return raw.decode('utf-8', errors='ignore')[:chars]
+
+
+def run_script(conn, script):
+    # Выражения скрипта по одному: executescript сначала фиксирует открытую транзакцию,
+    # а миграция должна пройти целиком в одной. Точка с запятой внутри строк и триггеров
+    # не разрывает выражение - его конец определяет sqlite3.complete_statement
+    statement = ''
+    for part in script.split(';'):
+        statement += part + ';'
+        if sqlite3.complete_statement(statement):
+            if statement.strip(' \n;'):
+                conn.execute(statement)
+            statement = ''
+
+
+# Слово для токенизатора unicode61: буквы и цифры, подчёркивание - разделитель
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def fold_word(word):
+    # Слово так, как его сравнивает unicode61 remove_diacritics 2: без регистра и без
+    # диакритики у латинских букв (кириллические й и ё он оставляет как есть)
+    word = word.lower()
+    if word.isascii():
+        return word
+    return ''.join(
+        base if base.isascii() else ch
+        for ch, base in ((ch, unicodedata.normalize('NFD', ch)[0]) for ch in word)
+    )
+
+
+def note_snippet(text, words, size=SEARCH_SNIPPET_TOKENS):
+    # Фрагмент заметки вокруг первого найденного слова, найденные слова в «», обрезанные
+    # края - «…». Индекс FTS текст не хранит и snippet() не построит, поэтому фрагмент
+    # собирается из самой заметки. words - слова запроса после fold_word; последнее,
+    # как и в MATCH, ищется и как префикс
+    def found(token):
+        token = fold_word(token)
+        return token in words or (bool(words) and token.startswith(words[-1]))
+
+    tokens = []
+    begin = 0
+    end = None
+    more = False
+    for token in WORD_RE.finditer(text):
+        if end is not None and len(tokens) >= end:
+            more = True  # дальше заметку не разбираем
+            break
+        tokens.append(token)
+        if end is None and found(token.group()):
+            begin = max(0, len(tokens) - 1 - size // 4)  # немного текста перед словом
+            end = begin + size
+    window = tokens[begin:begin + size]
+    if not window:
+        return text[:NOTE_PREVIEW_CHARS]
+    parts = ['…'] if begin else []
+    position = window[0].start()
+    for token in window:
+        parts.append(text[position:token.start()])
+        parts.append(f"«{token.group()}»" if found(token.group()) else token.group())
+        position = token.end()
+    if more or len(tokens) > begin + size:
+        parts.append('…')
+    return ''.join(parts)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_files(folder):
+    # Обход дерева через os.scandir без построения полного списка файлов
+    stack = [folder]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+        except OSError:
+            continue
+
+
+def read_note_file(path):
+    # (содержимое, хэш) текстового файла или None для двоичных и нечитаемых
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return parse_note(data)
+
+
+def parse_note(data):
+    if b'\0' in data[:BINARY_SNIFF_SIZE]:
+        return None
+    try:
+        content = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    if not content.strip():
+        return None
+    return content, note_hash(content)
+
+
+class NotesDB:
+    # Общий доступ к базе заметок. Чтение идёт через одно долгоживущее
+    # соединение в потоке интерфейса, запись - через отдельный поток со своим
+    # соединением. WAL позволяет читать во время записи и открывать базу
+    # из нескольких запущенных копий приложения
+    def __init__(self, path, codec=DEFAULT_NOTE_CODEC):
+        self.path = path
+        self.codec = codec if codec in NOTE_CODECS else DEFAULT_NOTE_CODEC
+        # Соединение для чтения может создаваться в фоновом потоке при запуске,
+        # но дальше используется только потоком интерфейса
+        self.reader = self.connect(check_same_thread=False)
+        self.migrate(self.reader)
+        self.fts = self.reader.execute(SQL_HAS_FTS).fetchone() is not None
+        self.writes = queue.Queue()
+        self.writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer_thread.start()
+
+    def connect(self, check_same_thread=True):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT,
+            cached_statements=DB_STATEMENT_CACHE,
+            check_same_thread=check_same_thread
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # в режиме WAL это безопасно и без fsync на каждый commit
+        conn.create_function('note_hash', 1, note_hash, deterministic=True)
+        conn.create_function('note_unpack', 2, unpack_note, deterministic=True)
+        conn.create_function('note_preview', 3, unpack_preview, deterministic=True)
+        return conn
+
+    def migrate(self, conn):
+        # Схема версионируется через PRAGMA user_version: новые и старые notes.db
+        # догоняются при первом открытии. Все шаги идут одной транзакцией под блокировкой
+        # записи, а версия перечитывается уже под ней: две копии приложения, открывшие
+        # базу одновременно, не выполнят одни и те же шаги дважды
+        if conn.execute(SQL_SCHEMA_VERSION).fetchone()[0] >= SCHEMA_VERSION:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute(SQL_SCHEMA_VERSION).fetchone()[0]
+            if version < 1:
+                conn.execute(SQL_CREATE_NOTES)
+                conn.execute('SAVEPOINT fts')
+                try:
+                    run_script(conn, SQL_MIGRATE_FTS)
+                except sqlite3.OperationalError:
+                    # SQLite собран без FTS5 - поиск будет работать через LIKE
+                    conn.execute('ROLLBACK TO fts')
+                conn.execute('RELEASE fts')
+            if version < 2:
+                run_script(conn, SQL_MIGRATE_HASH)
+            if version < 4:
+                run_script(conn, SQL_MIGRATE_BLOBS if version < 3 else SQL_DROP_NOTES_TEXT)
+            if version < 5 and conn.execute(SQL_HAS_FTS).fetchone() is not None:
+                run_script(conn, SQL_MIGRATE_FTS_CONTENTLESS)
+            if version < SCHEMA_VERSION:
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def query(self, sql, params=()):
+        return self.reader.execute(sql, params)
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        # Возвращает (id, фрагмент) лучших совпадений; найденные слова в «»
+        terms = text.split()
+        if not terms:
+            return []
+        if not self.fts:
+            pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            return self.query(SQL_SEARCH_NOTES_LIKE, (NOTE_PREVIEW_CHARS, pattern, limit)).fetchall()
+        # Каждое слово берём в кавычки, чтобы пользовательский ввод не разбирался
+        # как синтаксис FTS5; последнее слово ищется и как префикс
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms) + '*'
+        words = [fold_word(word) for term in terms for word in WORD_RE.findall(term)]
+        rows = self.query(SQL_SEARCH_NOTES, (match, limit)).fetchall()
+        return [(note_id, note_snippet(content, words)) for note_id, content in rows]
+
+    def submit(self, func, callback=None):
+        # func(conn) выполняется в потоке записи внутри одной транзакции,
+        # callback(результат, ошибка) вызывается из того же потока
+        self.writes.put((func, callback))
+
+    def write(self, sql, params=(), callback=None):
+        self.submit(lambda conn: conn.execute(sql, params).rowcount, callback)
+
+    def add_note(self, content, callback=None):
+        self.submit(lambda conn: self.insert_notes(conn, [(content, note_hash(content))]), callback)
+
+    def insert_notes(self, conn, notes):
+        # notes - список (текст, хэш). Длинные тексты сжимаются и хранятся
+        # в note_blobs один раз на одинаковое содержимое
+        rows = []
+        for content, digest in notes:
+            if self.codec != 'none' and len(content) >= COMPRESS_MIN_CHARS:
+                if conn.execute(SQL_HAS_BLOB, (digest,)).fetchone() is None:
+                    data = pack_note(self.codec, content)
+                    conn.execute(SQL_INSERT_BLOB, (digest, self.codec, len(content.encode('utf-8')), data))
+                # Сжатый текст триггер не прочитает - в FTS его кладём сами. Накопленные
+                # несжатые заметки вставляем раньше, чтобы id шли в порядке notes
+                conn.executemany(SQL_INSERT_NOTE, rows)
+                rows = []
+                note_id = conn.execute(SQL_INSERT_NOTE, ('', digest, digest)).lastrowid
+                if self.fts:
+                    conn.execute(SQL_INDEX_NOTE, (note_id, content))
+            else:
+                rows.append((content, digest, None))
+        conn.executemany(SQL_INSERT_NOTE, rows)
+        return len(notes)
+
+    def blob_stats(self):
+        # (число блобов, байт до сжатия, байт после сжатия)
+        return self.query(SQL_BLOB_STATS).fetchone()
+
+    def run(self, func):
+        # Синхронный вариант submit для фоновых потоков (не для интерфейса)
+        done = threading.Event()
+        outcome = []
+
+        def callback(result, error):
+            outcome.append((result, error))
+            done.set()
+
+        self.submit(func, callback)
+        done.wait()
+        result, error = outcome[0]
+        if error is not None:
+            raise error
+        return result
+
+    def import_files(self, folder, jobs=IMPORT_JOBS, progress=None, cancel=None):
+        # Файлы читаются пулом потоков, а в базу попадают пачками по
+        # IMPORT_BATCH_SIZE в одной транзакции. Пока пишется одна пачка,
+        # следующая уже читается с диска
+        stats = {'imported': 0, 'duplicates': 0, 'skipped': 0}
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            reading = None
+            for batch in batched(iter_files(folder), IMPORT_BATCH_SIZE):
+                if cancel is not None and cancel.is_set():
+                    break
+                next_reading = pool.map(read_note_file, batch)
+                if reading is not None:
+                    self._store_batch(list(reading), stats, progress)
+                reading = next_reading
+            if reading is not None and not (cancel is not None and cancel.is_set()):
+                self._store_batch(list(reading), stats, progress)
+        return stats
+
+    def _store_batch(self, results, stats, progress):
+        notes = [note for note in results if note is not None]
+        stats['skipped'] += len(results) - len(notes)
+        inserted = self.run(lambda conn: self._insert_unique(conn, notes))
+        stats['imported'] += inserted
+        stats['duplicates'] += len(notes) - inserted
+        if progress is not None:
+            progress(stats)
+
+    def _insert_unique(self, conn, notes):
+        # Дубликаты отсекаются по хэшу: и уже лежащие в базе, и внутри пачки
+        hashes = list({digest for _, digest in notes})
+        seen = set()
+        for part in batched(hashes, SQL_VARS_LIMIT):
+            sql = SQL_KNOWN_HASHES.format(','.join('?' * len(part)))
+            seen.update(row[0] for row in conn.execute(sql, part))
+        fresh = []
+        for content, digest in notes:
+            if digest not in seen:
+                seen.add(digest)
+                fresh.append((content, digest))
+        return self.insert_notes(conn, fresh)
+
+    def export_notes(self, folder, progress=None, cancel=None, jobs=1):
+        # Страница заметок сразу пишется в файлы - в памяти не больше одной страницы
+        os.makedirs(folder, exist_ok=True)
+        exported = 0
+
+        def write_note(row):
+            note_id, content = row
+            with open(os.path.join(folder, f"note_{note_id:08d}.txt"), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for rows in self.iter_note_pages(cancel):
+                for _ in pool.map(write_note, rows):
+                    pass
+                exported += len(rows)
+                if progress is not None:
+                    progress(exported)
+        return exported
+
+    def iter_note_pages(self, cancel=None):
+        # Страницы (id, текст) по id через отдельное соединение
+        conn = self.connect()
+        last_id = 0
+        try:
+            while not (cancel is not None and cancel.is_set()):
+                rows = conn.execute(SQL_EXPORT_PAGE, (last_id, EXPORT_PAGE_SIZE)).fetchall()
+                if not rows:
+                    break
+                yield rows
+                last_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    def close(self):
+        self.writes.put(None)
+        self.writer_thread.join()
+        self.reader.close()
+
+    def _write_loop(self):
+        conn = self.connect()
+        while True:
+            job = self.writes.get()
+            if job is None:
+                break
+            func, callback = job
+            try:
+                with conn:
+                    result = func(conn)
+                error = None
+            except Exception as e:
+                result, error = None, e
+            if callback is not None:
+                callback(result, error)
+        conn.close()
+
+
+class NotesBrowser:
+    # Окно просмотра заметок: список подгружается страницами по id (keyset),
+    # полный текст заметки читается из базы только при выборе
+    def __init__(self, app):
+        self.app = app
+        self.db = app.db
+        tr = app.translations[app.language]
+        self.last_id = 0
+        self.exhausted = False
+        self.page_scheduled = False
+        self.terms = []
+        self.search_job = None
+
+        self.win = tk.Toplevel(app.root)
+        self.win.title(tr['view_db'])
+        self.win.geometry("800x500")
+        search_frame = ttk.Frame(self.win)
+        ttk.Label(search_frame, text=tr['search']).pack(side=tk.LEFT, padx=5, pady=5)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5, pady=5)
+        search_entry.bind('<KeyRelease>', self.schedule_search)
+        search_entry.bind('<Return>', lambda e: self.run_search())
+        search_frame.pack(side=tk.TOP, fill=tk.X)
+        paned = ttk.PanedWindow(self.win, orient=tk.HORIZONTAL)
+        list_frame = ttk.Frame(paned)
+        self.tree = ttk.Treeview(list_frame, columns=('id', 'preview'), show='headings', selectmode='browse')
+        self.tree.heading('id', text='ID')
+        self.tree.heading('preview', text=tr['note'])
+        self.tree.column('id', width=60, stretch=False, anchor=tk.E)
+        self.list_scroll = ttk.Scrollbar(list_frame, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_scroll)
+        self.list_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(expand=True, fill=tk.BOTH)
+        self.text = tk.Text(paned, wrap=tk.WORD, state=tk.DISABLED)
+        self.text.tag_configure('match', background='yellow', foreground='black')
+        paned.add(list_frame, weight=1)
+        paned.add(self.text, weight=2)
+        paned.pack(expand=True, fill=tk.BOTH)
+
+        self.tree.bind('<<TreeviewSelect>>', self.on_select)
+        self.load_page()
+
+    def load_page(self):
+        self.page_scheduled = False
+        if self.exhausted:
+            return
+        rows = self.db.query(SQL_NOTES_PAGE, (NOTE_PREVIEW_CHARS, self.last_id, NOTES_PAGE_SIZE)).fetchall()
+        for note_id, preview in rows:
+            self.tree.insert('', tk.END, iid=str(note_id), values=(note_id, ' '.join(preview.split())))
+        if rows:
+            self.last_id = rows[-1][0]
+        if len(rows) < NOTES_PAGE_SIZE:
+            self.exhausted = True
+
+    def schedule_search(self, event=None):
+        # Ищем, когда пользователь перестал печатать, а не на каждую клавишу
+        if self.search_job is not None:
+            self.win.after_cancel(self.search_job)
+        self.search_job = self.win.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        text = self.search_var.get().strip()
+        self.tree.delete(*self.tree.get_children())
+        self.clear_content()
+        if not text:
+            # Пустой запрос - снова обычный постраничный список
+            self.terms = []
+            self.last_id = 0
+            self.exhausted = False
+            self.load_page()
+            return
+        self.terms = text.split()
+        self.exhausted = True  # результаты поиска не подгружаются страницами
+        try:
+            rows = self.db.search(text)
+        except sqlite3.OperationalError:
+            rows = []
+        for note_id, snippet in rows:
+            self.tree.insert('', tk.END, iid=str(note_id), values=(note_id, ' '.join(snippet.split())))
+
+    def on_scroll(self, first, last):
+        self.list_scroll.set(first, last)
+        if float(last) >= NOTES_PREFETCH_AT and not self.exhausted and not self.page_scheduled:
+            self.page_scheduled = True
+            self.win.after_idle(self.load_page)
+
+    def on_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        row = self.db.query(SQL_NOTE_CONTENT, (int(selection[0]),)).fetchone()
+        self.clear_content()
+        if row is None:
+            return
+        self.text.config(state=tk.NORMAL)
+        self.text.insert(1.0, row[0])
+        self.text.config(state=tk.DISABLED)
+        self.highlight_terms()
+
+    def clear_content(self):
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        self.text.config(state=tk.DISABLED)
+
+    def highlight_terms(self):
+        count = tk.IntVar()
+        first = None
+        for term in self.terms:
+            start = '1.0'
+            while True:
+                pos = self.text.search(term, start, stopindex=tk.END, nocase=True, count=count)
+                if not pos or not count.get():
+                    break
+                end = f"{pos}+{count.get()}c"
+                self.text.tag_add('match', pos, end)
+                if first is None or self.text.compare(pos, '<', first):
+                    first = pos
+                start = end
+        if first is not None:
+            self.text.see(first)
+
+
+class FileManagerApp(FileManagerBase):
+    def __init__(self, root, profile_startup=False, instrument=False, stats_file=None):
         self.root = root
+        self.profile_startup = profile_startup
+        self.stats = OpStats() if instrument or stats_file else None
+        self.stats_file = stats_file  # куда записать замеры при выходе
+        self.load_started = None
+        self.load_size = 0
+        self.startup_started = time.perf_counter()
+        self.startup_phases = []
+        self.startup_pending = {'db', 'translations'}  # что ещё делается после первой отрисовки
         self.current_file = None
-        self.config = self.load_config()
-        self.translations = self.load_translations()
-        self.current_theme = self.config.get('theme', 'light')
-        self.language = self.config.get('language', 'RU')
+        self.modified = False
+        self.saved_path = None  # файл, с которым совпадает текст до метки saved_end
+        self.append_only = False  # правки были только после метки saved_end
+        self.text_format = TextFormat()  # кодировка и переводы строк файла в text_area
+        self.loading = False
+        self.load_cancel = None
+        self.load_queue = None
+        self.viewer = None
+        self.pending_line = None  # строка, к которой перейти, когда файл догрузится
+        self.find_window = None
+        self.document = None  # активная вкладка
+        self.journal = None  # журнал, в который сейчас пишутся правки text_area
+        self.journal_job = None
+        self.journal_lock = None  # открытый .lck этого процесса
+        self.history = None  # история правок активного документа; None - правки не записываются
+        self.history_job = None
+        self.tabs = {}  # имя виджета вкладки -> Document
+        self.ui_calls = queue.Queue()
+        self.save_worker = SaveWorker()
+        self.db = None
+        self.db_thread = None
 
-        self.ensure_data_folder()
-        self.ensure_db()
+        phase = time.perf_counter()
+        self.config = self.load_config()
+        self.record_phase('load_config', phase)
+        self.current_theme = self.config['theme']
+        self.language = self.config['language']
+        self.buffer_cache = BufferCache(self.config['buffer_cache_mb'] * 1024 * 1024)
+        phase = time.perf_counter()
+        self.translations = Translations(self.load_translations)
+        self.translations[self.language]  # активный язык нужен сразу
+        self.record_phase('translations', phase)
+        phase = time.perf_counter()
         self.setup_ui()
-        self.check_first_run()
+        self.record_phase('setup_ui', phase)
+        # База, второй язык и приветствие - только после того, как окно отрисовано
+        self.root.bind('<Map>', self.on_first_map)
 
     def ensure_data_folder(self):
-        os.makedirs(DB_FOLDER, exist_ok=True)
+        os.makedirs(DATA_FOLDER, exist_ok=True)
 
     def ensure_db(self):
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content TEXT NOT NULL
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        # Вызывается в фоновом потоке: миграции старой базы могут идти долго
+        phase = time.perf_counter()
+        try:
+            self.ensure_data_folder()
+            db = NotesDB(DB_PATH, self.config['notes_compression'])
+        except Exception as e:
+            self.call_in_ui(self.messagebox.showerror, "Error", f"Cannot open database:\n{e}")
+            self.call_in_ui(self.finish_startup_task, 'db', phase)
+            return
+        self.call_in_ui(self._on_db_ready, db, phase)
 
-    def load_config(self):
-        config_path = 'fm_config.json'
-        if os.path.exists(config_path):
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {'first_run': True, 'language': 'RU', 'theme': 'light', 'language_changed': False}
+    def _on_db_ready(self, db, phase):
+        self.db = db
+        self.finish_startup_task('db', phase)
 
-    def save_config(self):
-        with open('fm_config.json', 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, ensure_ascii=False, indent=2)
+    def db_ready(self):
+        if self.db is not None:
+            return True
+        self.status_label.config(text=self.translations[self.language]['db_not_ready'])
+        return False
 
-    def load_translations(self):
-        return {
-            'EN': {
+    def after_first_paint(self):
+        self.startup_phases.append(('first_paint', (time.perf_counter() - self.startup_started) * 1000))
+        self.db_thread = threading.Thread(target=self.ensure_db, daemon=True)
+        self.db_thread.start()
+        self.root.after_idle(self.preload_translations)
+        self.root.after_idle(self.check_first_run)
+        self.root.after_idle(self.offer_recovery)
+
+    def load_config(self):
+        return ConfigStore(CONFIG_PATH, self.root, {
+            'first_run': (True, (True, False)),
+            'language': ('RU', ('RU', 'EN')),
+            'theme': ('light', ('light', 'dark')),
+            'buffer_cache_mb': (BUFFER_CACHE_MB, range(1, 64 * 1024)),
+            'undo_history_mb': (UNDO_HISTORY_MB, range(1, 64 * 1024)),
+            'persist_undo': (False, None),
+            'show_folders': (False, (True, False)),
+            'folders_root': ('', None),
+            'notes_compression': (DEFAULT_NOTE_CODEC, NOTE_CODECS),
+        })
+
+    def load_translations(self, language):
+        # Строится только запрошенный язык, остальные - по первому обращению
+        if language == 'EN':
+            return {
                 'title': 'File Manager',
                 'file': 'File',
                 'new': 'New',
                 'open': 'Open',
                 'save': 'Save',
+                'close_tab': 'Close tab',
+                'untitled': 'Untitled',
+                'find_in_files': 'Find in files',
+                'find': 'Find:',
+                'folder': 'Folder:',
+                'match_case': 'Match case',
+                'start_search': 'Search',
+                'searching': 'Searching',
+                'search_cancelled': 'Search cancelled.',
+                'found': 'Found',
+                'files_searched': 'Files searched',
+                'text': 'Text',
+                'dump_stats': 'Save performance stats',
+                'recover_prompt': 'Unsaved changes from the previous session were found ({count}). Restore them?',
+                'recover_failed': 'Cannot restore unsaved changes',
+                'undo': 'Undo',
+                'redo': 'Redo',
+                'rows': 'rows',
+                'find_replace': 'Find and replace',
+                'replace_with': 'Replace:',
+                'find_next': 'Next',
+                'find_prev': 'Previous',
+                'regex': 'Regex',
+                'replace': 'Replace',
+                'replace_all': 'Replace all',
+                'replaced': 'Replaced',
+                'no_matches': 'No matches',
+                'bad_pattern': 'Invalid pattern',
+                'open_folder': 'Open folder',
+                'folders': '📁 Folders',
+                'name': 'Name',
+                'size': 'Size',
                 'save_db': 'Save to DB',
                 'save_file': 'Save as File',
                 'view_db': 'View DB',
@@ -64,6 +791,27 @@ class FileManagerApp:
                 'theme': '🌓 Theme',
                 'language': '🌐 Language',
                 'empty_db': 'Database is empty.',
+                'db_not_ready': 'Database is still opening, try again in a moment.',
+                'note': 'Note',
+                'search': 'Search:',
+                'import_db': 'Import Folder to DB',
+                'export_db': 'Export DB to Folder',
+                'importing': 'Importing',
+                'exporting': 'Exporting',
+                'imported': 'Imported',
+                'duplicates': 'duplicates',
+                'skipped': 'skipped',
+                'exported': 'Exported',
+                'loading': 'Loading',
+                'cancel': 'Cancel',
+                'load_cancelled': 'Loading cancelled.',
+                'mixed_newlines': 'The file mixes line endings; saving will convert them all to {}',
+                'read_only': 'Read only',
+                'line': 'Line',
+                'indexing': 'indexing',
+                'saving': 'Saving',
+                'saved': 'Saved',
+                'no_changes': 'No changes to save',
                 'tutorial_title': 'Tutorial',
                 'tutorial_text': (
                     "1. New file: Ctrl+N\n"
@@ -73,32 +821,84 @@ class FileManagerApp:
                     "5. Change language: Language button"
                 ),
                 'good_luck': 'Good luck!'
-            },
-            'RU': {
-                'title': 'Файловый менеджер',
-                'file': 'Файл',
-                'new': 'Новый',
-                'open': 'Открыть',
-                'save': 'Сохранить',
-                'save_db': 'Сохранить в БД',
-                'save_file': 'Сохранить как файл',
-                'view_db': 'Просмотр БД',
-                'rename': 'Переименовать',
-                'delete': 'Удалить',
-                'exit': 'Выход',
-                'theme': '🌓 Тема',
-                'language': '🌐 Язык',
-                'empty_db': 'База данных пуста.',
-                'tutorial_title': 'Обучение',
-                'tutorial_text': (
-                    "1. Новый файл: Ctrl+N\n"
-                    "2. Открыть файл: Ctrl+O\n"
-                    "3. Сохранить файл: Ctrl+S\n"
-                    "4. Переключение темы: кнопка Тема\n"
-                    "5. Смена языка: кнопка Язык"
-                ),
-                'good_luck': 'Удачной работы!'
             }
+        return {
+            'title': 'Файловый менеджер',
+            'file': 'Файл',
+            'new': 'Новый',
+            'open': 'Открыть',
+            'save': 'Сохранить',
+            'close_tab': 'Закрыть вкладку',
+            'untitled': 'Без имени',
+            'find_in_files': 'Найти в файлах',
+            'find': 'Найти:',
+            'folder': 'Папка:',
+            'match_case': 'Учитывать регистр',
+            'start_search': 'Искать',
+            'searching': 'Поиск',
+            'search_cancelled': 'Поиск отменён.',
+            'found': 'Найдено',
+            'files_searched': 'Просмотрено файлов',
+            'text': 'Текст',
+            'dump_stats': 'Сохранить замеры',
+            'recover_prompt': 'Найдены несохранённые изменения прошлого сеанса ({count}). Восстановить?',
+            'recover_failed': 'Не удалось восстановить несохранённые изменения',
+            'undo': 'Отменить',
+            'redo': 'Повторить',
+            'rows': 'строк',
+            'find_replace': 'Найти и заменить',
+            'replace_with': 'Заменить:',
+            'find_next': 'Далее',
+            'find_prev': 'Назад',
+            'regex': 'Рег. выражение',
+            'replace': 'Заменить',
+            'replace_all': 'Заменить все',
+            'replaced': 'Заменено',
+            'no_matches': 'Совпадений нет',
+            'bad_pattern': 'Ошибка в выражении',
+            'open_folder': 'Открыть папку',
+            'folders': '📁 Папки',
+            'name': 'Имя',
+            'size': 'Размер',
+            'save_db': 'Сохранить в БД',
+            'save_file': 'Сохранить как файл',
+            'view_db': 'Просмотр БД',
+            'rename': 'Переименовать',
+            'delete': 'Удалить',
+            'exit': 'Выход',
+            'theme': '🌓 Тема',
+            'language': '🌐 Язык',
+            'empty_db': 'База данных пуста.',
+            'db_not_ready': 'База данных ещё открывается, повторите через мгновение.',
+            'note': 'Заметка',
+            'search': 'Поиск:',
+            'import_db': 'Импорт папки в БД',
+            'export_db': 'Экспорт БД в папку',
+            'importing': 'Импорт',
+            'exporting': 'Экспорт',
+            'imported': 'Импортировано',
+            'duplicates': 'дубликатов',
+            'skipped': 'пропущено',
+            'exported': 'Экспортировано',
+            'loading': 'Загрузка',
+            'cancel': 'Отмена',
+            'load_cancelled': 'Загрузка отменена.',
+            'mixed_newlines': 'В файле разные переводы строк; при сохранении все станут {}',
+            'read_only': 'Только чтение',
+            'line': 'Строка',
+            'indexing': 'индексация',
+            'saving': 'Сохранение',
+            'saved': 'Сохранено',
+            'no_changes': 'Нет изменений',
+            'tutorial_title': 'Обучение',
+            'tutorial_text': (
+                "1. Новый файл: Ctrl+N\n"
+                "2. Открыть файл: Ctrl+O\n"
+                "3. Сохранить файл: Ctrl+S\n"
+                "4. Переключение темы: кнопка Тема\n"
+                "5. Смена языка: кнопка Язык"
+            ),
+            'good_luck': 'Удачной работы!'
         }
 
     def setup_ui(self):
@@ -107,50 +907,100 @@ class FileManagerApp:
 
         # Меню
         self.menu_bar = tk.Menu(self.root)
+        self.menu_labels = []  # (меню, индекс пункта, ключ перевода) для смены языка
         self.file_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(
             menu=self.file_menu,
             label=self.translations[self.language]['file']
         )
-        self.file_menu.add_command(
-            label=self.translations[self.language]['new'],
+        self.menu_labels.append((self.menu_bar, self.menu_bar.index(tk.END), 'file'))
+        self.add_menu_command(
+            self.file_menu, 'new',
             command=self.new_file,
             accelerator='Ctrl+N'
         )
-        self.file_menu.add_command(
-            label=self.translations[self.language]['open'],
+        self.add_menu_command(
+            self.file_menu, 'open',
             command=self.open_file,
             accelerator='Ctrl+O'
         )
-        self.file_menu.add_command(
-            label=self.translations[self.language]['save'],
+        self.add_menu_command(
+            self.file_menu, 'open_folder',
+            command=self.open_folder
+        )
+        self.add_menu_command(
+            self.file_menu, 'undo',
+            command=self.undo,
+            accelerator='Ctrl+Z'
+        )
+        self.add_menu_command(
+            self.file_menu, 'redo',
+            command=self.redo,
+            accelerator='Ctrl+Y'
+        )
+        self.add_menu_command(
+            self.file_menu, 'find_replace',
+            command=self.show_find_bar,
+            accelerator='Ctrl+F'
+        )
+        self.add_menu_command(
+            self.file_menu, 'find_in_files',
+            command=self.find_in_files,
+            accelerator='Ctrl+Shift+F'
+        )
+        self.add_menu_command(
+            self.file_menu, 'save',
             command=self.save_file,
             accelerator='Ctrl+S'
         )
+        self.add_menu_command(
+            self.file_menu, 'close_tab',
+            command=self.close_tab,
+            accelerator='Ctrl+W'
+        )
         self.file_menu.add_separator()
-        self.file_menu.add_command(
-            label=self.translations[self.language]['save_db'],
+        self.add_menu_command(
+            self.file_menu, 'save_db',
             command=self.save_to_db
         )
-        self.file_menu.add_command(
-            label=self.translations[self.language]['save_file'],
+        self.add_menu_command(
+            self.file_menu, 'save_file',
             command=self.save_file_as
         )
-        self.file_menu.add_command(
-            label=self.translations[self.language]['view_db'],
+        self.add_menu_command(
+            self.file_menu, 'view_db',
             command=self.view_db
         )
+        self.add_menu_command(
+            self.file_menu, 'import_db',
+            command=self.import_to_db
+        )
+        self.add_menu_command(
+            self.file_menu, 'export_db',
+            command=self.export_from_db
+        )
+        if self.stats is not None:
+            self.add_menu_command(
+                self.file_menu, 'dump_stats',
+                command=self.dump_stats
+            )
         self.file_menu.add_separator()
-        self.file_menu.add_command(
-            label=self.translations[self.language]['exit'],
-            command=self.root.quit
+        self.add_menu_command(
+            self.file_menu, 'exit',
+            command=self.exit_app
         )
         self.root.config(menu=self.menu_bar)
+        self.root.protocol('WM_DELETE_WINDOW', self.exit_app)
 
         # Горячие клавиши
         self.root.bind('<Control-n>', lambda e: self.new_file())
         self.root.bind('<Control-o>', lambda e: self.open_file())
         self.root.bind('<Control-s>', lambda e: self.save_file())
+        self.root.bind('<Control-w>', lambda e: self.close_tab())
+        self.root.bind('<Control-Shift-F>', lambda e: self.find_in_files())
+        self.root.bind('<Control-f>', self.show_find_bar)
+        self.root.bind('<F3>', lambda e: self.find_bar.find_next())
+        self.root.bind('<Shift-F3>', lambda e: self.find_bar.find_prev())
 
         # Панель инструментов
         self.toolbar = ttk.Frame(self.root)
@@ -164,158 +1014,308 @@ class FileManagerApp:
             text=self.translations[self.language]['language'],
             command=self.toggle_language
         )
+        self.folders_btn = ttk.Button(
+            self.toolbar,
+            text=self.translations[self.language]['folders'],
+            command=self.toggle_folders
+        )
         self.theme_btn.pack(side=tk.LEFT, padx=5, pady=5)
         self.lang_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        self.folders_btn.pack(side=tk.LEFT, padx=5, pady=5)
         self.toolbar.pack(side=tk.TOP, fill=tk.X)
 
+        # Строка состояния (прогресс загрузки и т.п.)
+        self.status_bar = ttk.Frame(self.root)
+        self.status_label = ttk.Label(self.status_bar, text='')
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        self.progress = ttk.Progressbar(self.status_bar, mode='determinate', maximum=100, length=200)
+        self.cancel_btn = ttk.Button(
+            self.status_bar,
+            text=self.translations[self.language]['cancel'],
+            command=self.cancel_load
+        )
+        # Длительность последней операции (только с --instrument)
+        self.stats_label = ttk.Label(self.status_bar, text='')
+        if self.stats is not None:
+            self.stats_label.pack(side=tk.RIGHT, padx=5)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.widget_labels = [
+            (self.theme_btn, 'theme'), (self.lang_btn, 'language'), (self.folders_btn, 'folders'), (self.cancel_btn, 'cancel')
+        ]
+
+        # Слева панель папок (скрываемая), справа вкладки и текст
+        self.paned = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
+        self.dir_pane = DirectoryPane(self, self.paned)
+        self.editor = ttk.Frame(self.paned)
+        self.paned.add(self.editor, weight=3)
+        self.paned.pack(expand=True, fill=tk.BOTH)
+        if self.config['show_folders']:
+            self.show_folders()
+
+        # Вкладки документов
+        self.notebook = ttk.Notebook(self.editor)
+        self.notebook.enable_traversal()  # Ctrl+Tab / Ctrl+Shift+Tab
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        self.notebook.pack(side=tk.TOP, fill=tk.X)
+
         # Текстовое поле с прокруткой
-        self.text_area = tk.Text(self.root, wrap=tk.WORD)
-        self.scrollbar = ttk.Scrollbar(self.root, command=self.text_area.yview)
-        self.text_area.configure(yscrollcommand=self.scrollbar.set)
+        self.text_area = tk.Text(self.editor, wrap=tk.WORD)
+        self.scrollbar = ttk.Scrollbar(self.editor, command=self.text_area.yview)
+        self.text_area.configure(yscrollcommand=self.on_text_scroll)
+        # Все правки текста проходят через прокси: так видно, где именно правили
+        self.text_orig = self.text_area._w + '_orig'
+        self.root.tk.call('rename', self.text_area._w, self.text_orig)
+        self.root.tk.createcommand(self.text_area._w, self._text_proxy)
+        self.text_area.mark_set('saved_end', 1.0)
+        self.text_area.mark_gravity('saved_end', tk.LEFT)
+        self.text_area.bind('<<Modified>>', self.on_modified)
+        # Ctrl+F в tk.Text - сдвиг курсора; перехватываем до привязок класса
+        self.text_area.bind('<Control-f>', self.show_find_bar)
+        # Встроенная история tk.Text выключена (undo=False) - её место занимает EditHistory
+        self.text_area.bind('<<Undo>>', self.undo)
+        self.text_area.bind('<<Redo>>', self.redo)
+        self.text_area.bind('<Control-y>', self.redo)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.text_area.pack(expand=True, fill=tk.BOTH)
+        self.find_bar = FindBar(self, self.editor)
+        self.widget_labels.extend(self.find_bar.labels)
+        self.add_tab()
 
         self.apply_theme()
+        self.root.after(UI_POLL_MS, self.process_ui_calls)
 
-    def apply_theme(self):
-        if self.current_theme == 'dark':
-            bg = '#2d2d2d'
-            fg = 'white'
-            insertbackground = 'white'
-        else:
-            bg = 'white'
-            fg = 'black'
-            insertbackground = 'black'
-        self.text_area.config(bg=bg, fg=fg, insertbackground=insertbackground)
-        style = ttk.Style()
-        style.theme_use('default')
-        style.configure('TButton', background=bg, foreground=fg)
-        style.configure('TFrame', background=bg)
-        self.toolbar.config(style='TFrame')
-
-    def check_first_run(self):
-        if self.config.get('language_changed', False):
-            self.config['language_changed'] = False
-            self.save_config()
+    def save_to_db(self):
+        if self.loading or self.viewer or not self.db_ready():
+            return
+        content = self.text_area.get(1.0, tk.END).strip()
+        if not content:
+            self.messagebox.showwarning(self.translations[self.language]['title'], "Пустая заметка не будет сохранена." if self.language == 'RU' else "Empty note will not be saved.")
             return
+        # Запись идёт в потоке базы, интерфейс сразу свободен
+        started = time.perf_counter()
 
-        if self.config.get('first_run', True):
-            messagebox.showinfo(
-                self.translations[self.language]['tutorial_title'],
-                self.translations[self.language]['tutorial_text']
-            )
-            self.config['first_run'] = False
-            self.save_config()
-        else:
-            messagebox.showinfo(
-                self.translations[self.language]['title'],
-                self.translations[self.language]['good_luck']
-            )
+        def on_done(result, error):
+            if error is None:
+                self.record_op('save_to_db', started, len(content.encode('utf-8')), rows=1)
+            self.call_in_ui(self._on_note_saved, error)
 
-    def new_file(self):
-        if self.confirm_discard_changes():
-            self.text_area.delete(1.0, tk.END)
-            self.current_file = None
-            self.root.title(self.translations[self.language]['title'])
+        self.db.add_note(content, on_done)
 
-    def open_file(self):
-        if not self.confirm_discard_changes():
+    def _on_note_saved(self, error):
+        if error is not None:
+            self.messagebox.showerror("Error", f"Cannot save note:\n{error}")
             return
-        file_path = filedialog.askopenfilename()
-        if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                self.text_area.delete(1.0, tk.END)
-                self.text_area.insert(1.0, content)
-                self.current_file = file_path
-                self.root.title(f"{os.path.basename(file_path)} - {self.translations[self.language]['title']}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Cannot open file:\n{e}")
+        self.status_label.config(text="Заметка сохранена в базу данных." if self.language == 'RU' else "Note saved to database.")
 
-    def save_file(self):
-        if self.current_file:
-            try:
-                content = self.text_area.get(1.0, tk.END)
-                with open(self.current_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                messagebox.showinfo(self.translations[self.language]['title'], "File saved.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Cannot save file:\n{e}")
-        else:
-            self.save_file_as()
+    def import_to_db(self):
+        if not self.db_ready():
+            return
+        folder = self.filedialog.askdirectory()
+        if not folder:
+            return
+        tr = self.translations[self.language]
+        self.status_label.config(text=f"{tr['importing']}: {folder}")
+        threading.Thread(target=self._import_worker, args=(folder,), daemon=True).start()
 
-    def save_file_as(self):
-        file_path = filedialog.asksaveasfilename(
-            defaultextension='.txt',
-            filetypes=[('Text Files', '*.txt'), ('All Files', '*.*')]
+    def _import_worker(self, folder):
+        try:
+            stats = self.db.import_files(
+                folder,
+                progress=lambda stats: self.call_in_ui(self._show_import_stats, dict(stats), False)
+            )
+        except Exception as e:
+            self.call_in_ui(self.messagebox.showerror, "Error", f"Cannot import files:\n{e}")
+            return
+        self.call_in_ui(self._show_import_stats, stats, True)
+
+    def _show_import_stats(self, stats, finished):
+        tr = self.translations[self.language]
+        prefix = tr['imported'] if finished else f"{tr['importing']}..."
+        self.status_label.config(
+            text=f"{prefix} {stats['imported']}, {tr['duplicates']}: {stats['duplicates']}, {tr['skipped']}: {stats['skipped']}"
         )
-        if file_path:
-            try:
-                content = self.text_area.get(1.0, tk.END)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                self.current_file = file_path
-                self.root.title(f"{os.path.basename(file_path)} - {self.translations[self.language]['title']}")
-                messagebox.showinfo(self.translations[self.language]['title'], "File saved.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Cannot save file:\n{e}")
 
-    def save_to_db(self):
-        content = self.text_area.get(1.0, tk.END).strip()
-        if not content:
-            messagebox.showwarning(self.translations[self.language]['title'], "Пустая заметка не будет сохранена." if self.language == 'RU' else "Empty note will not be saved.")
+    def export_from_db(self):
+        if not self.db_ready():
             return
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("INSERT INTO notes (content) VALUES (?)", (content,))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo(self.translations[self.language]['title'], "Заметка сохранена в базу данных." if self.language == 'RU' else "Note saved to database.")
+        folder = self.filedialog.askdirectory()
+        if not folder:
+            return
+        tr = self.translations[self.language]
+        self.status_label.config(text=f"{tr['exporting']}: {folder}")
+        threading.Thread(target=self._export_worker, args=(folder,), daemon=True).start()
 
-    def view_db(self):
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT id, content FROM notes")
-        rows = c.fetchall()
-        conn.close()
-        if not rows:
-            messagebox.showinfo(self.translations[self.language]['title'], self.translations[self.language]['empty_db'])
+    def _export_worker(self, folder):
+        tr = self.translations[self.language]
+        try:
+            count = self.db.export_notes(
+                folder,
+                progress=lambda count: self.call_in_ui(self.status_label.config, {'text': f"{tr['exporting']}... {count}"})
+            )
+        except Exception as e:
+            self.call_in_ui(self.messagebox.showerror, "Error", f"Cannot export notes:\n{e}")
             return
-        # Показываем все заметки в отдельном окне
-        view_win = tk.Toplevel(self.root)
-        view_win.title(self.translations[self.language]['view_db'])
-        view_win.geometry("600x400")
-        text = tk.Text(view_win, wrap=tk.WORD)
-        text.pack(expand=True, fill=tk.BOTH)
-        for row in rows:
-            text.insert(tk.END, f"ID: {row[0]}\n{row[1]}\n{'-'*40}\n")
-        text.config(state=tk.DISABLED)
-
-    def confirm_discard_changes(self):
-        return messagebox.askyesno(
-            self.translations[self.language]['title'],
-            "Discard current changes?" if self.language == 'EN' else "Отменить текущие изменения?"
-        )
+        self.call_in_ui(self.status_label.config, {'text': f"{tr['exported']}: {count}"})
 
-    def toggle_theme(self):
-        self.current_theme = 'dark' if self.current_theme == 'light' else 'light'
-        self.config['theme'] = self.current_theme
-        self.save_config()
-        self.apply_theme()
+    def view_db(self):
+        if not self.db_ready():
+            return
+        if self.db.query(SQL_ANY_NOTE).fetchone() is None:
+            self.messagebox.showinfo(self.translations[self.language]['title'], self.translations[self.language]['empty_db'])
+            return
+        # Заметки показываются в отдельном окне постранично
+        started = time.perf_counter()
+        browser = NotesBrowser(self)
+        self.record_op('view_db', started, rows=len(browser.tree.get_children()))
 
-    def toggle_language(self):
-        self.language = 'EN' if self.language == 'RU' else 'RU'
-        self.config['language'] = self.language
-        self.config['language_changed'] = True
-        self.save_config()
+    def exit_app(self):
+        # Не даём закрыть окно, пока фоновое сохранение не дописало файл
+        self.stop_loading()
+        self.close_viewer()
+        if self.find_window is not None and self.find_window.win.winfo_exists():
+            self.find_window.stop()
+        self.flush_journal()
+        for doc in self.tabs.values():
+            if not (self.modified if doc is self.document else doc.modified):
+                self.discard_journal(doc)
+            self.persist_history(doc)
+        self.save_worker.wait_idle(SAVE_EXIT_TIMEOUT)
+        if self.journal_lock is not None:
+            # Оставшиеся журналы без .lck - брошенные, их предложит восстановить следующий запуск
+            self.journal_lock.close()
+            try:
+                os.remove(self.journal_lock.name)
+            except OSError:
+                pass
+        if self.stats_file:
+            try:
+                self.stats.dump(self.stats_file)
+            except OSError as e:
+                print(f"Cannot save stats: {e}", file=sys.stderr)
+        if self.db_thread is not None:
+            self.db_thread.join()
+            self.process_ui_calls(reschedule=False)
+        if self.db is not None:
+            self.db.close()
+        self.flush_config()
         self.root.destroy()
-        root = tk.Tk()
-        FileManagerApp(root)
-        root.mainloop()
+
+
+def open_cli_db(args):
+    if args.db == DB_PATH:
+        os.makedirs(DATA_FOLDER, exist_ok=True)
+    return NotesDB(args.db, args.codec or configured_codec())
+
+
+def configured_codec():
+    # Сжатие, выбранное в настройках приложения; окна и ConfigStore здесь нет
+    try:
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            codec = json.load(f).get('notes_compression')
+    except (OSError, ValueError, AttributeError):
+        return DEFAULT_NOTE_CODEC
+    return codec if codec in NOTE_CODECS else DEFAULT_NOTE_CODEC
+
+
+def cli_import(args):
+    db = open_cli_db(args)
+    stats = {'imported': 0, 'duplicates': 0, 'skipped': 0}
+    try:
+        for source in args.sources:
+            if source == '-':
+                note = parse_note(sys.stdin.buffer.read())
+                db._store_batch([note], stats, None)
+            else:
+                for key, value in db.import_files(source, jobs=args.jobs).items():
+                    stats[key] += value
+    finally:
+        db.close()
+    print(f"imported {stats['imported']}, duplicates {stats['duplicates']}, skipped {stats['skipped']}", file=sys.stderr)
+    return 0
+
+
+def cli_export(args):
+    db = open_cli_db(args)
+    try:
+        if args.target == '-':
+            # JSON-строки по одной на заметку: текст с переводами строк не ломает поток
+            out = sys.stdout.buffer
+            count = 0
+            for rows in db.iter_note_pages():
+                out.write(''.join(
+                    json.dumps({'id': note_id, 'content': content}, ensure_ascii=False) + '\n'
+                    for note_id, content in rows
+                ).encode('utf-8'))
+                count += len(rows)
+            out.flush()
+        else:
+            count = db.export_notes(args.target, jobs=args.jobs)
+    finally:
+        db.close()
+    print(f"exported {count}", file=sys.stderr)
+    return 0
+
+
+def cli_search(args):
+    db = open_cli_db(args)
+    try:
+        rows = db.search(' '.join(args.terms), limit=args.limit)
+    finally:
+        db.close()
+    out = sys.stdout
+    for note_id, snippet in rows:
+        out.write(f"{note_id}\t{' '.join(snippet.split())}\n")
+    return 0 if rows else 1
+
+
+def add_cli_commands(parser):
+    # Без команды запускается окно; с командой работа идёт без Tk и без дисплея
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    def db_options(command):
+        command.add_argument('--db', default=DB_PATH, help=f'notes database (default: {DB_PATH})')
+        command.add_argument('--codec', choices=NOTE_CODECS, help='compression for new notes (default: from settings)')
+
+    command = commands.add_parser('import', help='import text files into the notes database')
+    command.add_argument('sources', nargs='+', metavar='SOURCE', help='folder to import recursively, or - for one note from stdin')
+    command.add_argument('--jobs', type=int, default=IMPORT_JOBS, help=f'file reader threads (default: {IMPORT_JOBS})')
+    db_options(command)
+    command.set_defaults(run=cli_import)
+
+    command = commands.add_parser('export', help='export notes')
+    command.add_argument('target', metavar='TARGET', help='folder for note_*.txt files, or - for JSON lines on stdout')
+    command.add_argument('--jobs', type=int, default=1, help='file writer threads (default: 1)')
+    db_options(command)
+    command.set_defaults(run=cli_export)
+
+    command = commands.add_parser('search', help='search notes, print "id<TAB>snippet" lines')
+    command.add_argument('terms', nargs='+', metavar='WORD')
+    command.add_argument('--limit', type=int, default=SEARCH_LIMIT, help=f'best matches to print (default: {SEARCH_LIMIT})')
+    db_options(command)
+    command.set_defaults(run=cli_search)
+
+    command = commands.add_parser('transcode', help='convert text files to another encoding or newline style')
+    command.add_argument('sources', nargs='+', metavar='SOURCE', help='file to convert, or - for stdin')
+    command.add_argument('-o', '--output', default='-', help='output file, or directory for several sources (default: stdout)')
+    command.add_argument('--to', default='utf-8', help='target encoding (default: utf-8)')
+    command.add_argument('--from', dest='source_encoding', help='source encoding (default: detected)')
+    command.add_argument('--bom', choices=('keep', 'yes', 'no'), default='keep')
+    command.add_argument('--newline', choices=tuple(NEWLINES), default='keep')
+    command.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='files converted in parallel')
+    command.set_defaults(run=cli_transcode)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='File manager')
+    parser.add_argument('--profile-startup', action='store_true', help='print time spent in each startup phase')
+    parser.add_argument('--instrument', action='store_true', help='time file and database operations')
+    parser.add_argument('--stats-file', help='write operation timings here on exit (.json or .csv); implies --instrument')
+    add_cli_commands(parser)
+    args = parser.parse_args()
+    if args.command is not None:
+        sys.exit(args.run(args))
     root = tk.Tk()
-    app = FileManagerApp(root)
+    app = FileManagerApp(
+        root, profile_startup=args.profile_startup, instrument=args.instrument, stats_file=args.stats_file
+    )
     root.mainloop()
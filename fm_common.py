@@ -0,0 +1,2748 @@
+# Общая часть file_manager_V1.1.py и file_manager V2.1.py: загрузка и просмотр файлов,
+# сохранение, вкладки, поиск, история правок, журнал и настройки. Сами программы
+# отличаются только работой с базой заметок
+
+import os
+import sys
+import io
+import csv
+import json
+import re
+import mmap
+import hashlib
+import codecs
+import struct
+import stat
+import shutil
+import tempfile
+import uuid
+import queue
+import threading
+import multiprocessing
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from itertools import accumulate, chain
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+from tkinter import font as tkfont
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+DATA_FOLDER = "notes_data"
+
+# Потоковая загрузка файлов
+LOAD_CHUNK_SIZE = 1024 * 1024  # символов за одно чтение
+LOAD_QUEUE_SIZE = 8  # сколько кусков может ждать вставки в текстовое поле
+LOAD_POLL_MS = 20
+LOAD_TICK_BUDGET = 0.03  # секунд на вставку за один тик, чтобы окно не замирало
+
+# Кодировки
+ENCODING_SNIFF_SIZE = 64 * 1024  # по стольким первым байтам определяются кодировка и переводы строк
+FALLBACK_ENCODINGS = ('cp1251', 'latin-1')  # если файл не UTF-8; latin-1 читает любые байты
+SAVE_CHUNK_SIZE = 1024 * 1024  # символов, кодируемых за раз при сохранении
+NEWLINES = {'keep': None, 'lf': '\n', 'crlf': '\r\n', 'cr': '\r'}  # варианты --newline в transcode
+NEWLINE_NAMES = {newline: name.upper() for name, newline in NEWLINES.items() if newline}
+# Метки порядка байтов; UTF-32 проверяется раньше UTF-16 - у них общее начало
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+# Режим просмотра очень больших файлов
+LARGE_FILE_THRESHOLD = 64 * 1024 * 1024  # файлы больше открываются только для чтения
+INDEX_CACHE_FOLDER = os.path.join(DATA_FOLDER, "index_cache")
+INDEX_CHUNK_SIZE = 16 * 1024 * 1024
+INDEX_STEP = 64  # в индексе хранится смещение каждой 64-й строки
+INDEX_MAGIC = b'FMIX'
+INDEX_HEADER = struct.Struct('<4sQQQQ')
+MAX_LINE_BYTES = 64 * 1024  # длиннее строки показываются по частям
+LARGE_VIEW_TAG = 'LargeFileView'
+LARGE_VIEW_STATUS_MS = 200
+
+UI_POLL_MS = 30  # как часто интерфейс забирает результаты фоновых потоков
+SAVE_EXIT_TIMEOUT = 30  # сколько секунд ждать незавершённые сохранения при выходе
+
+# Настройки
+CONFIG_PATH = 'fm_config.json'
+CONFIG_VERSION = 1
+CONFIG_FLUSH_MS = 1000  # изменения копятся в памяти и пишутся на диск не чаще раза в секунду
+
+# Вкладки
+BUFFER_CACHE_MB = 64  # память под тексты неактивных вкладок (настройка buffer_cache_mb)
+
+# Панель папок
+DIR_CACHE_SIZE = 256  # сколько списков папок держать в памяти
+DIR_INSERT_BATCH = 500  # строк дерева между проверками времени тика
+DIR_POLL_MS = 10
+
+# Поиск по файлам
+FIND_TASK_FILES = 256  # файлов в одной задаче пула процессов
+FIND_TASK_BYTES = 64 * 1024 * 1024  # или столько байт, если файлы крупные
+FIND_TASKS_PER_JOB = 4  # задач в очереди на процесс, чтобы обход папки не убегал вперёд
+FIND_MAX_HITS_PER_FILE = 100
+FIND_MAX_RESULTS = 10000
+FIND_LINE_CHARS = 200  # сколько символов строки показывать в списке
+
+# Поиск и замена в тексте
+FIND_DEBOUNCE_MS = 150
+FIND_HIGHLIGHT_LIMIT = 2000  # совпадений, подсвечиваемых на экране за раз
+FIND_TAG = 'find_match'
+
+# Отмена и повтор правок
+UNDO_HISTORY_MB = 32  # память под историю правок одного документа (настройка undo_history_mb)
+UNDO_COALESCE_SECONDS = 1.0  # набор с паузами короче этой склеивается в одну правку
+UNDO_DIFF_MIN_CHARS = 64 * 1024  # у замен крупнее хранятся только изменившиеся строки
+UNDO_EDIT_OVERHEAD = 120  # байт на саму запись правки, сверх текста
+UNDO_FOLDER = os.path.join(DATA_FOLDER, "undo")  # история файлов между запусками (настройка persist_undo)
+UNDO_VERSION = 1
+
+# Журнал автосохранения
+JOURNAL_FOLDER = os.path.join(DATA_FOLDER, "journal")
+JOURNAL_VERSION = 1
+JOURNAL_FLUSH_MS = 1000  # правки копятся в памяти и дописываются в журнал раз в секунду
+JOURNAL_COMPACT_BYTES = 1024 * 1024  # журнал больше документа (и этого порога) заменяется снимком
+JOURNAL_SESSION = uuid.uuid4().hex  # префикс журналов этого процесса; <сессия>.lck заперт, пока процесс жив
+
+# Замеры операций (--instrument)
+STATS_WINDOW = 1000  # последних замеров на операцию
+STATS_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)  # границы корзин гистограммы
+BINARY_SNIFF_SIZE = 8192  # по нулевому байту в начале файл считается двоичным
+
+
+class LineIndex:
+    # Разреженный индекс строк: смещение начала каждой INDEX_STEP-й строки.
+    # Строится один раз в фоне и сохраняется в кэш рядом с другими данными
+    def __init__(self, file_path):
+        self.file_path = file_path
+        stat = os.stat(file_path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        self.checkpoints = array('Q', [0])
+        self.line_count = 1
+        self.scanned = 0
+        self.complete = False
+        self.lock = threading.Lock()
+
+    def cache_path(self):
+        key = hashlib.sha1(os.path.abspath(self.file_path).encode('utf-8')).hexdigest()
+        return os.path.join(INDEX_CACHE_FOLDER, key + '.idx')
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path(), 'rb') as f:
+                header = f.read(INDEX_HEADER.size)
+                magic, size, mtime, step, line_count = INDEX_HEADER.unpack(header)
+                if magic != INDEX_MAGIC or (size, mtime, step) != (self.size, self.mtime, INDEX_STEP):
+                    return False
+                checkpoints = array('Q')
+                checkpoints.frombytes(f.read())
+        except (OSError, struct.error, ValueError):
+            return False
+        with self.lock:
+            self.checkpoints = checkpoints
+            self.line_count = line_count
+            self.scanned = self.size
+            self.complete = True
+        return True
+
+    def save_cache(self):
+        os.makedirs(INDEX_CACHE_FOLDER, exist_ok=True)
+        path = self.cache_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.size, self.mtime, INDEX_STEP, self.line_count))
+            f.write(self.checkpoints.tobytes())
+        os.replace(tmp_path, path)
+
+    def build(self, mm, cancel):
+        pos = self.scanned
+        while pos < self.size and not cancel.is_set():
+            end = min(pos + INDEX_CHUNK_SIZE, self.size)
+            parts = mm[pos:end].split(b'\n')
+            # Начала строк внутри куска: накопленные длины частей плюс перевод строки
+            starts = accumulate(chain([pos], map((1).__add__, map(len, parts[:-1]))))
+            next(starts)
+            starts = array('Q', starts)
+            if starts and starts[-1] == self.size:
+                starts.pop()  # перевод строки в самом конце файла не начинает новую строку
+            first = (INDEX_STEP - self.line_count % INDEX_STEP) % INDEX_STEP
+            with self.lock:
+                self.checkpoints.extend(starts[first::INDEX_STEP])
+                self.line_count += len(starts)
+                self.scanned = end
+            pos = end
+        if pos >= self.size:
+            self.complete = True
+
+    def checkpoint_for_line(self, line):
+        # Возвращает (номер строки, смещение) ближайшей известной строки не дальше line
+        with self.lock:
+            i = min(line // INDEX_STEP, len(self.checkpoints) - 1)
+            return i * INDEX_STEP, self.checkpoints[i]
+
+    def checkpoint_for_offset(self, offset):
+        with self.lock:
+            i = bisect_right(self.checkpoints, offset) - 1
+            return i * INDEX_STEP, self.checkpoints[i]
+
+
+class LargeFileViewer:
+    # Просмотр очень больших файлов: файл отображается через mmap,
+    # а в текстовое поле попадают только видимые строки
+    def __init__(self, app, file_path, encoding='utf-8'):
+        self.app = app
+        self.text = app.text_area
+        # Строки ищутся по байту b'\n', поэтому UTF-16/32 здесь по-прежнему читаются как UTF-8
+        self.encoding = encoding if '\n'.encode(encoding) == b'\n' else 'utf-8'
+        self.file = open(file_path, 'rb')
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.file.close()
+            raise
+        self.size = len(self.mm)
+        self.top = 0
+        self.bottom = 0
+        self.index = LineIndex(file_path)
+        self.cancel = threading.Event()
+        if not self.index.load_cache():
+            threading.Thread(target=self._build_index, daemon=True).start()
+
+        self.saved_wrap = self.text.cget('wrap')
+        self.saved_yscroll = self.text.cget('yscrollcommand')
+        self.text.config(wrap=tk.NONE, yscrollcommand='')
+        self.app.scrollbar.configure(command=self.yview)
+        # Прокрутка перехватывается отдельным тегом привязок, чтобы при выходе
+        # из режима просто убрать его и не трогать остальные привязки виджета
+        for sequence, handler in (
+            ('<MouseWheel>', lambda e: self.scroll_lines(-3 if e.delta > 0 else 3)),
+            ('<Button-4>', lambda e: self.scroll_lines(-3)),
+            ('<Button-5>', lambda e: self.scroll_lines(3)),
+            ('<Up>', lambda e: self.scroll_lines(-1)),
+            ('<Down>', lambda e: self.scroll_lines(1)),
+            ('<Prior>', lambda e: self.scroll_lines(-self.visible_lines())),
+            ('<Next>', lambda e: self.scroll_lines(self.visible_lines())),
+            ('<Control-Home>', lambda e: self.moveto(0)),
+            ('<Control-End>', lambda e: self.moveto(1)),
+        ):
+            self.text.bind_class(LARGE_VIEW_TAG, sequence, self._breaking(handler))
+        self.text.bind_class(LARGE_VIEW_TAG, '<Configure>', lambda e: self.render())
+        self.text.bindtags((LARGE_VIEW_TAG,) + self.text.bindtags())
+        self.render()
+        self._poll_index()
+
+    def _build_index(self):
+        self.index.build(self.mm, self.cancel)
+        if self.index.complete:
+            try:
+                self.index.save_cache()
+            except OSError:
+                pass  # без кэша индекс просто построится заново в следующий раз
+
+    def _poll_index(self):
+        if self.cancel.is_set():
+            return
+        self.update_status()
+        if not self.index.complete:
+            self.app.root.after(LARGE_VIEW_STATUS_MS, self._poll_index)
+
+    def close(self):
+        self.cancel.set()
+        self.text.bindtags(tuple(t for t in self.text.bindtags() if t != LARGE_VIEW_TAG))
+        self.text.config(state=tk.NORMAL, wrap=self.saved_wrap, yscrollcommand=self.saved_yscroll)
+        self.app.scrollbar.configure(command=self.text.yview)
+        self.text.delete(1.0, tk.END)
+        self.mm.close()
+        self.file.close()
+
+    def visible_lines(self):
+        linespace = tkfont.Font(font=self.text.cget('font')).metrics('linespace')
+        return max(1, self.text.winfo_height() // linespace)
+
+    def next_line(self, pos):
+        if pos >= self.size:
+            return self.size
+        nl = self.mm.find(b'\n', pos, min(self.size, pos + MAX_LINE_BYTES))
+        return nl + 1 if nl != -1 else min(self.size, pos + MAX_LINE_BYTES)
+
+    def prev_line(self, pos):
+        if pos <= 0:
+            return 0
+        start = max(0, pos - 1 - MAX_LINE_BYTES)
+        nl = self.mm.rfind(b'\n', start, pos - 1)
+        return nl + 1 if nl != -1 else start
+
+    def line_start(self, pos):
+        # Начало строки, в которую попадает смещение pos
+        if pos <= 0 or self.mm[pos - 1:pos] == b'\n':
+            return pos
+        return self.prev_line(pos + 1) if pos < self.size else self.prev_line(self.size)
+
+    def render(self):
+        pos = self.top
+        for _ in range(self.visible_lines()):
+            if pos >= self.size:
+                break
+            pos = self.next_line(pos)
+        self.bottom = pos
+        content = self.mm[self.top:self.bottom].decode(self.encoding, errors='replace').replace('\r\n', '\n')
+        if self.top == 0:
+            content = content.lstrip('\ufeff')
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        self.text.insert(1.0, content)
+        self.text.config(state=tk.DISABLED)
+        self.text.edit_modified(False)  # перерисовка - не правка документа
+        if self.size:
+            self.app.scrollbar.set(self.top / self.size, self.bottom / self.size)
+        else:
+            self.app.scrollbar.set(0, 1)
+        self.update_status()
+
+    def scroll_lines(self, count):
+        pos = self.top
+        step = self.next_line if count > 0 else self.prev_line
+        for _ in range(abs(count)):
+            new_pos = step(pos)
+            if new_pos == pos or (count > 0 and new_pos >= self.size):
+                break
+            pos = new_pos
+        if pos != self.top:
+            self.top = pos
+            self.render()
+
+    def moveto(self, fraction):
+        fraction = min(max(float(fraction), 0.0), 1.0)
+        self.top = self.line_start(int(self.size * fraction))
+        if fraction >= 1.0:
+            self.top = self.line_start(self.size)
+            self.scroll_lines(-(self.visible_lines() - 1))
+        self.render()
+
+    def goto_line(self, line):
+        # Номера строк с 1, как в tk.Text
+        known_line, pos = self.index.checkpoint_for_line(max(line - 1, 0))
+        for _ in range(max(line - 1, 0) - known_line):
+            new_pos = self.next_line(pos)
+            if new_pos >= self.size:
+                break
+            pos = new_pos
+        self.top = pos
+        self.render()
+
+    def line_number(self, pos):
+        # None, если индекс ещё не дошёл до этого места
+        if not self.index.complete and pos > self.index.scanned:
+            return None
+        known_line, start = self.index.checkpoint_for_offset(pos)
+        return known_line + self.mm[start:pos].count(b'\n') + 1
+
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            self.moveto(args[1])
+        elif args[0] == 'scroll':
+            count = int(args[1])
+            if args[2] == 'pages':
+                count *= self.visible_lines()
+            self.scroll_lines(count)
+
+    @staticmethod
+    def _breaking(handler):
+        def wrapper(event):
+            handler(event)
+            return 'break'
+        return wrapper
+
+    def update_status(self):
+        tr = self.app.translations[self.app.language]
+        line = self.line_number(self.top)
+        status = f"{tr['read_only']} | {tr['line']} {line if line is not None else '?'}"
+        if self.index.complete:
+            status += f" / {self.index.line_count}"
+        elif self.size:
+            status += f" | {tr['indexing']} {self.index.scanned * 100 // self.size}%"
+        self.app.status_label.config(text=status)
+
+
+class TextFormat:
+    # Кодировка, BOM и переводы строк файла: сохраняем файл в том же виде, в каком открыли
+    def __init__(self, encoding='utf-8', bom=False, newline=None, mixed=False):
+        self.encoding = encoding
+        self.bom = bom
+        self.newline = newline  # None - перевод строки платформы (новые файлы)
+        self.mixed = mixed  # в файле разные переводы строк; при полной записи все станут newline
+
+
+def detect_newline(text):
+    # Первый перевод строки в образце; None, если в образце его нет
+    lf = text.find('\n')
+    cr = text.find('\r')
+    if cr == -1 or (lf != -1 and lf < cr):
+        return '\n' if lf != -1 else None
+    return '\r' if text[cr + 1:cr + 2] not in ('\n', '') else '\r\n'
+
+
+def guess_encoding(head):
+    if b'\x00' in head:
+        # UTF-16 без BOM: у латиницы, цифр и переводов строк один байт из пары нулевой
+        zeros_even, zeros_odd = head[0::2].count(0), head[1::2].count(0)
+        if zeros_odd > len(head) // 4 and not zeros_even:
+            return 'utf-16-le'
+        if zeros_even > len(head) // 4 and not zeros_odd:
+            return 'utf-16-be'
+    for encoding in ('utf-8',) + FALLBACK_ENCODINGS:
+        try:
+            # final=False: символ, обрезанный концом образца, - не ошибка
+            codecs.getincrementaldecoder(encoding)().decode(head)
+            return encoding
+        except UnicodeDecodeError:
+            pass
+    return FALLBACK_ENCODINGS[-1]
+
+
+def detect_format(head):
+    # Формат файла по первым ENCODING_SNIFF_SIZE байтам
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            head = head[len(bom):]
+            break
+    else:
+        bom = b''
+        encoding = guess_encoding(head)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(head)
+    return TextFormat(encoding, bool(bom), detect_newline(text))
+
+
+def read_text(path, fmt):
+    # Файл целиком; переводы строк приводятся к '\n', как в tk.Text
+    with open(path, 'r', encoding=fmt.encoding) as f:
+        text = f.read()
+    return text[1:] if fmt.bom else text
+
+
+def write_text(f, content):
+    # TextIOWrapper кодирует строку целиком - пишем кусками, чтобы рядом с текстом
+    # в памяти не появлялась вторая, закодированная копия всего файла
+    for start in range(0, len(content), SAVE_CHUNK_SIZE):
+        f.write(content[start:start + SAVE_CHUNK_SIZE])
+
+
+def transcode(src, dst, encoding, bom=None, newline=None, source_encoding=None):
+    # Перекодирует двоичный поток src в dst кусками по LOAD_CHUNK_SIZE байт: подходит
+    # и для stdin/stdout, и для файлов любого размера. bom и newline None - как в исходном
+    # файле (переводы строк тогда не трогаются вовсе). Возвращает формат исходного файла
+    head = src.read(ENCODING_SNIFF_SIZE)
+    source = detect_format(head)
+    if source_encoding is not None and codecs.lookup(source_encoding).name != codecs.lookup(source.encoding).name:
+        source = TextFormat(source_encoding)
+    # Эти кодеки пишут BOM сами - берём вариант без него, а метку ставим сами, если её не запретили
+    explicit = {'utf-8-sig': 'utf-8', 'utf-16': 'utf-16-le', 'utf-32': 'utf-32-le'}.get(codecs.lookup(encoding).name)
+    if explicit is not None:
+        encoding = explicit
+        bom = True if bom is None else bom
+    if codecs.lookup(encoding).name not in {name for _, name in BOMS}:
+        bom = False  # U+FEFF есть только в UTF-кодировках: cp1251 и прочие его не закодируют
+    decoder = codecs.getincrementaldecoder(source.encoding)()
+    if newline is not None:
+        decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+    encoder = codecs.getincrementalencoder(encoding)()
+    if source.bom if bom is None else bom:
+        dst.write(encoder.encode('\ufeff'))
+    skip_bom = source.bom
+    data = head
+    while True:
+        final = not data
+        text = decoder.decode(data, final)
+        if skip_bom and text:
+            text = text[1:]
+            skip_bom = False
+        if newline not in (None, '\n'):
+            text = text.replace('\n', newline)
+        dst.write(encoder.encode(text, final))
+        if final:
+            return source
+        data = src.read(LOAD_CHUNK_SIZE)
+
+
+def transcode_file(src_path, dst_path, encoding, bom=None, newline=None, source_encoding=None):
+    # '-' - stdin/stdout. Файл результата подменяется целиком, как при сохранении
+    with (open(src_path, 'rb') if src_path != '-' else sys.stdin.buffer) as src:
+        if dst_path == '-':
+            source = transcode(src, sys.stdout.buffer, encoding, bom, newline, source_encoding)
+            sys.stdout.buffer.flush()
+        else:
+            result = []
+            replace_atomic(dst_path, lambda f: result.append(
+                transcode(src, f, encoding, bom, newline, source_encoding)
+            ))
+            source = result[0]
+    return source.encoding
+
+
+# mkstemp создаёт файл с правами 0600; новым файлам даём те же права, что дал бы open().
+# umask читается один раз при загрузке модуля: os.umask() меняет его на весь процесс,
+# а сохраняет фоновый поток
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def replace_atomic(path, write):
+    # write(f) пишет во временный двоичный файл рядом с целевым, который затем подменяет
+    # целевой одним os.replace: при сбое на диске остаётся либо старая, либо новая версия целиком.
+    # Для символической ссылки подменяется файл, на который она указывает, а не сама ссылка
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+        if st is not None and st.st_nlink > 1:
+            # У файла есть другие жёсткие ссылки: после os.replace они остались бы со старой
+            # версией. Новый текст уже целиком на диске - переписываем файл на месте
+            with open(tmp_path, 'rb') as src, open(path, 'r+b') as dst:
+                shutil.copyfileobj(src, dst)
+                dst.truncate()
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(tmp_path)
+            return
+        os.chmod(tmp_path, stat.S_IMODE(st.st_mode) if st is not None else 0o666 & ~UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_atomic(path, content, fmt=None):
+    fmt = fmt or TextFormat()
+
+    def write(f):
+        text = io.TextIOWrapper(f, encoding=fmt.encoding, newline=fmt.newline)
+        if fmt.bom:
+            text.write('\ufeff')
+        write_text(text, content)
+        text.detach()  # сбрасывает буфер, но не закрывает f
+
+    replace_atomic(path, write)
+
+
+class StaleFileError(Exception):
+    # Файл на диске изменился не через нас - дописывать в его конец нельзя
+    pass
+
+
+def append_durable(path, content, fmt=None):
+    # Хвост пишется в кодировке и с переводами строк самого файла
+    fmt = fmt or TextFormat()
+    with open(path, 'a', encoding=fmt.encoding, newline=fmt.newline) as f:
+        write_text(f, content)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class SaveWorker:
+    # Один фоновый поток записи. Если файл ещё пишется, а его снова сохранили,
+    # в очереди остаётся только последняя версия - частый Ctrl+S не копит работу.
+    # Дописывания в конец склеиваются с ожидающей задачей того же файла.
+    # Каждый callback вызывается ровно один раз, даже если его задачу вытеснила или
+    # поглотила следующая: по нему вкладки считают незавершённые сохранения (Document.saves).
+    # callback(путь, ошибка, байт): число байт, записанных задачей, получает только последний
+    # callback задачи, у поглощённых там None - так одна запись на диск и учитывается один раз
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = {}  # путь -> [режим, содержимое, [callback, ...], TextFormat]
+        self.known = {}  # путь -> (размер, mtime) после нашей последней записи
+        self.busy = False
+        self.writing = None  # путь файла, который пишется прямо сейчас
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def remember(self, path):
+        # Запоминаем состояние файла, с которым совпадает буфер (после открытия)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self.cond:
+            self.known[path] = (st.st_size, st.st_mtime_ns)
+
+    def submit(self, path, content, callback, append=False, fmt=None):
+        with self.cond:
+            job = self.pending.get(path)
+            if job is None:
+                self.pending[path] = ['append' if append else 'write', content, [callback], fmt]
+            elif append and job[0] != 'remove':
+                job[1] += content
+                job[2].append(callback)
+            else:
+                # Вытесненная версия тоже получит ответ - вместе с той, что её заменила
+                self.pending[path] = ['write', content, job[2] + [callback], fmt]
+            self.cond.notify_all()
+
+    def remove(self, path, callback):
+        # Удаление идёт через ту же очередь, поэтому не обгонит ожидающую запись файла
+        with self.cond:
+            job = self.pending.get(path)
+            self.pending[path] = ['remove', None, (job[2] if job else []) + [callback], None]
+            self.cond.notify_all()
+
+    def settled_stat(self, path):
+        # (размер, mtime) после нашей последней записи; None, если файл ещё пишется
+        with self.cond:
+            if path in self.pending or path == self.writing:
+                return None
+            return self.known.get(path)
+
+    def changed_on_disk(self, path):
+        # Файл изменён не через нас с момента открытия или нашей последней записи
+        with self.cond:
+            if path in self.pending or path == self.writing:
+                return False
+            expected = self.known.get(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False  # файл удалили - текст в памяти остаётся, его можно сохранить заново
+        return expected != (st.st_size, st.st_mtime_ns)
+
+    def wait_idle(self, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending and not self.busy, timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending)
+                path = next(iter(self.pending))
+                mode, content, callbacks, fmt = self.pending.pop(path)
+                expected = self.known.get(path)
+                self.busy = True
+                self.writing = path
+            try:
+                written = 0
+                if mode == 'remove':
+                    if os.path.exists(path):
+                        os.remove(path)
+                    st = None
+                else:
+                    size = 0
+                    if mode == 'append':
+                        st = os.stat(path)
+                        if expected != (st.st_size, st.st_mtime_ns):
+                            raise StaleFileError(path)
+                        size = st.st_size
+                        append_durable(path, content, fmt)
+                    else:
+                        write_atomic(path, content, fmt)
+                    st = os.stat(path)
+                    # Размер в байтах берём с диска: текст в памяти не перекодируем ещё раз
+                    written = st.st_size - size
+                error = None
+            except Exception as e:
+                error = e
+            with self.cond:
+                if error is None and st is not None:
+                    self.known[path] = (st.st_size, st.st_mtime_ns)
+                else:
+                    self.known.pop(path, None)
+                    # Следующие дописывания опирались бы на неудачную запись
+                    job = self.pending.get(path)
+                    if error is not None and job is not None and job[0] == 'append':
+                        del self.pending[path]
+                        callbacks += job[2]
+                self.busy = False
+                self.writing = None
+                self.cond.notify_all()
+            for callback in callbacks[:-1]:
+                callback(path, error, None)
+            callbacks[-1](path, error, written if error is None else None)
+
+
+class EditHistory:
+    # История правок документа для отмены и повтора. Правка - [индекс, текст, длина]:
+    # заменить `длина` символов с индекса на `текст`. В стопках лежит только текст, которого
+    # сейчас нет в поле (удалённый - в отмене, отменённый - в повторе), а видимый при
+    # отмене читается из поля. Поэтому даже большая вставка почти ничего не стоит,
+    # а крупная замена хранится только изменившимися строками
+    def __init__(self, limit):
+        self.limit = limit  # байт на обе стопки; старые группы вытесняются первыми
+        self.undo_stack = deque()  # группы правок: всё, что сделано за одно событие
+        self.redo_stack = []
+        self.size = 0
+        self.group_open = False
+        self.last_edit = 0.0  # для склейки набора текста
+
+    @staticmethod
+    def cost(group):
+        return sum(sys.getsizeof(text) + UNDO_EDIT_OVERHEAD for _, text, _ in group)
+
+    @staticmethod
+    def split(index, old, new):
+        # Крупная замена -> правки только изменившихся строк. Индексы - в координатах
+        # нового текста по возрастанию: отмена идёт с конца и не сдвигает ещё не отменённые.
+        # Работает в потоке интерфейса, поэтому за линейное время: общие строки в начале
+        # и в конце отбрасываются, а середина сравнивается построчно, если число строк
+        # в ней не изменилось (замена всех совпадений без переводов строк). Иначе середина
+        # хранится целиком. Пустой список - текст не изменился
+        if old == new:
+            return []
+        if len(old) + len(new) < UNDO_DIFF_MIN_CHARS or not old or not new:
+            return [[index, old, len(new)]]
+        old_lines = old.splitlines(keepends=True)
+        new_lines = new.splitlines(keepends=True)
+        offsets = [0] + list(accumulate(map(len, new_lines)))
+        first = 0
+        limit = min(len(old_lines), len(new_lines))
+        while first < limit and old_lines[first] == new_lines[first]:
+            first += 1
+        old_end, new_end = len(old_lines), len(new_lines)
+        while old_end > first and new_end > first and old_lines[old_end - 1] == new_lines[new_end - 1]:
+            old_end -= 1
+            new_end -= 1
+        if old_end - first != new_end - first:
+            hunks = [(first, old_end, first, new_end)]
+        else:
+            hunks = []
+            for i in range(first, old_end):
+                if old_lines[i] == new_lines[i]:
+                    continue
+                if hunks and hunks[-1][1] == i:
+                    hunks[-1] = (hunks[-1][0], i + 1, hunks[-1][2], i + 1)  # соседние строки - одна правка
+                else:
+                    hunks.append((i, i + 1, i, i + 1))
+        return [
+            [f"{index}+{offsets[j1]}c", ''.join(old_lines[i1:i2]), offsets[j2] - offsets[j1]]
+            for i1, i2, j1, j2 in hunks
+        ]
+
+    def record(self, edits, now):
+        # edits - [(индекс, удаляемый текст, вставляемый текст)] одной команды tk.Text
+        if self.redo_stack:
+            self.size -= sum(map(self.cost, self.redo_stack))
+            self.redo_stack = []
+        coalesced = not self.group_open and len(edits) == 1 and self.coalesce(edits[0], now)
+        self.last_edit = now
+        if coalesced:
+            return
+        group = []
+        for index, old, new in edits:
+            group.extend(self.split(index, old, new))
+        if not group:
+            return  # замена на тот же текст - отменять нечего
+        if not self.group_open:
+            self.undo_stack.append([])
+            self.group_open = True
+        self.undo_stack[-1].extend(group)
+        self.size += self.cost(group)
+        self.trim()
+
+    def coalesce(self, edit, now):
+        # Набор и стирание по символу в пределах строки склеиваются с предыдущей правкой
+        if now - self.last_edit > UNDO_COALESCE_SECONDS or not self.undo_stack or len(self.undo_stack[-1]) != 1:
+            return False
+        last = self.undo_stack[-1][0]
+        index, old, new = edit
+        try:
+            line, col = map(int, index.split('.'))
+            last_line, last_col = map(int, last[0].split('.'))
+        except ValueError:
+            return False  # индекс вида 'x.y+Nc' от разбитой замены
+        if line != last_line or '\n' in old + new:
+            return False
+        if not old and len(new) == 1 and not last[1] and col == last_col + last[2]:
+            last[2] += 1  # набор
+            return True
+        if not new and len(old) == 1 and last[2] == 0:
+            if col + 1 == last_col:
+                text = old + last[1]  # Backspace
+                last[0] = index
+            elif col == last_col:
+                text = last[1] + old  # Delete
+            else:
+                return False
+            self.size += sys.getsizeof(text) - sys.getsizeof(last[1])
+            last[1] = text
+            return True
+        return False
+
+    def trim(self):
+        while self.size > self.limit and self.undo_stack:
+            self.size -= self.cost(self.undo_stack.popleft())
+        if not self.undo_stack:
+            self.group_open = False
+        if self.size > self.limit:
+            self.size = 0
+            self.redo_stack = []
+
+    def pop(self, redo=False):
+        # Следующая группа для отмены (или повтора); None, если отменять нечего
+        self.group_open = False
+        self.last_edit = 0.0  # набор после отмены не склеивается со старой правкой
+        stack = self.redo_stack if redo else self.undo_stack
+        if not stack:
+            return None
+        group = stack.pop()
+        self.size -= self.cost(group)
+        return group
+
+    def push(self, group, redo=False):
+        (self.redo_stack if redo else self.undo_stack).append(group)
+        self.size += self.cost(group)
+        self.trim()
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack = []
+        self.size = 0
+        self.group_open = False
+
+    def dump(self, stat):
+        # stat - (размер, mtime) файла, к тексту которого относится история
+        return json.dumps({
+            'version': UNDO_VERSION, 'stat': list(stat), 'undo': list(self.undo_stack), 'redo': self.redo_stack
+        }, ensure_ascii=False)
+
+    def load(self, data, stat):
+        # Историю берём, только если файл с тех пор не меняли
+        state = json.loads(data)
+        if state.get('version') != UNDO_VERSION or state.get('stat') != list(stat):
+            return False
+        self.clear()
+        self.undo_stack.extend(state['undo'])
+        self.redo_stack = state['redo']
+        self.size = sum(map(self.cost, self.undo_stack)) + sum(map(self.cost, self.redo_stack))
+        self.trim()
+        return True
+
+
+def history_path(file_path):
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(UNDO_FOLDER, key + '.json')
+
+
+class Document:
+    # Вкладка редактора. Активный документ живёт в text_area и полях приложения,
+    # сюда его состояние складывается, когда пользователь переключается на другую вкладку
+    def __init__(self, path=None, history_limit=UNDO_HISTORY_MB * 1024 * 1024):
+        self.path = path
+        self.content = None  # текст буфера; None - ещё не загружен или вытеснен из кэша
+        self.large = False  # открыт в режиме просмотра большого файла
+        self.modified = False
+        self.saved_path = None
+        self.append_only = False
+        self.text_format = TextFormat()
+        self.saved_end = '1.0'
+        self.cursor = '1.0'
+        self.yview = 0.0
+        self.saves = 0  # сохранений в очереди SaveWorker
+        self.journal_path = os.path.join(JOURNAL_FOLDER, f'{JOURNAL_SESSION}-{uuid.uuid4().hex}.log')
+        self.journal = None
+        self.history = EditHistory(history_limit)
+
+    def pinned(self):
+        # Несохранённый текст есть только в памяти - его нельзя вытеснять
+        return self.modified or self.saves > 0
+
+
+class BufferCache:
+    # Тексты неактивных вкладок в порядке последнего использования. Когда их
+    # суммарный размер превышает лимит, самые давние вытесняются и при
+    # возврате на вкладку перечитываются с диска
+    def __init__(self, limit):
+        self.limit = limit  # байт
+        self.docs = OrderedDict()  # документ -> размер текста
+        self.size = 0
+
+    def put(self, doc):
+        self.take(doc)
+        size = sys.getsizeof(doc.content)
+        self.docs[doc] = size
+        self.size += size
+        self.evict()
+
+    def take(self, doc):
+        size = self.docs.pop(doc, None)
+        if size is not None:
+            self.size -= size
+
+    def evict(self):
+        for doc in list(self.docs):
+            if self.size <= self.limit:
+                break
+            if doc.pinned():
+                continue
+            self.take(doc)
+            doc.content = None
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def scan_directory(path):
+    # Содержимое папки: (имя, это папка, размер). Сначала папки, затем файлы,
+    # внутри - по имени без учёта регистра
+    dirs = []
+    files = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    dirs.append((entry.name, True, None))
+                else:
+                    files.append((entry.name, False, entry.stat().st_size))
+            except OSError:
+                files.append((entry.name, False, None))  # битая ссылка или нет прав
+    dirs.sort(key=lambda item: item[0].casefold())
+    files.sort(key=lambda item: item[0].casefold())
+    return dirs + files
+
+
+class DirectoryCache:
+    # Списки папок по пути. Запись годна, пока у папки то же mtime: создание,
+    # удаление и переименование файлов в ней меняют mtime. Читается из фоновых потоков
+    def __init__(self, size=DIR_CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.listings = OrderedDict()  # путь -> (mtime, записи)
+
+    def listing(self, path):
+        mtime = os.stat(path).st_mtime_ns
+        with self.lock:
+            cached = self.listings.get(path)
+            if cached is not None and cached[0] == mtime:
+                self.listings.move_to_end(path)
+                return cached
+        entries = scan_directory(path)
+        with self.lock:
+            self.listings[path] = (mtime, entries)
+            self.listings.move_to_end(path)
+            while len(self.listings) > self.size:
+                self.listings.popitem(last=False)
+        return mtime, entries
+
+
+class DirectoryPane:
+    # Дерево папок сбоку от редактора. Папка читается в фоновом потоке только
+    # при раскрытии, а длинный список вставляется в дерево порциями по тикам
+    def __init__(self, app, parent):
+        self.app = app
+        self.cache = DirectoryCache()
+        self.root_path = None
+        self.listed = {}  # папка -> mtime показанного списка
+        self.pending = OrderedDict()  # папка -> (записи, сколько уже вставлено)
+        self.insert_job = None
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=('size',), selectmode='browse')
+        self.tree.column('size', width=80, stretch=False, anchor=tk.E)
+        scroll = ttk.Scrollbar(self.frame, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(expand=True, fill=tk.BOTH)
+        self.tree.bind('<<TreeviewOpen>>', self.on_open)
+        self.tree.bind('<Double-1>', self.on_activate)
+        self.tree.bind('<Return>', self.on_activate)
+        self.retranslate()
+
+    def retranslate(self):
+        tr = self.app.translations[self.app.language]
+        self.tree.heading('#0', text=tr['name'])
+        self.tree.heading('size', text=tr['size'])
+
+    def set_root(self, path):
+        path = os.path.abspath(path)
+        if path == self.root_path:
+            return
+        self.root_path = path
+        self.tree.delete(*self.tree.get_children())
+        self.listed.clear()
+        self.pending.clear()
+        self.tree.insert('', tk.END, iid=path, text=path, open=True, tags=('dir',))
+        self.request(path)
+
+    def request(self, folder):
+        threading.Thread(target=self._scan_worker, args=(folder,), daemon=True).start()
+
+    def _scan_worker(self, folder):
+        try:
+            mtime, entries = self.cache.listing(folder)
+        except OSError as e:
+            self.app.call_in_ui(self.on_scan_error, folder, e)
+            return
+        self.app.call_in_ui(self.on_listing, folder, mtime, entries)
+
+    def on_open(self, event=None):
+        # Раскрытую папку перечитываем всегда: если mtime не изменилось, список
+        # берётся из кэша и дерево не трогается
+        self.request(self.tree.focus())
+
+    def on_listing(self, folder, mtime, entries):
+        if not self.tree.exists(folder) or self.listed.get(folder) == mtime:
+            return
+        self.forget_subtree(folder)
+        self.listed[folder] = mtime
+        self.tree.delete(*self.tree.get_children(folder))
+        self.pending[folder] = (entries, 0)
+        if self.insert_job is None:
+            self.insert_batch()
+
+    def on_scan_error(self, folder, error):
+        if not self.tree.exists(folder):
+            return
+        self.forget_subtree(folder)
+        self.tree.delete(*self.tree.get_children(folder))
+        self.app.status_label.config(text=str(error))
+
+    def forget_subtree(self, folder):
+        # Список папки перестраивается - раскрытые внутри неё папки тоже исчезнут
+        prefix = os.path.join(folder, '')
+        for path in [path for path in self.listed if path == folder or path.startswith(prefix)]:
+            del self.listed[path]
+        for path in [path for path in self.pending if path == folder or path.startswith(prefix)]:
+            del self.pending[path]
+
+    def insert_batch(self):
+        self.insert_job = None
+        deadline = time.perf_counter() + LOAD_TICK_BUDGET
+        while self.pending and time.perf_counter() < deadline:
+            folder, (entries, done) = next(iter(self.pending.items()))
+            end = min(done + DIR_INSERT_BATCH, len(entries))
+            for name, is_dir, size in entries[done:end]:
+                path = os.path.join(folder, name)
+                if is_dir:
+                    self.tree.insert(folder, tk.END, iid=path, text=name, tags=('dir',))
+                    self.tree.insert(path, tk.END, text='...')  # заглушка, чтобы у папки была стрелка
+                else:
+                    self.tree.insert(folder, tk.END, iid=path, text=name, values=(format_size(size) if size is not None else '',), tags=('file',))
+            if end < len(entries):
+                self.pending[folder] = (entries, end)
+            else:
+                del self.pending[folder]
+        if self.pending:
+            self.insert_job = self.app.root.after(DIR_POLL_MS, self.insert_batch)
+
+    def on_activate(self, event=None):
+        item = self.tree.focus()
+        if item and self.tree.tag_has('file', item):
+            self.app.open_document(item)
+
+
+def search_pattern(text, match_case):
+    # Регулярное выражение по байтам UTF-8: файлы не декодируются целиком.
+    # Без учёта регистра каждая буква становится альтернативой её вариантов,
+    # так работает и для кириллицы, для которой re.IGNORECASE по байтам бессилен
+    if match_case or not any(ch.lower() != ch.upper() for ch in text):
+        return re.escape(text.encode('utf-8'))
+    parts = []
+    for ch in text:
+        variants = sorted({ch, ch.lower(), ch.upper()})
+        if len(variants) == 1:
+            parts.append(re.escape(ch.encode('utf-8')))
+        else:
+            parts.append(b'(?:' + b'|'.join(re.escape(v.encode('utf-8')) for v in variants) + b')')
+    return b''.join(parts)
+
+
+def iter_file_batches(folder, cancel):
+    # Обход папки пачками путей: одна пачка - одна задача пула процессов
+    stack = [folder]
+    batch = []
+    batch_bytes = 0
+    while stack and not cancel.is_set():
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    batch_bytes += entry.stat().st_size
+                except OSError:
+                    continue
+                batch.append(entry.path)
+                if len(batch) >= FIND_TASK_FILES or batch_bytes >= FIND_TASK_BYTES:
+                    yield batch
+                    batch = []
+                    batch_bytes = 0
+    if batch:
+        yield batch
+
+
+def find_in_file(path, regex):
+    # Совпадения в одном файле: [(путь, номер строки, текст строки)].
+    # Файл отображается через mmap и в память целиком не читается
+    try:
+        with open(path, 'rb') as f:
+            if b'\0' in f.read(BINARY_SNIFF_SIZE):
+                return []  # двоичный файл
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return []  # нет доступа или пустой файл
+    hits = []
+    with mm:
+        line = 1
+        counted = 0  # до этого смещения строки уже посчитаны
+        line_end = -1
+        for match in regex.finditer(mm):
+            start = match.start()
+            if start <= line_end:
+                continue  # в этой строке совпадение уже есть
+            line += mm[counted:start].count(b'\n')
+            counted = start
+            line_start = mm.rfind(b'\n', 0, start) + 1
+            line_end = mm.find(b'\n', start)
+            if line_end < 0:
+                line_end = len(mm)
+            text = mm[line_start:min(line_end, line_start + FIND_LINE_CHARS * 4)]
+            hits.append((path, line, text.decode('utf-8', errors='replace')[:FIND_LINE_CHARS].strip()))
+            if len(hits) >= FIND_MAX_HITS_PER_FILE:
+                break
+    return hits
+
+
+def find_in_files(paths, pattern):
+    # Задача для пула процессов: (совпадения, сколько файлов проверено)
+    regex = re.compile(pattern)
+    hits = []
+    for path in paths:
+        hits.extend(find_in_file(path, regex))
+    return hits, len(paths)
+
+
+class FindInFiles:
+    # Окно поиска по файлам папки. Папка обходится в фоновом потоке, файлы
+    # проверяются пачками в пуле процессов на всех ядрах, результаты
+    # появляются в списке по мере готовности
+    def __init__(self, app, folder):
+        self.app = app
+        self.cancel = None
+        self.search_id = 0
+        self.found = 0
+        self.files = 0
+        tr = app.translations[app.language]
+
+        self.win = tk.Toplevel(app.root)
+        self.win.title(tr['find_in_files'])
+        self.win.geometry("800x500")
+        self.win.protocol('WM_DELETE_WINDOW', self.close)
+        form = ttk.Frame(self.win)
+        ttk.Label(form, text=tr['find']).grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.query_var = tk.StringVar()
+        query_entry = ttk.Entry(form, textvariable=self.query_var)
+        query_entry.grid(row=0, column=1, sticky=tk.EW, padx=5, pady=5)
+        query_entry.bind('<Return>', lambda e: self.start())
+        self.search_btn = ttk.Button(form, text=tr['start_search'], command=self.start)
+        self.search_btn.grid(row=0, column=2, padx=5, pady=5)
+        ttk.Label(form, text=tr['folder']).grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        self.folder_var = tk.StringVar(value=folder)
+        ttk.Entry(form, textvariable=self.folder_var).grid(row=1, column=1, sticky=tk.EW, padx=5, pady=5)
+        ttk.Button(form, text='...', width=3, command=self.choose_folder).grid(row=1, column=2, padx=5, pady=5)
+        self.case_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(form, text=tr['match_case'], variable=self.case_var).grid(row=2, column=1, sticky=tk.W, padx=5)
+        self.stop_btn = ttk.Button(form, text=tr['cancel'], command=self.stop, state=tk.DISABLED)
+        self.stop_btn.grid(row=2, column=2, padx=5, pady=5)
+        form.columnconfigure(1, weight=1)
+        form.pack(side=tk.TOP, fill=tk.X)
+
+        self.status_label = ttk.Label(self.win, text='')
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+        list_frame = ttk.Frame(self.win)
+        self.tree = ttk.Treeview(list_frame, columns=('file', 'line', 'text'), show='headings', selectmode='browse')
+        self.tree.heading('file', text=tr['file'])
+        self.tree.heading('line', text=tr['line'])
+        self.tree.heading('text', text=tr['text'])
+        self.tree.column('file', width=250)
+        self.tree.column('line', width=60, stretch=False, anchor=tk.E)
+        scroll = ttk.Scrollbar(list_frame, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(expand=True, fill=tk.BOTH)
+        list_frame.pack(expand=True, fill=tk.BOTH)
+        self.tree.bind('<Double-1>', self.on_activate)
+        self.tree.bind('<Return>', self.on_activate)
+        query_entry.focus_set()
+
+    def choose_folder(self):
+        folder = self.app.filedialog.askdirectory(parent=self.win)
+        if folder:
+            self.folder_var.set(folder)
+
+    def start(self):
+        text = self.query_var.get()
+        folder = self.folder_var.get()
+        if not text or not os.path.isdir(folder):
+            return
+        self.stop()
+        self.tree.delete(*self.tree.get_children())
+        self.found = 0
+        self.files = 0
+        self.cancel = threading.Event()
+        threading.Thread(
+            target=self._search_worker,
+            args=(self.search_id, folder, search_pattern(text, self.case_var.get()), self.cancel),
+            daemon=True
+        ).start()
+        self.search_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.NORMAL)
+        self.update_status()
+
+    def stop(self):
+        if self.cancel is None:
+            return
+        self.cancel.set()
+        self.cancel = None
+        self.search_id += 1  # результаты прерванного поиска больше не принимаем
+        self.search_btn.config(state=tk.NORMAL)
+        self.stop_btn.config(state=tk.DISABLED)
+        self.status_label.config(text=self.app.translations[self.app.language]['search_cancelled'])
+
+    def close(self):
+        self.stop()
+        self.win.destroy()
+
+    def _search_worker(self, search_id, folder, pattern, cancel):
+        # spawn, а не fork: процесс с Tk и живыми потоками копировать небезопасно
+        jobs = os.cpu_count() or 1
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+            running = set()
+            try:
+                for batch in iter_file_batches(folder, cancel):
+                    # Обход не убегает далеко вперёд проверки: очередь задач ограничена
+                    while len(running) >= jobs * FIND_TASKS_PER_JOB and not cancel.is_set():
+                        running = self._collect(search_id, running)
+                    if cancel.is_set():
+                        break
+                    running.add(pool.submit(find_in_files, batch, pattern))
+                while running and not cancel.is_set():
+                    running = self._collect(search_id, running)
+            finally:
+                if cancel.is_set():
+                    pool.shutdown(wait=False, cancel_futures=True)
+        self.app.call_in_ui(self.on_finished, search_id, time.perf_counter() - started)
+
+    def _collect(self, search_id, running):
+        done, running = wait(running, timeout=0.1, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                hits, files = future.result()
+            except Exception:
+                continue  # упавшая пачка не должна останавливать весь поиск
+            self.app.call_in_ui(self.on_results, search_id, hits, files)
+        return running
+
+    def on_results(self, search_id, hits, files):
+        if search_id != self.search_id or not self.win.winfo_exists():
+            return
+        self.files += files
+        shown = hits[:max(0, FIND_MAX_RESULTS - self.found)]
+        for path, line, text in shown:
+            self.tree.insert('', tk.END, values=(path, line, text))
+        self.found += len(shown)
+        if self.found >= FIND_MAX_RESULTS:
+            self.cancel.set()  # дальше искать незачем - список всё равно не покажет
+        self.update_status()
+
+    def on_finished(self, search_id, elapsed):
+        if search_id != self.search_id or not self.win.winfo_exists():
+            return
+        self.cancel = None
+        self.search_id += 1
+        self.search_btn.config(state=tk.NORMAL)
+        self.stop_btn.config(state=tk.DISABLED)
+        self.update_status(elapsed)
+
+    def update_status(self, elapsed=None):
+        tr = self.app.translations[self.app.language]
+        status = f"{tr['found']}: {self.found} | {tr['files_searched']}: {self.files}"
+        if elapsed is None:
+            status = f"{tr['searching']}... {status}"
+        else:
+            status += f" | {elapsed:.1f} s"
+        self.status_label.config(text=status)
+
+    def on_activate(self, event=None):
+        item = self.tree.focus()
+        if not item:
+            return
+        path, line, text = self.tree.item(item, 'values')
+        self.app.open_document(path)
+        self.app.goto_line(int(line))
+
+
+class FindBar:
+    # Панель поиска и замены над текстом. Ищет сам tk.Text (search), а подсветка
+    # ставится только на видимые строки и достраивается при прокрутке - так
+    # сотни тысяч совпадений в большом файле не превращаются в сотни тысяч тегов
+    def __init__(self, app, parent):
+        self.app = app
+        self.text = app.text_area
+        self.visible = False
+        self.search_job = None
+        self.highlight_job = None
+        tr = app.translations[app.language]
+
+        self.frame = ttk.Frame(parent)
+        self.find_var = tk.StringVar()
+        self.replace_var = tk.StringVar()
+        self.regex_var = tk.BooleanVar(value=False)
+        self.case_var = tk.BooleanVar(value=False)
+        find_label = ttk.Label(self.frame, text=tr['find'])
+        find_label.grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        self.find_entry = ttk.Entry(self.frame, textvariable=self.find_var)
+        self.find_entry.grid(row=0, column=1, sticky=tk.EW, padx=5, pady=2)
+        next_btn = ttk.Button(self.frame, text=tr['find_next'], command=self.find_next)
+        next_btn.grid(row=0, column=2, padx=2, pady=2)
+        prev_btn = ttk.Button(self.frame, text=tr['find_prev'], command=self.find_prev)
+        prev_btn.grid(row=0, column=3, padx=2, pady=2)
+        regex_check = ttk.Checkbutton(self.frame, text=tr['regex'], variable=self.regex_var, command=self.schedule_search)
+        regex_check.grid(row=0, column=4, padx=5, pady=2)
+        case_check = ttk.Checkbutton(self.frame, text=tr['match_case'], variable=self.case_var, command=self.schedule_search)
+        case_check.grid(row=0, column=5, padx=5, pady=2)
+        ttk.Button(self.frame, text='✕', width=3, command=self.hide).grid(row=0, column=6, padx=5, pady=2)
+        replace_label = ttk.Label(self.frame, text=tr['replace_with'])
+        replace_label.grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
+        self.replace_entry = ttk.Entry(self.frame, textvariable=self.replace_var)
+        self.replace_entry.grid(row=1, column=1, sticky=tk.EW, padx=5, pady=2)
+        replace_btn = ttk.Button(self.frame, text=tr['replace'], command=self.replace)
+        replace_btn.grid(row=1, column=2, padx=2, pady=2)
+        replace_all_btn = ttk.Button(self.frame, text=tr['replace_all'], command=self.replace_all)
+        replace_all_btn.grid(row=1, column=3, padx=2, pady=2)
+        self.status_label = ttk.Label(self.frame, text='')
+        self.status_label.grid(row=1, column=4, columnspan=3, sticky=tk.W, padx=5, pady=2)
+        self.frame.columnconfigure(1, weight=1)
+        # (виджет, ключ перевода) - приложение переводит их вместе со своими
+        self.labels = [
+            (find_label, 'find'), (next_btn, 'find_next'), (prev_btn, 'find_prev'), (regex_check, 'regex'),
+            (case_check, 'match_case'), (replace_label, 'replace_with'), (replace_btn, 'replace'),
+            (replace_all_btn, 'replace_all')
+        ]
+
+        self.text.tag_configure(FIND_TAG, background='yellow', foreground='black')
+        self.text.tag_raise(tk.SEL, FIND_TAG)
+        self.find_var.trace_add('write', lambda *args: self.schedule_search())
+        self.find_entry.bind('<Return>', lambda e: self.find_next())
+        self.find_entry.bind('<Shift-Return>', lambda e: self.find_prev())
+        self.replace_entry.bind('<Return>', lambda e: self.replace())
+        for entry in (self.find_entry, self.replace_entry):
+            entry.bind('<Escape>', lambda e: self.hide())
+
+    def show(self):
+        if not self.visible:
+            self.frame.pack(side=tk.TOP, fill=tk.X, before=self.app.scrollbar)
+            self.visible = True
+        self.find_entry.focus_set()
+        self.find_entry.select_range(0, tk.END)
+        self.schedule_highlight()
+
+    def hide(self):
+        if not self.visible:
+            return
+        self.frame.pack_forget()
+        self.visible = False
+        self.text.tag_remove(FIND_TAG, 1.0, tk.END)
+        self.text.focus_set()
+
+    def set_status(self, key=None, suffix=''):
+        text = self.app.translations[self.app.language][key] if key else ''
+        self.status_label.config(text=text + suffix)
+
+    def search_options(self):
+        return {'regexp': self.regex_var.get(), 'nocase': not self.case_var.get()}
+
+    def search(self, pattern, index, stopindex=None, backwards=False, count=None):
+        # Мимо прокси text_area: прокси глушит ошибки Tcl, а неверное регулярное
+        # выражение должно дойти сюда исключением
+        options = self.search_options()
+        args = [self.app.text_orig, 'search']
+        if backwards:
+            args.append('-backwards')
+        if options['regexp']:
+            args.append('-regexp')
+        if options['nocase']:
+            args.append('-nocase')
+        if count is not None:
+            args += ['-count', count]
+        args += ['--', pattern, index]
+        if stopindex is not None:
+            args.append(stopindex)
+        return str(self.app.root.tk.call(tuple(args)))
+
+    def schedule_search(self):
+        # Ищем, когда пользователь перестал печатать, а не на каждую клавишу
+        if self.search_job is not None:
+            self.app.root.after_cancel(self.search_job)
+        self.search_job = self.app.root.after(FIND_DEBOUNCE_MS, self.incremental_search)
+
+    def incremental_search(self):
+        # Поиск продолжается с начала текущего совпадения: дописанный символ
+        # оставляет выделение на том же месте, если оно всё ещё подходит
+        self.search_job = None
+        selection = self.text.tag_ranges(tk.SEL)
+        self.find(selection[0] if selection else tk.INSERT)
+
+    def find_next(self):
+        self.find(tk.INSERT)
+
+    def find_prev(self):
+        selection = self.text.tag_ranges(tk.SEL)
+        self.find(selection[0] if selection else tk.INSERT, backwards=True)
+
+    def find(self, start, backwards=False):
+        pattern = self.find_var.get()
+        self.text.tag_remove(tk.SEL, 1.0, tk.END)
+        self.schedule_highlight()
+        if not pattern:
+            self.set_status()
+            return None
+        count = tk.IntVar()
+        try:
+            pos = self.search(pattern, start, backwards=backwards, count=count)
+        except tk.TclError:
+            self.set_status('bad_pattern')
+            return None
+        if not pos:
+            self.set_status('no_matches')
+            return None
+        end = f"{pos}+{count.get()}c"
+        self.text.tag_add(tk.SEL, pos, end)
+        if backwards:
+            self.text.mark_set(tk.INSERT, pos)
+        else:
+            # Пустое совпадение (например, ^) - сдвигаемся, чтобы не стоять на месте
+            self.text.mark_set(tk.INSERT, end if count.get() else f"{pos}+1c")
+        self.text.see(pos)
+        self.set_status()
+        return pos
+
+    def schedule_highlight(self):
+        if self.visible and self.highlight_job is None:
+            self.highlight_job = self.app.root.after_idle(self.highlight_visible)
+
+    def highlight_visible(self):
+        self.highlight_job = None
+        self.text.tag_remove(FIND_TAG, 1.0, tk.END)
+        pattern = self.find_var.get()
+        if not self.visible or not pattern:
+            return
+        pos = self.text.index('@0,0 linestart')
+        last = self.text.index(f"@0,{self.text.winfo_height()} lineend")
+        count = tk.IntVar()
+        for _ in range(FIND_HIGHLIGHT_LIMIT):
+            try:
+                pos = self.search(pattern, pos, stopindex=last, count=count)
+            except tk.TclError:
+                return
+            if not pos:
+                break
+            end = f"{pos}+{count.get()}c"
+            self.text.tag_add(FIND_TAG, pos, end)
+            pos = end if count.get() else f"{pos}+1c"
+
+    def editable(self):
+        return not self.app.loading and self.app.viewer is None
+
+    def compile(self):
+        # Для замены нужен re: выражения Tcl и Python в простых случаях совпадают,
+        # ^ и $ в обоих случаях относятся к строкам текста
+        pattern = self.find_var.get()
+        if not pattern:
+            return None
+        flags = re.MULTILINE | (0 if self.case_var.get() else re.IGNORECASE)
+        try:
+            return re.compile(pattern if self.regex_var.get() else re.escape(pattern), flags)
+        except re.error:
+            self.set_status('bad_pattern')
+            return None
+
+    def replacement(self):
+        # Без режима выражений строка замены вставляется как есть, без \1 и т.п.
+        text = self.replace_var.get()
+        return text if self.regex_var.get() else (lambda match: text)
+
+    def replace(self):
+        if not self.editable():
+            return
+        regex = self.compile()
+        if regex is None:
+            return
+        selection = self.text.tag_ranges(tk.SEL)
+        if selection:
+            first, last = (self.text.index(index) for index in selection)
+            match = regex.fullmatch(self.text.get(first, last))
+            if match is not None:
+                try:
+                    new = regex.sub(self.replacement(), match.group(0), count=1)
+                except re.error:
+                    self.set_status('bad_pattern')
+                    return
+                self.text.replace(first, last, new)
+                self.text.mark_set(tk.INSERT, f"{first}+{len(new)}c")
+        self.find_next()
+
+    def replace_all(self):
+        # Одна правка вместо правки на каждое совпадение: текст между первым и
+        # последним совпадением заменяется целиком результатом re.subn
+        if not self.editable():
+            return
+        regex = self.compile()
+        if regex is None:
+            return
+        pattern = self.find_var.get()
+        count = tk.IntVar()
+        try:
+            first = self.search(pattern, 1.0, stopindex=tk.END)
+            last = self.search(pattern, tk.END, stopindex=1.0, backwards=True, count=count)
+        except tk.TclError:
+            self.set_status('bad_pattern')
+            return
+        if not first or not last:
+            self.set_status('no_matches')
+            return
+        start = self.text.index(f"{first} linestart")
+        stop = self.text.index(f"{last}+{count.get()}c lineend")
+        try:
+            new, replaced = regex.subn(self.replacement(), self.text.get(start, stop))
+        except re.error:
+            self.set_status('bad_pattern')
+            return
+        if not replaced:
+            self.set_status('no_matches')
+            return
+        cursor = self.text.index(tk.INSERT)
+        top = self.text.yview()[0]
+        self.text.replace(start, stop, new)
+        self.text.mark_set(tk.INSERT, cursor)
+        self.text.yview_moveto(top)
+        self.schedule_highlight()
+        self.set_status('replaced', f": {replaced}")
+
+
+class OpStats:
+    # Замеры операций для --instrument: по каждой операции хранится скользящее
+    # окно последних STATS_WINDOW замеров. Пишется из любого потока
+    def __init__(self, window=STATS_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}  # операция -> deque[(time.time(), мс, байт, строк)]
+        self.last = None  # (операция, мс, байт, строк)
+
+    def record(self, op, ms, nbytes=0, rows=0):
+        with self.lock:
+            samples = self.samples.get(op)
+            if samples is None:
+                samples = self.samples[op] = deque(maxlen=self.window)
+            samples.append((time.time(), ms, nbytes, rows))
+            self.last = (op, ms, nbytes, rows)
+
+    def summary(self):
+        # {операция: количество, перцентили, сумма байт и строк, гистограмма по STATS_BUCKETS_MS}
+        with self.lock:
+            samples = {op: list(values) for op, values in self.samples.items()}
+        result = {}
+        for op, values in sorted(samples.items()):
+            durations = sorted(ms for _, ms, _, _ in values)
+            histogram = [0] * (len(STATS_BUCKETS_MS) + 1)
+            for ms in durations:
+                histogram[bisect_left(STATS_BUCKETS_MS, ms)] += 1
+            result[op] = {
+                'count': len(durations),
+                'p50_ms': durations[(len(durations) - 1) // 2],
+                'p90_ms': durations[int((len(durations) - 1) * 0.9)],
+                'p99_ms': durations[int((len(durations) - 1) * 0.99)],
+                'max_ms': durations[-1],
+                'bytes': sum(nbytes for _, _, nbytes, _ in values),
+                'rows': sum(rows for _, _, _, rows in values),
+                'histogram': [
+                    {'le_ms': bound, 'count': count}
+                    for bound, count in zip(STATS_BUCKETS_MS + (None,), histogram)
+                ],
+            }
+        return result
+
+    def dump(self, path):
+        # .csv - строка на корзину гистограммы, иначе JSON со всей сводкой
+        summary = self.summary()
+        if path.lower().endswith('.csv'):
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(['operation', 'le_ms', 'count', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'bytes', 'rows'])
+            for op, stats in summary.items():
+                for bucket in stats['histogram']:
+                    writer.writerow([
+                        op, '' if bucket['le_ms'] is None else bucket['le_ms'], bucket['count'],
+                        f"{stats['p50_ms']:.3f}", f"{stats['p90_ms']:.3f}", f"{stats['p99_ms']:.3f}",
+                        f"{stats['max_ms']:.3f}", stats['bytes'], stats['rows']
+                    ])
+            content = out.getvalue()
+        else:
+            content = json.dumps(summary, ensure_ascii=False, indent=2)
+        write_atomic(path, content)
+
+
+def instrumented(op):
+    # Замер синхронного метода приложения; без --instrument вызов проходит как есть
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.stats is None:
+                return method(self, *args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.record_op(op, started)
+        return wrapper
+    return decorate
+
+
+class Journal:
+    # Журнал правок одного документа для восстановления после сбоя. Файл: строка
+    # заголовка JSON, для base == 'snapshot' - строка со снимком текста, дальше по
+    # строке JSON на правку. Дописываются только правки; снимок делается, когда журнал
+    # перерастает документ, так что запись стоит пропорционально правкам, а не размеру
+    def __init__(self, path, doc_path=None, base_path=None, fmt=None):
+        self.path = path  # файл журнала
+        self.fmt = fmt or TextFormat()  # формат файла документа, чтобы восстановленный текст сохранился так же
+        self.doc_path = doc_path  # файл документа, для восстановления вкладки
+        self.base_path = base_path  # файл, поверх которого записаны правки, или None (пустой текст)
+        self.ops = []  # ещё не записанные строки
+        self.log_bytes = 0  # записано правок после заголовка или снимка
+        self.base_size = 0
+        self.started = False  # файл журнала уже создан
+        self.needs_snapshot = False  # основа неизвестна или запись не удалась
+
+    def record(self, op):
+        self.ops.append(json.dumps(op, ensure_ascii=False) + '\n')
+
+    def header(self, base, stat=None):
+        return json.dumps({
+            'version': JOURNAL_VERSION, 'path': self.doc_path, 'base': base, 'stat': stat,
+            'format': [self.fmt.encoding, self.fmt.bom, self.fmt.newline]
+        }, ensure_ascii=False) + '\n'
+
+    def take(self, snapshot, base_stat):
+        # Что отдать SaveWorker: (append, текст) или None, если писать нечего.
+        # snapshot() вызывается, только если пора записать снимок
+        if not self.ops and not self.needs_snapshot:
+            return None
+        lines = ''.join(self.ops)
+        self.ops = []
+        if not self.started and self.base_path is not None and base_stat is None:
+            self.needs_snapshot = True  # файл-основа ещё пишется - его состояние неизвестно
+        if self.needs_snapshot or self.log_bytes + len(lines) > max(JOURNAL_COMPACT_BYTES, self.base_size):
+            text = snapshot()
+            content = self.header('snapshot') + json.dumps(text, ensure_ascii=False) + '\n'
+            self.started = True
+            self.needs_snapshot = False
+            self.base_size = len(content)
+            self.log_bytes = 0
+            return False, content
+        self.log_bytes += len(lines)
+        if self.started:
+            return True, lines
+        self.started = True
+        if self.base_path is None:
+            return False, self.header('empty') + lines
+        self.base_size = base_stat[0]
+        return False, self.header('file', list(base_stat)) + lines
+
+
+def lock_file(f):
+    # Неблокирующая исключительная блокировка; ОС снимает её сама, когда процесс завершается
+    try:
+        if os.name == 'nt':
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def claim_journal_session(session):
+    # Запертый нами .lck чужой сессии; False - сессию ещё держит живой процесс,
+    # None - файла блокировки нет (процесс завершился штатно или журнал старого формата)
+    try:
+        f = open(os.path.join(JOURNAL_FOLDER, session + '.lck'), 'r+b')
+    except OSError:
+        return None
+    if lock_file(f):
+        return f
+    f.close()
+    return False
+
+
+def read_journal(path):
+    # (заголовок, снимок или None, правки). Недописанная последняя строка
+    # (сбой посреди записи) просто отбрасывается
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('version') != JOURNAL_VERSION:
+            raise ValueError(f"unsupported journal version: {header.get('version')}")
+        snapshot = json.loads(f.readline()) if header['base'] == 'snapshot' else None
+        ops = []
+        for line in f:
+            try:
+                ops.append(json.loads(line))
+            except ValueError:
+                break
+    return header, snapshot, ops
+
+
+def journal_base_text(header, snapshot):
+    # Текст, на который ложатся правки журнала
+    if header['base'] == 'snapshot':
+        return snapshot
+    if header['base'] == 'empty':
+        return ''
+    st = os.stat(header['path'])
+    if [st.st_size, st.st_mtime_ns] != header['stat']:
+        raise ValueError(f"{header['path']} changed after the journal was started")
+    return read_text(header['path'], TextFormat(*header['format']))
+
+
+class Translations(dict):
+    # Словарь языков, который строит перевод при первом обращении к языку
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+
+    def __missing__(self, language):
+        self[language] = self.loader(language)
+        return self[language]
+
+
+class ConfigStore(dict):
+    # Настройки в памяти. Запись в словарь только ставит отложенное сохранение:
+    # частые переключения темы и языка дают одну запись на диск, а не по одной на клик.
+    # Пишем через write_atomic, так что сбой посреди записи не портит файл
+    def __init__(self, path, root, schema):
+        super().__init__()
+        self.path = path
+        self.root = root
+        self.schema = schema  # ключ -> (значение по умолчанию, допустимые значения или None)
+        self.flush_job = None
+        self.dirty = False
+        config = self.read()
+        changed = self.migrate(config)
+        for key, (default, allowed) in schema.items():
+            value = config.get(key, default)
+            if type(value) is not type(default) or (allowed is not None and value not in allowed):
+                value = default
+                changed = True
+            config[key] = value
+        super().update(config)
+        if changed:
+            self.schedule_flush()
+
+    def read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return {}  # нет файла или он испорчен - начинаем с настроек по умолчанию
+        return config if isinstance(config, dict) else {}
+
+    def migrate(self, config):
+        version = config.get('version', 0)
+        if not isinstance(version, int):
+            version = 0
+        if version >= CONFIG_VERSION:
+            return False  # файл от этой или более новой версии программы
+        if version < 1:
+            # Флаг language_changed остался от перезапуска окна при смене языка
+            config.pop('language_changed', None)
+        config['version'] = CONFIG_VERSION
+        return True
+
+    def __setitem__(self, key, value):
+        if key in self and self[key] == value:
+            return
+        super().__setitem__(key, value)
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        self.dirty = True
+        if self.flush_job is None:
+            self.flush_job = self.root.after(CONFIG_FLUSH_MS, self.flush)
+
+    def flush(self):
+        if self.flush_job is not None:
+            self.root.after_cancel(self.flush_job)
+            self.flush_job = None
+        if not self.dirty:
+            return
+        write_atomic(self.path, json.dumps(self, ensure_ascii=False, indent=2))
+        self.dirty = False
+
+
+class FileManagerBase:
+    # Общая часть окна обеих программ: FileManagerApp каждой из них добавляет __init__,
+    # setup_ui, переводы и настройки, а V1.1 ещё и работу с базой заметок.
+    # Диалоги подставляемые: бенчмарки и тесты заменяют их заглушками
+    filedialog = filedialog
+    messagebox = messagebox
+
+    def record_phase(self, name, started):
+        self.startup_phases.append((name, (time.perf_counter() - started) * 1000))
+
+    def on_first_map(self, event):
+        if event.widget is not self.root:
+            return
+        self.root.unbind('<Map>')
+        self.root.after_idle(self.after_first_paint)
+
+    def preload_translations(self):
+        # Второй язык готовим заранее, чтобы переключение было мгновенным
+        phase = time.perf_counter()
+        for language in ('EN', 'RU'):
+            self.translations[language]
+        self.finish_startup_task('translations', phase)
+
+    def finish_startup_task(self, name, started):
+        self.record_phase(name + ' (deferred)', started)
+        self.startup_pending.discard(name)
+        if not self.startup_pending and self.profile_startup:
+            self.report_startup()
+
+    def report_startup(self):
+        total = (time.perf_counter() - self.startup_started) * 1000
+        print("Startup profile:", file=sys.stderr)
+        for name, ms in self.startup_phases:
+            if name == 'first_paint':
+                print(f"  {'first paint at':<26}{ms:9.1f} ms", file=sys.stderr)
+            else:
+                print(f"  {name:<26}{ms:9.1f} ms", file=sys.stderr)
+        print(f"  {'all startup work done at':<26}{total:9.1f} ms", file=sys.stderr)
+
+    def call_in_ui(self, func, *args):
+        # Tk не потокобезопасен: фоновые потоки передают результат через очередь
+        self.ui_calls.put((func, args))
+
+    def process_ui_calls(self, reschedule=True):
+        while True:
+            try:
+                func, args = self.ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception:
+                # Как с обычными колбэками Tk: ошибку показываем и разбираем очередь дальше,
+                # иначе один сбой остановил бы доставку ответов фоновых потоков до конца работы
+                self.root.report_callback_exception(*sys.exc_info())
+        if reschedule:
+            self.root.after(UI_POLL_MS, self.process_ui_calls)
+
+    def record_op(self, op, started, nbytes=0, rows=0):
+        # Можно вызывать из любого потока: подпись обновится через очередь интерфейса
+        if self.stats is None:
+            return
+        self.stats.record(op, (time.perf_counter() - started) * 1000, nbytes, rows)
+        self.call_in_ui(self.show_last_op)
+
+    def show_last_op(self):
+        op, ms, nbytes, rows = self.stats.last
+        text = f"{op}: {ms:.1f} ms"
+        if nbytes:
+            text += f", {format_size(nbytes)}"
+        if rows:
+            text += f", {rows} {self.translations[self.language]['rows']}"
+        self.stats_label.config(text=text)
+
+    def dump_stats(self):
+        file_path = self.filedialog.asksaveasfilename(
+            defaultextension='.json',
+            filetypes=[('JSON', '*.json'), ('CSV', '*.csv')]
+        )
+        if not file_path:
+            return
+        try:
+            self.stats.dump(file_path)
+        except OSError as e:
+            self.messagebox.showerror("Error", f"Cannot save file:\n{e}")
+
+    def on_text_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.find_bar.schedule_highlight()  # подсветка совпадений только на видимых строках
+
+    def show_find_bar(self, event=None):
+        self.find_bar.show()
+        return 'break'
+
+    def add_menu_command(self, menu, key, **kwargs):
+        menu.add_command(label=self.translations[self.language][key], **kwargs)
+        self.menu_labels.append((menu, menu.index(tk.END), key))
+
+    def retranslate_ui(self):
+        # Подписи меняются на месте: окно, открытый документ и история правок остаются
+        tr = self.translations[self.language]
+        for menu, index, key in self.menu_labels:
+            menu.entryconfigure(index, label=tr[key])
+        for widget, key in self.widget_labels:
+            widget.config(text=tr[key])
+        for tab, doc in self.tabs.items():
+            if doc is not self.document:
+                self.notebook.tab(tab, text=self.tab_label(doc.path, doc.modified))
+        self.dir_pane.retranslate()
+        self.update_title()
+        if self.viewer is not None:
+            self.viewer.update_status()
+
+    def _text_proxy(self, *args):
+        # Исключение из createcommand _tkinter запоминает и поднимает потом из mainloop(),
+        # даже если Tcl вызвал команду внутри catch (tk_textCopy без выделения делает
+        # `get sel.first sel.last`). Поэтому ошибка Tcl возвращается пустым результатом
+        try:
+            return self._text_command(args)
+        except tk.TclError:
+            return ''
+
+    def _text_command(self, args):
+        op = None
+        edits = None
+        if args and args[0] in ('insert', 'delete', 'replace'):
+            if self.append_only and self.root.tk.call(self.text_orig, 'compare', args[1], '<', 'saved_end'):
+                # Правка раньше сохранённого конца - быстрое дописывание уже невозможно
+                self.append_only = False
+            if self.journal is not None and not self.loading and self.viewer is None:
+                op = self.journal_op(args)
+            if self.history is not None and not self.loading and self.viewer is None:
+                edits = self.history_edits(args)
+        result = self.root.tk.call((self.text_orig,) + args)
+        if op is not None:
+            self.journal.record(op)
+            if self.journal_job is None:
+                self.journal_job = self.root.after(JOURNAL_FLUSH_MS, self.flush_journal)
+        if edits:
+            self.history.record(edits, time.perf_counter())
+            if self.history_job is None:
+                # Всё, что сделано за одно событие (ввод поверх выделения, вставка), - одна группа
+                self.history_job = self.root.after_idle(self.close_history_group)
+        return result
+
+    def history_edits(self, args):
+        # [(индекс, удаляемый текст, вставляемый текст)] до выполнения правки
+        call = self.root.tk.call
+
+        def index(i):
+            # Последний перевод строки tk.Text не удаляет и не сдвигает - правка прижимается к нему
+            if call(self.text_orig, 'compare', i, '>', 'end-1c'):
+                i = 'end-1c'
+            return str(call(self.text_orig, 'index', i))
+
+        if args[0] == 'insert':
+            return [(index(args[1]), '', ''.join(args[2::2]))]
+        if args[0] == 'replace':
+            start, end = index(args[1]), index(args[2])
+            return [(start, str(call(self.text_orig, 'get', start, end)), ''.join(args[3::2]))]
+        bounds = list(args[1:])
+        if len(bounds) % 2:
+            bounds.append(bounds[-1] + '+1c')  # одиночный индекс - один символ
+        edits = []
+        for start, end in zip(bounds[::2], bounds[1::2]):
+            start, end = index(start), index(end)
+            if call(self.text_orig, 'compare', start, '<', end):
+                edits.append((start, str(call(self.text_orig, 'get', start, end)), ''))
+        # Несколько диапазонов удаляются разом: записываем с конца, чтобы младшие не сдвигались
+        edits.sort(key=lambda edit: tuple(map(int, edit[0].split('.'))), reverse=True)
+        return edits
+
+    def close_history_group(self):
+        self.history_job = None
+        if self.history is not None:
+            self.history.group_open = False
+
+    def undo(self, event=None):
+        self.step_history(redo=False)
+        return 'break'
+
+    def redo(self, event=None):
+        self.step_history(redo=True)
+        return 'break'
+
+    def step_history(self, redo):
+        history = self.history
+        if history is None or self.loading or self.viewer is not None:
+            return
+        group = history.pop(redo)
+        if not group:
+            return
+        # Правки применяются с конца; заодно собирается обратная группа для другой стопки
+        self.history = None
+        inverse = []
+        try:
+            for index, text, length in reversed(group):
+                start = self.text_area.index(index)
+                end = f"{start}+{length}c"
+                inverse.append([start, self.text_area.get(start, end), len(text)])
+                self.text_area.replace(start, end, text)
+        finally:
+            self.history = history
+        history.push(inverse, not redo)
+        self.text_area.mark_set(tk.INSERT, f"{start}+{len(text)}c")
+        self.text_area.see(tk.INSERT)
+
+    def attach_history(self, file_path=None):
+        # Текст в поле заменён целиком: прежняя история к нему не относится.
+        # Для файла без правок с прошлого запуска подхватывается сохранённая история
+        history = self.document.history
+        history.clear()
+        if file_path is not None and self.config['persist_undo']:
+            stat = self.save_worker.settled_stat(file_path)
+            try:
+                with open(history_path(file_path), 'r', encoding='utf-8') as f:
+                    data = f.read()
+                if stat is not None:
+                    history.load(data, stat)
+            except (OSError, ValueError, KeyError, TypeError):
+                history.clear()  # нет истории или она испорчена - начинаем с чистой
+        self.history = history
+
+    def persist_history(self, doc):
+        # История пишется только для файла без несохранённых правок: её правки ложатся на файл как есть
+        modified = self.modified if doc is self.document else doc.modified
+        if not self.config['persist_undo'] or doc.large or not doc.path or modified:
+            return
+        stat = self.save_worker.settled_stat(doc.path)
+        if stat is None or not (doc.history.undo_stack or doc.history.redo_stack):
+            return
+        os.makedirs(UNDO_FOLDER, exist_ok=True)
+        self.save_worker.submit(history_path(doc.path), doc.history.dump(stat), lambda path, error, written: None)
+
+    def journal_op(self, args):
+        # Индексы вычисляются до выполнения правки: повтор на том же тексте даст тот же результат
+        def index(i):
+            return str(self.root.tk.call(self.text_orig, 'index', i))
+
+        if args[0] == 'insert':
+            return ['i', index(args[1]), ''.join(args[2::2])]
+        if args[0] == 'delete':
+            return ['d'] + [index(i) for i in args[1:]]
+        return ['r', index(args[1]), index(args[2]), ''.join(args[3::2])]
+
+    def flush_journal(self):
+        if self.journal_job is not None:
+            self.root.after_cancel(self.journal_job)
+            self.journal_job = None
+        journal = self.journal
+        if journal is None:
+            return
+        if not journal.started:
+            self.lock_journals()
+        chunk = journal.take(
+            lambda: self.text_area.get(1.0, 'end-1c'),
+            self.save_worker.settled_stat(journal.base_path) if journal.base_path else None
+        )
+        if chunk is None:
+            return
+        append, content = chunk
+
+        def on_done(path, error, written):
+            if error is not None:
+                self.call_in_ui(self._on_journal_failed, journal)
+
+        self.save_worker.submit(journal.path, content, on_done, append=append)
+
+    def lock_journals(self):
+        # Пока .lck заперт, другие экземпляры не принимают журналы этого процесса за брошенные
+        if self.journal_lock is not None:
+            return
+        os.makedirs(JOURNAL_FOLDER, exist_ok=True)
+        self.journal_lock = open(os.path.join(JOURNAL_FOLDER, JOURNAL_SESSION + '.lck'), 'wb')
+        lock_file(self.journal_lock)
+
+    def _on_journal_failed(self, journal):
+        journal.needs_snapshot = True  # следующий сброс перепишет журнал целиком
+
+    def reset_journal(self, file_path):
+        # Текст совпадает с файлом file_path (или пуст): прежние правки больше не нужны
+        doc = self.document
+        if self.journal_job is not None:
+            self.root.after_cancel(self.journal_job)
+            self.journal_job = None
+        self.discard_journal(doc)
+        doc.journal = Journal(doc.journal_path, self.current_file, file_path, self.text_format)
+        self.journal = doc.journal
+
+    def discard_journal(self, doc):
+        if doc.journal is not None and doc.journal.started:
+            self.save_worker.remove(doc.journal.path, lambda path, error, written: None)
+        doc.journal = None
+
+    def offer_recovery(self):
+        # Журналы остаются после сбоя и от документов, закрытых вместе с программой без сохранения.
+        # Журналы запущенного экземпляра (его .lck заперт) не трогаем
+        try:
+            names = sorted(name for name in os.listdir(JOURNAL_FOLDER) if name.endswith('.log'))
+        except OSError:
+            return
+        locks = {}  # сессия -> результат claim_journal_session
+        paths = []
+        for name in names:
+            session = name.partition('-')[0]
+            if session == JOURNAL_SESSION:
+                continue
+            if session not in locks:
+                locks[session] = claim_journal_session(session)
+            if locks[session] is not False:
+                paths.append(os.path.join(JOURNAL_FOLDER, name))
+        try:
+            if not paths:
+                return
+            tr = self.translations[self.language]
+            done = paths
+            if self.messagebox.askyesno(tr['title'], tr['recover_prompt'].format(count=len(paths))):
+                done = []
+                errors = []
+                for path in paths:
+                    try:
+                        self.recover_journal(path)
+                    except (OSError, ValueError, KeyError, tk.TclError) as e:
+                        errors.append(f"{os.path.basename(path)}: {e}")
+                    else:
+                        done.append(path)
+                if errors:
+                    # Невосстановленные журналы остаются на диске: их предложат снова при следующем запуске
+                    self.messagebox.showerror("Error", tr['recover_failed'] + ":\n" + "\n".join(errors))
+            for path in done:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        finally:
+            for lock in locks.values():
+                if lock:
+                    lock.close()
+                    try:
+                        os.remove(lock.name)
+                    except OSError:
+                        pass
+
+    def recover_journal(self, path):
+        header, snapshot, ops = read_journal(path)
+        text = journal_base_text(header, snapshot)
+        if self.current_file or self.modified or self.loading or self.viewer:
+            self.add_tab()
+        self.journal = None  # повтор правок в новый журнал не пишем
+        self.history = None
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.insert(1.0, text)
+        for op in ops:
+            if op[0] == 'i':
+                self.text_area.insert(op[1], op[2])
+            elif op[0] == 'd':
+                self.text_area.delete(*op[1:])
+            else:
+                self.text_area.replace(op[1], op[2], op[3])
+        self.current_file = header['path']
+        self.text_format = TextFormat(*header['format'])
+        self.mark_saved(None)
+        self.text_area.edit_modified(True)
+        self.modified = True
+        # Основа восстановленного текста - его собственный снимок
+        self.journal.needs_snapshot = True
+        self.flush_journal()
+        self.attach_history()
+        self.update_title()
+
+    def on_modified(self, event=None):
+        if self.loading:
+            return
+        modified = bool(self.text_area.edit_modified())
+        if modified != self.modified:
+            self.modified = modified
+            self.update_title()
+
+    def mark_saved(self, file_path):
+        # Текст до конца буфера совпадает с файлом file_path
+        self.saved_path = file_path
+        # В файл со смешанными переводами строк не дописываем: пользователя предупредили,
+        # что они станут одинаковыми, а это делает только полная запись
+        self.append_only = file_path is not None and not self.text_format.mixed
+        self.text_area.mark_set('saved_end', 'end-1c')
+        self.text_area.edit_modified(False)
+        self.reset_journal(file_path)
+
+    def update_title(self):
+        title = self.translations[self.language]['title']
+        if self.current_file:
+            title = f"{os.path.basename(self.current_file)}{'*' if self.modified else ''} - {title}"
+        elif self.modified:
+            title = f"*{title}"
+        self.root.title(title)
+        tab = self.notebook.select()
+        if tab:
+            self.notebook.tab(tab, text=self.tab_label(self.current_file, self.modified))
+
+    @instrumented('apply_theme')
+    def apply_theme(self):
+        if self.current_theme == 'dark':
+            bg = '#2d2d2d'
+            fg = 'white'
+            insertbackground = 'white'  # курсор
+        else:
+            bg = 'white'
+            fg = 'black'
+            insertbackground = 'black'
+        self.text_area.config(bg=bg, fg=fg, insertbackground=insertbackground)
+        style = ttk.Style()
+        style.theme_use('default')
+        style.configure('TButton', background=bg, foreground=fg)
+        style.configure('TFrame', background=bg)
+        self.toolbar.config(style='TFrame')
+
+    def check_first_run(self):
+        if self.config['first_run']:
+            self.messagebox.showinfo(
+                self.translations[self.language]['tutorial_title'],
+                self.translations[self.language]['tutorial_text']
+            )
+            self.config['first_run'] = False
+        else:
+            self.messagebox.showinfo(
+                self.translations[self.language]['title'],
+                self.translations[self.language]['good_luck']
+            )
+
+    def tab_label(self, path, modified):
+        name = os.path.basename(path) if path else self.translations[self.language]['untitled']
+        return f"{name}{'*' if modified else ''}"
+
+    def add_tab(self):
+        # Страница вкладки пустая: текст всех документов показывается в общем text_area
+        tab = ttk.Frame(self.notebook, height=0)
+        doc = Document(history_limit=self.config['undo_history_mb'] * 1024 * 1024)
+        self.tabs[str(tab)] = doc
+        self.notebook.add(tab, text=self.tab_label(None, False))
+        self.notebook.select(tab)
+        self.switch_to(doc)
+        return doc
+
+    def find_tab(self, doc):
+        for tab, tab_doc in self.tabs.items():
+            if tab_doc is doc:
+                return tab
+        return None
+
+    def on_tab_changed(self, event=None):
+        doc = self.tabs.get(self.notebook.select())
+        if doc is not None:
+            self.switch_to(doc)
+
+    def switch_to(self, doc):
+        if doc is self.document:
+            return
+        self.stash_document()
+        self.document = doc
+        self.restore_document()
+
+    def stash_document(self):
+        doc = self.document
+        if doc is None:
+            return
+        self.flush_journal()
+        self.journal = None
+        self.close_history_group()
+        self.history = None
+        doc.path = self.current_file
+        doc.large = self.viewer is not None
+        if doc.large:
+            self.close_viewer()
+            doc.content = None  # индекс строк лежит в кэше на диске, просмотр откроется сразу
+        elif self.loading:
+            self.stop_loading()
+            doc.content = None  # недочитанный файл загрузим заново, когда к нему вернутся
+        else:
+            doc.content = self.text_area.get(1.0, 'end-1c')
+            doc.saved_end = self.text_area.index('saved_end')
+            doc.cursor = self.text_area.index(tk.INSERT)
+            doc.yview = self.text_area.yview()[0]
+        doc.modified = self.modified
+        doc.saved_path = self.saved_path
+        doc.append_only = self.append_only
+        doc.text_format = self.text_format
+        if doc.content is not None:
+            self.buffer_cache.put(doc)
+
+    def restore_document(self):
+        doc = self.document
+        self.journal = None  # замена текста в text_area - не правка пользователя
+        self.history = None
+        self.buffer_cache.take(doc)
+        self.text_format = doc.text_format
+        content, doc.content = doc.content, None  # дальше текст живёт в text_area
+        if doc.large:
+            self.open_large_file(doc.path)
+            return
+        if content is not None and doc.path and not doc.modified and self.save_worker.changed_on_disk(doc.path):
+            content = None  # файл поменяли снаружи - кэш устарел
+        self.append_only = False
+        self.text_area.delete(1.0, tk.END)
+        if content is None:
+            self.current_file = None
+            self.mark_saved(None)
+            self.update_title()
+            if doc.path:
+                self.load_file(doc.path)
+            return
+        self.text_area.insert(1.0, content)
+        self.current_file = doc.path
+        self.saved_path = doc.saved_path
+        self.text_area.mark_set('saved_end', doc.saved_end)
+        self.text_area.mark_set(tk.INSERT, doc.cursor)
+        self.text_area.yview_moveto(doc.yview)
+        self.text_area.edit_modified(doc.modified)
+        self.modified = doc.modified
+        self.append_only = doc.append_only
+        if doc.journal is None:
+            doc.journal = Journal(doc.journal_path, doc.path, doc.saved_path, doc.text_format)
+        self.journal = doc.journal
+        self.history = doc.history
+        self.update_title()
+
+    def close_tab(self):
+        if not self.confirm_discard_changes():
+            return
+        self.stop_loading()
+        self.close_viewer()
+        if len(self.tabs) == 1:
+            # Последняя вкладка не закрывается, а очищается
+            self.persist_history(self.document)
+            self.journal = None
+            self.history = None
+            self.text_area.delete(1.0, tk.END)
+            self.current_file = None
+            self.text_format = TextFormat()
+            self.mark_saved(None)
+            self.attach_history()
+            self.update_title()
+            return
+        tab = self.notebook.select()
+        self.persist_history(self.document)
+        doc = self.tabs.pop(tab)
+        self.buffer_cache.take(doc)
+        self.journal = None
+        self.history = None
+        self.discard_journal(doc)
+        self.document = None  # закрытый документ не сохраняем в кэш
+        self.notebook.forget(tab)
+        self.root.nametowidget(tab).destroy()
+        self.on_tab_changed()
+
+    def new_file(self):
+        self.add_tab()
+
+    def open_file(self):
+        file_path = self.filedialog.askopenfilename()
+        if file_path:
+            self.open_document(file_path)
+
+    def open_folder(self):
+        folder = self.filedialog.askdirectory()
+        if folder:
+            self.config['folders_root'] = folder
+            self.show_folders()
+
+    def toggle_folders(self):
+        if self.config['show_folders']:
+            self.paned.forget(self.dir_pane.frame)
+            self.config['show_folders'] = False
+        else:
+            self.show_folders()
+
+    def show_folders(self):
+        if str(self.dir_pane.frame) not in map(str, self.paned.panes()):
+            self.paned.insert(0, self.dir_pane.frame, weight=1)
+        self.config['show_folders'] = True
+        folder = self.config['folders_root']
+        self.dir_pane.set_root(folder if folder and os.path.isdir(folder) else os.getcwd())
+
+    def find_in_files(self):
+        if self.find_window is not None and self.find_window.win.winfo_exists():
+            self.find_window.win.lift()
+            return
+        folder = self.dir_pane.root_path or self.config['folders_root'] or os.getcwd()
+        self.find_window = FindInFiles(self, folder)
+
+    def goto_line(self, line):
+        # Номера строк с 1; если файл ещё загружается - переходим после загрузки
+        if self.viewer is not None:
+            self.viewer.goto_line(line)
+        elif self.loading:
+            self.pending_line = line
+        else:
+            index = f"{line}.0"
+            self.text_area.mark_set(tk.INSERT, index)
+            self.text_area.see(index)
+
+    def open_document(self, file_path):
+        # Уже открытый файл просто показываем, пустую безымянную вкладку занимаем
+        for tab, doc in self.tabs.items():
+            path = self.current_file if doc is self.document else doc.path
+            if path and os.path.abspath(path) == os.path.abspath(file_path):
+                self.notebook.select(tab)
+                self.switch_to(doc)
+                return
+        if self.current_file or self.modified or self.loading or self.viewer:
+            self.add_tab()
+        self.load_file(file_path)
+
+    def load_file(self, file_path):
+        # Файл читается кусками в фоновом потоке, а вставляется в текстовое
+        # поле по частям через root.after - окно не замирает на больших файлах
+        self.stop_loading()
+        self.close_viewer()
+        self.pending_line = None
+        try:
+            total = os.path.getsize(file_path)
+        except OSError as e:
+            self.messagebox.showerror("Error", f"Cannot open file:\n{e}")
+            return
+        if total >= LARGE_FILE_THRESHOLD:
+            self.open_large_file(file_path)
+            return
+        self.history = None  # история подключится, когда файл дочитается
+        self.text_area.config(state=tk.NORMAL)
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.config(state=tk.DISABLED)
+        self.current_file = file_path
+        self.text_format = TextFormat()  # уточнится, когда поток чтения определит кодировку
+        self.mark_saved(None)
+        self.update_title()
+
+        self.loading = True
+        self.load_started = time.perf_counter()
+        self.load_size = total
+        self.load_cancel = threading.Event()
+        self.load_queue = queue.Queue(maxsize=LOAD_QUEUE_SIZE)
+        self.progress['value'] = 0
+        self.status_label.config(text=f"{self.translations[self.language]['loading']}: {os.path.basename(file_path)}")
+        self.progress.pack(side=tk.LEFT, padx=5, pady=2)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5, pady=2)
+        threading.Thread(
+            target=self._load_worker,
+            args=(file_path, total, self.load_queue, self.load_cancel),
+            daemon=True
+        ).start()
+        self.root.after(LOAD_POLL_MS, self._poll_load, self.load_queue)
+
+    def open_large_file(self, file_path):
+        # Файл не читается целиком: показываем только видимые строки
+        started = time.perf_counter()
+        self.history = None
+        self.text_area.delete(1.0, tk.END)
+        try:
+            with open(file_path, 'rb') as f:
+                self.text_format = detect_format(f.read(ENCODING_SNIFF_SIZE))
+            self.viewer = LargeFileViewer(self, file_path, self.text_format.encoding)
+        except Exception as e:
+            self.viewer = None
+            self.current_file = None
+            self.text_format = TextFormat()
+            self.mark_saved(None)
+            self.attach_history()
+            self.update_title()
+            self.messagebox.showerror("Error", f"Cannot open file:\n{e}")
+            return
+        self.current_file = file_path
+        self.mark_saved(None)
+        self.attach_history()
+        self.update_title()
+        self.record_op('open_file', started)
+
+    def close_viewer(self):
+        if self.viewer is None:
+            return
+        self.viewer.close()
+        self.viewer = None
+        self.status_label.config(text='')
+
+    @staticmethod
+    def _load_worker(file_path, total, chunks, cancel):
+        def put(item):
+            # Очередь ограничена, поэтому память не растёт, даже если
+            # вставка в виджет отстаёт от чтения с диска
+            while not cancel.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            with open(file_path, 'rb') as f:
+                fmt = detect_format(f.read(ENCODING_SNIFF_SIZE))
+            # Кодировка угадана по началу файла; если дальше она не подходит,
+            # файл читается заново в запасной кодировке
+            fallbacks = iter([] if fmt.bom else [e for e in FALLBACK_ENCODINGS if e != fmt.encoding])
+            while True:
+                if not put(('format', fmt, 0)):
+                    return
+                try:
+                    # Переводы строк приводятся к '\n', как в tk.Text; при сохранении вернутся исходные
+                    with open(file_path, 'r', encoding=fmt.encoding) as f:
+                        skip_bom = fmt.bom
+                        while not cancel.is_set():
+                            text = f.read(LOAD_CHUNK_SIZE)
+                            if not text:
+                                break
+                            if skip_bom:
+                                text = text[1:]
+                                skip_bom = False
+                            percent = f.buffer.tell() * 100 / total if total else 100
+                            if not put(('chunk', text, percent)):
+                                return
+                        if isinstance(f.newlines, str):
+                            # Образец мог не дойти до первого перевода строки
+                            fmt.newline = f.newlines
+                        elif f.newlines is not None:
+                            # Разные переводы строк (кортеж): tk.Text хранит только '\n', поэтому
+                            # сохранить их как было нельзя - остаётся первый встреченный
+                            fmt.mixed = True
+                    break
+                except UnicodeDecodeError:
+                    encoding = next(fallbacks, None)
+                    if encoding is None:
+                        raise
+                    fmt = TextFormat(encoding, False, fmt.newline)
+            put(('done', fmt, 100))
+        except Exception as e:
+            put(('error', e, 0))
+
+    def _poll_load(self, chunks):
+        if chunks is not self.load_queue:
+            return  # загрузка отменена или начата заново
+        deadline = time.perf_counter() + LOAD_TICK_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                kind, payload, percent = chunks.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'chunk':
+                self.text_area.config(state=tk.NORMAL)
+                self.text_area.insert('end-1c', payload)
+                self.text_area.config(state=tk.DISABLED)
+                self.progress['value'] = percent
+            elif kind == 'format':
+                # Начало чтения или повтор в другой кодировке: уже вставленное не годится
+                self.text_format = payload
+                self.text_area.config(state=tk.NORMAL)
+                self.text_area.delete(1.0, tk.END)
+                self.text_area.config(state=tk.DISABLED)
+                self.progress['value'] = percent
+            elif kind == 'done':
+                self.text_format = payload
+                self._finish_loading()
+                self.save_worker.remember(self.current_file)
+                self.mark_saved(self.current_file)
+                self.attach_history(self.current_file)
+                self.record_op('open_file', self.load_started, self.load_size)
+                if payload.mixed:
+                    self.status_label.config(text=self.translations[self.language]['mixed_newlines'].format(
+                        NEWLINE_NAMES.get(payload.newline, 'LF')
+                    ))
+                line, self.pending_line = self.pending_line, None
+                self.goto_line(line or 1)
+                return
+            else:
+                self._finish_loading()
+                self.text_area.delete(1.0, tk.END)
+                self.current_file = None
+                self.text_format = TextFormat()
+                self.mark_saved(None)
+                self.attach_history()
+                self.update_title()
+                self.messagebox.showerror("Error", f"Cannot open file:\n{payload}")
+                return
+        self.root.after(LOAD_POLL_MS, self._poll_load, chunks)
+
+    def _finish_loading(self):
+        self.loading = False
+        self.load_queue = None
+        self.text_area.config(state=tk.NORMAL)
+        self.progress.pack_forget()
+        self.cancel_btn.pack_forget()
+        self.status_label.config(text='')
+
+    def stop_loading(self):
+        if not self.loading:
+            return
+        self.load_cancel.set()
+        self._finish_loading()
+
+    def cancel_load(self):
+        # Недочитанный файл нельзя сохранять поверх оригинала
+        if not self.loading:
+            return
+        self.stop_loading()
+        self.text_area.delete(1.0, tk.END)
+        self.current_file = None
+        self.text_format = TextFormat()
+        self.mark_saved(None)
+        self.attach_history()
+        self.update_title()
+        self.status_label.config(text=self.translations[self.language]['load_cancelled'])
+
+    def save_file(self):
+        if self.loading or self.viewer:
+            return
+        if self.current_file:
+            if not self.modified and os.path.exists(self.current_file):
+                self.status_label.config(text=self.translations[self.language]['no_changes'])
+                return
+            self.start_save(self.current_file)
+        else:
+            self.save_file_as()
+
+    def save_file_as(self):
+        if self.loading or self.viewer:
+            return
+        file_path = self.filedialog.asksaveasfilename(
+            defaultextension='.txt',
+            filetypes=[('Text Files', '*.txt'), ('All Files', '*.*')]
+        )
+        if file_path:
+            self.current_file = file_path
+            self.start_save(file_path, op='save_file_as')
+
+    def start_save(self, file_path, full=False, op='save_file'):
+        # Снимок буфера делается сразу, а запись на диск идёт в фоне.
+        # Если правки были только в конце, дописываем лишь новый хвост
+        append = not full and self.append_only and file_path == self.saved_path
+        if append:
+            content = self.text_area.get('saved_end', 'end-1c')
+        else:
+            content = self.text_area.get(1.0, 'end-1c')
+            self.text_format.mixed = False  # после полной записи переводы строк в файле одинаковые
+        self.mark_saved(file_path)
+        self.update_title()
+        self.status_label.config(text=f"{self.translations[self.language]['saving']}: {os.path.basename(file_path)}")
+        self.submit_save(self.document, file_path, content, self.text_format, append=append, op=op)
+
+    def submit_save(self, doc, file_path, content, fmt, append=False, op='save_file'):
+        doc.saves += 1
+        started = time.perf_counter()
+
+        def on_done(path, error, written):
+            # Вызывается в потоке записи, сразу после самой записи. written - None, если это
+            # сохранение поглотила более новая задача: её запись замерит её же callback
+            if written is not None and self.stats is not None:
+                self.record_op(op, started, written)
+            self.call_in_ui(self._on_saved, doc, path, error)
+
+        self.save_worker.submit(file_path, content, on_done, append=append, fmt=fmt)
+
+    def _on_saved(self, doc, file_path, error):
+        # Пока файл писался, пользователь мог переключиться на другую вкладку
+        doc.saves -= 1
+        active = doc is self.document
+        if isinstance(error, StaleFileError):
+            # Файл изменили снаружи - вместо дописывания перезаписываем целиком
+            if active and file_path == self.current_file:
+                self.start_save(file_path, full=True)
+            elif not active and doc.content is not None:
+                self.submit_save(doc, file_path, doc.content, doc.text_format)
+            return
+        if error is not None:
+            if active and file_path == self.saved_path:
+                self.append_only = False
+                self.text_area.edit_modified(True)
+            elif not active and file_path == doc.saved_path:
+                doc.append_only = False
+                doc.modified = True
+                tab = self.find_tab(doc)
+                if tab is not None:
+                    self.notebook.tab(tab, text=self.tab_label(doc.path, True))
+            self.status_label.config(text='')
+            self.messagebox.showerror("Error", f"Cannot save file:\n{error}")
+            return
+        if not active:
+            self.buffer_cache.evict()
+        self.status_label.config(
+            text=f"{self.translations[self.language]['saved']}: {os.path.basename(file_path)} ({time.strftime('%H:%M:%S')})"
+        )
+
+    def confirm_discard_changes(self):
+        if self.loading or not self.modified:
+            return True
+        return self.messagebox.askyesno(
+            self.translations[self.language]['title'],
+            "Discard current changes?" if self.language == 'EN' else "Отменить текущие изменения?"
+        )
+
+    def flush_config(self):
+        try:
+            self.config.flush()
+        except OSError as e:
+            # Окно всё равно закрываем: потеря настроек не повод держать приложение
+            print(f"Cannot save settings: {e}", file=sys.stderr)
+
+    def toggle_theme(self):
+        self.current_theme = 'dark' if self.current_theme == 'light' else 'light'
+        self.config['theme'] = self.current_theme
+        self.apply_theme()
+
+    @instrumented('toggle_language')
+    def toggle_language(self):
+        self.language = 'EN' if self.language == 'RU' else 'RU'
+        self.config['language'] = self.language
+        self.retranslate_ui()
+
+
+def cli_transcode(args):
+    sources = args.sources
+    if len(sources) > 1 and (args.output == '-' or '-' in sources):
+        print("Several sources need an output directory (-o DIR) and cannot include stdin", file=sys.stderr)
+        return 2
+    if len(sources) == 1:
+        targets = [args.output]
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        targets = [os.path.join(args.output, os.path.basename(path)) for path in sources]
+    options = (args.to, {'keep': None, 'yes': True, 'no': False}[args.bom], NEWLINES[args.newline], args.source_encoding)
+    failed = 0
+    # Разбор кодировок упирается в процессор - файлы перекодируются в отдельных процессах
+    jobs = min(args.jobs, len(sources))
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn'))
+    else:
+        pool = ThreadPoolExecutor(max_workers=1)
+    with pool:
+        futures = [pool.submit(transcode_file, src, dst, *options) for src, dst in zip(sources, targets)]
+        for src, future in zip(sources, futures):
+            try:
+                future.result()
+            except (OSError, ValueError, LookupError) as e:
+                print(f"{src}: {e}", file=sys.stderr)
+                failed += 1
+    return 1 if failed else 0
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import unittest
+import importlib.util
+
+# Общее для тестов: загрузка программ и временная рабочая папка. Общая часть обеих
+# программ - модуль fm_common, сами V1.1 и V2.1 загружаются из файлов так же,
+# как в benchmarks/bench_app.py.
+#
+#   python -m unittest discover tests
+#   python -m pytest tests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = {
+    'V1.1': os.path.join(ROOT, 'file_manager_V1.1.py'),
+    'V2.1': os.path.join(ROOT, 'file_manager V2.1.py'),
+}
+_modules = {}
+
+
+def load_app(version=None):
+    # version None - общая часть обеих программ, fm_common
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)  # приложения импортируют fm_common из своей папки
+    if version is None:
+        return importlib.import_module('fm_common')
+    if version not in _modules:
+        spec = importlib.util.spec_from_file_location('file_manager_' + version.replace('.', '_'), APPS[version])
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[version] = module
+    return _modules[version]
+
+
+class AppTestCase(unittest.TestCase):
+    # Каждый тест работает во временной папке: DATA_FOLDER задан относительным путём
+    version = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = load_app(cls.version)
+
+    def setUp(self):
+        # Через addCleanup, а не tearDown: закрытие базы, добавленное тестом позже,
+        # выполнится раньше возврата в исходную папку
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp.name)
+
+    def patch(self, name, value, module=None):
+        # Подмена константы модуля на время теста
+        module = module or self.app
+        old = getattr(module, name)
+        setattr(module, name, value)
+        self.addCleanup(setattr, module, name, old)
+
+    def write_bytes(self, path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def read_bytes(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
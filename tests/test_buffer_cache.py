@@ -0,0 +1,49 @@
+import sys
+import unittest
+
+from support import AppTestCase
+
+# Кэш текстов неактивных вкладок
+
+
+class BufferCacheTests(AppTestCase):
+    def doc(self, content, modified=False):
+        doc = self.app.Document('doc.txt')
+        doc.content = content
+        doc.modified = modified
+        return doc
+
+    def test_evicts_least_recently_used(self):
+        docs = [self.doc(str(i) * 1000) for i in range(3)]
+        cache = self.app.BufferCache(2 * sys.getsizeof(docs[0].content))
+        cache.put(docs[0])
+        cache.put(docs[1])
+        cache.take(docs[0])  # вкладку открыли и снова убрали в кэш
+        cache.put(docs[0])
+        cache.put(docs[2])
+        self.assertIsNone(docs[1].content)
+        self.assertIsNotNone(docs[0].content)
+        self.assertEqual(list(cache.docs), [docs[0], docs[2]])
+        self.assertLessEqual(cache.size, cache.limit)
+
+    def test_pinned_documents_are_not_evicted(self):
+        modified = self.doc('m' * 1000, modified=True)
+        saving = self.doc('s' * 1000)
+        saving.saves = 1
+        plain = self.doc('p' * 1000)
+        cache = self.app.BufferCache(0)
+        for doc in (modified, saving, plain):
+            cache.put(doc)
+        self.assertEqual((modified.content, saving.content), ('m' * 1000, 's' * 1000))
+        self.assertIsNone(plain.content)
+        self.assertEqual(list(cache.docs), [modified, saving])
+        self.assertGreater(cache.size, cache.limit)  # лимит превышен, но текст не потерян
+        saving.saves = 0
+        cache.evict()
+        self.assertIsNone(saving.content)
+        self.assertEqual(list(cache.docs), [modified])
+        self.assertEqual(cache.size, sys.getsizeof(modified.content))
+
+
+if __name__ == '__main__':
+    unittest.main()
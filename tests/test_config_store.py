@@ -0,0 +1,92 @@
+import json
+import unittest
+
+from support import AppTestCase
+
+# Отложенное сохранение настроек
+
+
+class FakeRoot:
+    # Вместо tk.Tk: отложенные вызовы копятся в списке и запускаются вручную
+    def __init__(self):
+        self.jobs = {}
+
+    def after(self, ms, func):
+        job = len(self.jobs) + 1
+        self.jobs[job] = func
+        return job
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run(self):
+        jobs, self.jobs = self.jobs, {}
+        for func in jobs.values():
+            func()
+
+
+SCHEMA = {
+    'theme': ('light', ('light', 'dark')),
+    'font_size': (12, None),
+}
+
+
+class ConfigStoreTests(AppTestCase):
+    def store(self):
+        self.root = FakeRoot()
+        return self.app.ConfigStore('config.json', self.root, SCHEMA)
+
+    def write_config(self, config):
+        with open('config.json', 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+
+    def read_config(self):
+        with open('config.json', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_invalid_values_fall_back_to_defaults(self):
+        self.write_config({'version': 1, 'theme': 'purple', 'font_size': '14'})
+        config = self.store()
+        self.assertEqual((config['theme'], config['font_size']), ('light', 12))
+        self.assertTrue(config.dirty)
+
+    def test_broken_file_gives_defaults(self):
+        self.write_bytes('config.json', b'{"theme": ')
+        config = self.store()
+        self.assertEqual(config['theme'], 'light')
+        self.root.run()
+        self.assertEqual(self.read_config()['theme'], 'light')
+
+    def test_migrates_old_file(self):
+        self.write_config({'theme': 'dark', 'language_changed': True})
+        config = self.store()
+        self.assertEqual(config['theme'], 'dark')
+        self.assertNotIn('language_changed', config)
+        self.assertEqual(config['version'], self.app.CONFIG_VERSION)
+        self.root.run()
+        self.assertEqual(self.read_config()['version'], self.app.CONFIG_VERSION)
+
+    def test_changes_are_written_once_per_flush(self):
+        self.write_config({'version': 1, 'theme': 'light', 'font_size': 12})
+        config = self.store()
+        self.assertFalse(self.root.jobs)
+        config['theme'] = 'light'  # то же значение - записи нет
+        self.assertFalse(self.root.jobs)
+        for theme in ('dark', 'light', 'dark'):
+            config['theme'] = theme
+        self.assertEqual(len(self.root.jobs), 1)
+        self.assertEqual(self.read_config()['theme'], 'light')
+        self.root.run()
+        self.assertEqual(self.read_config()['theme'], 'dark')
+        self.assertFalse(config.dirty)
+
+    def test_flush_writes_now_and_cancels_timer(self):
+        config = self.store()
+        config['font_size'] = 14
+        config.flush()
+        self.assertFalse(self.root.jobs)
+        self.assertEqual(self.read_config()['font_size'], 14)
+
+
+if __name__ == '__main__':
+    unittest.main()
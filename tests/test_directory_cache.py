@@ -0,0 +1,48 @@
+import os
+import unittest
+
+from support import AppTestCase
+
+# Списки папок для боковой панели
+
+
+class DirectoryCacheTests(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join('root', 'Beta'))
+        os.makedirs(os.path.join('root', 'alpha'))
+        self.write_bytes(os.path.join('root', 'b.txt'), b'12345')
+        self.write_bytes(os.path.join('root', 'A.txt'), b'')
+
+    def touch_dir(self, path, ns):
+        # mtime папки грубый - задаём его явно
+        os.utime(path, ns=(ns, ns))
+
+    def test_scan_lists_folders_first(self):
+        self.assertEqual(self.app.scan_directory('root'), [
+            ('alpha', True, None), ('Beta', True, None), ('A.txt', False, 0), ('b.txt', False, 5)
+        ])
+
+    def test_listing_is_reused_until_mtime_changes(self):
+        cache = self.app.DirectoryCache()
+        self.touch_dir('root', 10 ** 18)
+        mtime, entries = cache.listing('root')
+        self.write_bytes(os.path.join('root', 'c.txt'), b'')
+        self.touch_dir('root', 10 ** 18)
+        self.assertIs(cache.listing('root')[1], entries)  # mtime прежний - список из кэша
+        self.touch_dir('root', 10 ** 18 + 1)
+        mtime, entries = cache.listing('root')
+        self.assertEqual(mtime, 10 ** 18 + 1)
+        self.assertIn(('c.txt', False, 0), entries)
+
+    def test_oldest_listing_is_dropped(self):
+        cache = self.app.DirectoryCache(size=2)
+        for name in ('alpha', 'Beta'):
+            cache.listing(os.path.join('root', name))
+        cache.listing(os.path.join('root', 'alpha'))  # alpha использована последней
+        cache.listing('root')
+        self.assertEqual(list(cache.listings), [os.path.join('root', 'alpha'), 'root'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import re
+import random
+import unittest
+
+from support import AppTestCase
+
+# История правок: разбиение крупных замен, склейка набора, отмена и повтор
+
+
+class FakeText:
+    # Строка с индексами tk.Text: 'строка.столбец' и 'строка.столбец+Nc'
+    def __init__(self, text):
+        self.s = text
+
+    def offset(self, index):
+        match = re.fullmatch(r'(\d+)\.(\d+)(?:\+(\d+)c)?', index)
+        line, col, extra = int(match[1]), int(match[2]), int(match[3] or 0)
+        return sum(len(part) + 1 for part in self.s.split('\n')[:line - 1]) + col + extra
+
+    def index(self, index):
+        offset = min(self.offset(index), len(self.s))
+        before = self.s[:offset]
+        return f"{before.count(chr(10)) + 1}.{offset - before.rfind(chr(10)) - 1}"
+
+    def get(self, start, end):
+        return self.s[self.offset(start):self.offset(end)]
+
+    def edit(self, index, old, new):
+        # Возвращает правку в том виде, в каком её записывает history_edits
+        start = self.offset(index)
+        assert self.s[start:start + len(old)] == old
+        self.s = self.s[:start] + new + self.s[start + len(old):]
+        return index, old, new
+
+
+def step_history(text, history, redo=False):
+    # Повторяет FileManagerApp.step_history на FakeText
+    group = history.pop(redo)
+    if not group:
+        return False
+    inverse = []
+    for index, replacement, length in reversed(group):
+        start = text.index(index)
+        end = f"{start}+{length}c"
+        inverse.append([start, text.get(start, end), len(replacement)])
+        text.s = text.s[:text.offset(start)] + replacement + text.s[text.offset(end):]
+    history.push(inverse, not redo)
+    return True
+
+
+class EditHistoryTests(AppTestCase):
+    def record(self, history, edits, now):
+        history.record(edits, now)
+        history.group_open = False  # конец события Tk
+
+    def test_split_keeps_only_changed_lines(self):
+        self.patch('UNDO_DIFF_MIN_CHARS', 10)
+        old = ''.join(f"line {i} abc\n" for i in range(100))
+        new = old.replace('line 10 abc', 'line 10 ABC').replace('line 70 abc', 'line 70 ABC')
+        group = self.app.EditHistory.split('1.0', old, new)
+        self.assertEqual([text for _, text, _ in group], ['line 10 abc\n', 'line 70 abc\n'])
+        self.assertEqual(self.app.EditHistory.split('1.0', old, old), [])
+
+    def test_split_stores_middle_when_line_count_changes(self):
+        self.patch('UNDO_DIFF_MIN_CHARS', 10)
+        old = 'head\n' * 20 + 'a\nb\n' + 'tail\n' * 20
+        new = 'head\n' * 20 + 'a b c\n' + 'tail\n' * 20
+        self.assertEqual(self.app.EditHistory.split('1.0', old, new), [['1.0+100c', 'a\nb\n', 6]])
+
+    def test_random_edits_undo_and_redo(self):
+        self.patch('UNDO_DIFF_MIN_CHARS', 50)
+        rng = random.Random(1)
+        base = '\n'.join(f"line {i} abc" for i in range(40))
+        text = FakeText(base)
+        history = self.app.EditHistory(10 ** 9)
+        states = [base]
+        for k in range(80):
+            size = len(text.s)
+            roll = rng.random()
+            if roll < 0.4:
+                index = text.index(f"1.0+{rng.randrange(size + 1)}c")
+                edit = text.edit(index, '', rng.choice(['x', 'yz\n', 'hello']))
+            elif roll < 0.7 and size:
+                start = rng.randrange(size)
+                index = text.index(f"1.0+{start}c")
+                edit = text.edit(index, text.s[start:start + rng.randrange(1, 10)], '')
+            else:
+                edit = text.edit('1.0', text.s, text.s.replace('abc', 'ABC', 3))
+            self.record(history, [edit], k * 10.0)
+            if text.s != states[-1]:
+                states.append(text.s)
+        for state in reversed(states[:-1]):
+            self.assertTrue(step_history(text, history))
+            self.assertEqual(text.s, state)
+        self.assertFalse(step_history(text, history))
+        for state in states[1:]:
+            self.assertTrue(step_history(text, history, redo=True))
+            self.assertEqual(text.s, state)
+
+    def test_typing_coalesces(self):
+        text = FakeText('ab')
+        history = self.app.EditHistory(10 ** 9)
+        for i, char in enumerate('cde'):
+            self.record(history, [text.edit(f'1.{2 + i}', '', char)], i * 0.1)
+        self.record(history, [text.edit('1.4', 'e', '')], 0.4)
+        self.assertEqual(len(history.undo_stack), 2)
+        self.assertTrue(step_history(text, history))
+        self.assertTrue(step_history(text, history))
+        self.assertEqual(text.s, 'ab')
+
+    def test_noop_replace_does_not_push_group(self):
+        history = self.app.EditHistory(10 ** 9)
+        self.record(history, [('1.0', 'same', 'same')], 0.0)
+        self.assertEqual(len(history.undo_stack), 0)
+        self.assertIsNone(history.pop())
+
+    def test_limit_drops_oldest_groups(self):
+        history = self.app.EditHistory(2000)
+        for i in range(50):
+            self.record(history, [('1.0', 'q' * 100, '')], i * 10.0)
+        self.assertLessEqual(history.size, 2000)
+        self.assertLess(len(history.undo_stack), 50)
+
+    def test_dump_load_checks_file_stat(self):
+        history = self.app.EditHistory(10 ** 9)
+        self.record(history, [('1.0', '', 'hello')], 0.0)
+        data = history.dump((5, 7))
+        loaded = self.app.EditHistory(10 ** 9)
+        self.assertFalse(loaded.load(data, (5, 8)))
+        self.assertTrue(loaded.load(data, (5, 7)))
+        self.assertEqual(list(loaded.undo_stack), list(history.undo_stack))
+        self.assertEqual(loaded.size, history.size)
+
+
+if __name__ == '__main__':
+    unittest.main()
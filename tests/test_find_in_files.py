@@ -0,0 +1,76 @@
+import os
+import re
+import threading
+import types
+import unittest
+
+from support import AppTestCase
+
+# Поиск по файлам папки без окна: шаблон, поиск в файле, обход папки
+
+
+class FindInFilesTests(AppTestCase):
+    def find(self, path, text, match_case=False):
+        return self.app.find_in_file(path, re.compile(self.app.search_pattern(text, match_case)))
+
+    def test_pattern_ignores_case_for_cyrillic(self):
+        regex = re.compile(self.app.search_pattern('Кот.', False))
+        self.assertTrue(regex.search('большой КОТ.'.encode('utf-8')))
+        self.assertFalse(regex.search('кото'.encode('utf-8')))  # точка - не шаблон
+        self.assertIsNone(re.compile(self.app.search_pattern('Кот', True)).search('кот'.encode('utf-8')))
+
+    def test_one_hit_per_line_with_line_numbers(self):
+        self.write_bytes('a.txt', 'один кот\nнет\nкот и кот\n  КОТ в конце'.encode('utf-8'))
+        self.assertEqual(self.find('a.txt', 'кот'), [
+            ('a.txt', 1, 'один кот'), ('a.txt', 3, 'кот и кот'), ('a.txt', 4, 'КОТ в конце')
+        ])
+
+    def test_long_lines_are_cut(self):
+        self.patch('FIND_LINE_CHARS', 10)
+        self.write_bytes('a.txt', b'x' * 100 + b'needle' + b'\n')
+        (_, line, text), = self.find('a.txt', 'needle')
+        self.assertEqual((line, text), (1, 'x' * 10))
+
+    def test_hits_per_file_are_limited(self):
+        self.patch('FIND_MAX_HITS_PER_FILE', 3)
+        self.write_bytes('a.txt', b'hit\n' * 10)
+        self.assertEqual(len(self.find('a.txt', 'hit')), 3)
+
+    def test_binary_empty_and_missing_files_are_skipped(self):
+        self.write_bytes('bin.dat', b'hit\0hit')
+        self.write_bytes('empty.txt', b'')
+        for path in ('bin.dat', 'empty.txt', 'missing.txt'):
+            self.assertEqual(self.find(path, 'hit'), [])
+
+    def test_folder_is_walked_in_batches(self):
+        self.patch('FIND_TASK_FILES', 2)
+        os.makedirs(os.path.join('root', 'sub'))
+        names = ['a.txt', 'b.txt', 'c.txt', os.path.join('sub', 'd.txt')]
+        for name in names:
+            self.write_bytes(os.path.join('root', name), b'hit\n')
+        batches = list(self.app.iter_file_batches('root', threading.Event()))
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+        self.assertEqual(sorted(path for batch in batches for path in batch),
+                         sorted(os.path.join('root', name) for name in names))
+        hits, files = self.app.find_in_files(batches[0], self.app.search_pattern('HIT', False))
+        self.assertEqual((len(hits), files), (2, 2))
+
+    def test_results_stop_at_limit(self):
+        self.patch('FIND_MAX_RESULTS', 5)
+        rows = []
+        finder = types.SimpleNamespace(
+            search_id=1, found=0, files=0, cancel=threading.Event(),
+            win=types.SimpleNamespace(winfo_exists=lambda: True),
+            tree=types.SimpleNamespace(insert=lambda parent, index, values: rows.append(values)),
+            update_status=lambda: None
+        )
+        hits = [('a.txt', line, 'hit') for line in range(1, 4)]
+        for _ in range(3):  # пачки продолжают приходить и после того, как лимит набран
+            self.app.FindInFiles.on_results(finder, 1, hits, 10)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual((finder.found, finder.files), (5, 30))
+        self.assertTrue(finder.cancel.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
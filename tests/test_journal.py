@@ -0,0 +1,69 @@
+import os
+import unittest
+
+from support import AppTestCase
+
+# Журнал правок для восстановления после сбоя
+
+
+class JournalTests(AppTestCase):
+    def test_appends_ops_after_file_header(self):
+        with open('doc.txt', 'w', encoding='utf-8') as f:
+            f.write('hello')
+        st = os.stat('doc.txt')
+        journal = self.app.Journal('j.log', 'doc.txt', 'doc.txt')
+        self.assertIsNone(journal.take(lambda: self.fail('no snapshot expected'), None))
+        journal.record(['i', '1.5', ' world'])
+        append, content = journal.take(lambda: self.fail('no snapshot expected'), (st.st_size, st.st_mtime_ns))
+        self.assertFalse(append)
+        with open('j.log', 'w', encoding='utf-8') as f:
+            f.write(content)
+        journal.record(['d', '1.0', '1.1'])
+        append, content = journal.take(lambda: self.fail('no snapshot expected'), None)
+        self.assertTrue(append)
+        with open('j.log', 'a', encoding='utf-8') as f:
+            f.write(content + '["i", "1.')  # запись оборвалась посреди строки
+        header, snapshot, ops = self.app.read_journal('j.log')
+        self.assertEqual(header['base'], 'file')
+        self.assertIsNone(snapshot)
+        self.assertEqual(ops, [['i', '1.5', ' world'], ['d', '1.0', '1.1']])
+        self.assertEqual(self.app.journal_base_text(header, snapshot), 'hello')
+        with open('doc.txt', 'a', encoding='utf-8') as f:
+            f.write('!')
+        with self.assertRaises(ValueError):
+            self.app.journal_base_text(header, snapshot)
+
+    def test_compacts_to_snapshot(self):
+        self.patch('JOURNAL_COMPACT_BYTES', 50)
+        journal = self.app.Journal('j.log')
+        journal.record(['i', '1.0', 'x' * 100])
+        append, content = journal.take(lambda: 'snapshot text', None)
+        self.assertFalse(append)
+        with open('j.log', 'w', encoding='utf-8') as f:
+            f.write(content)
+        header, snapshot, ops = self.app.read_journal('j.log')
+        self.assertEqual((header['base'], snapshot, ops), ('snapshot', 'snapshot text', []))
+
+    def test_file_base_still_being_written_forces_snapshot(self):
+        journal = self.app.Journal('j.log', 'doc.txt', 'doc.txt')
+        journal.record(['i', '1.0', 'x'])
+        append, content = journal.take(lambda: 'x', None)
+        self.assertFalse(append)
+        self.assertEqual(content.splitlines()[1], '"x"')
+
+    def test_claim_session_only_after_owner_exits(self):
+        os.makedirs(self.app.JOURNAL_FOLDER)
+        lock_path = os.path.join(self.app.JOURNAL_FOLDER, 'other.lck')
+        self.assertIsNone(self.app.claim_journal_session('other'))
+        owner = open(lock_path, 'w+b')
+        self.assertTrue(self.app.lock_file(owner))
+        self.assertIs(self.app.claim_journal_session('other'), False)
+        owner.close()  # владелец завершился - ОС сняла блокировку
+        claimed = self.app.claim_journal_session('other')
+        self.addCleanup(claimed.close)
+        self.assertTrue(claimed)
+        self.assertIs(self.app.claim_journal_session('other'), False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import mmap
+import threading
+import unittest
+
+from support import AppTestCase
+
+
+class LineIndexTests(AppTestCase):
+    def build(self, path):
+        index = self.app.LineIndex(path)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index.build(mm, threading.Event())
+        return index
+
+    def test_checkpoints_match_line_starts(self):
+        self.patch('INDEX_CHUNK_SIZE', 1000)  # границы кусков посреди строк
+        lines = [f"{i} " + 'x' * (i % 37) for i in range(1000)]
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        self.write_bytes('big.txt', data)
+        starts = [0] + [i + 1 for i, byte in enumerate(data[:-1]) if byte == ord('\n')]
+        index = self.build('big.txt')
+        self.assertTrue(index.complete)
+        self.assertEqual(index.line_count, len(lines))
+        step = self.app.INDEX_STEP
+        for line in (0, 1, step - 1, step, 5 * step + 3, len(lines) - 1):
+            number, offset = index.checkpoint_for_line(line)
+            self.assertEqual(number, line // step * step)
+            self.assertEqual(offset, starts[number])
+        number, offset = index.checkpoint_for_offset(starts[300] + 2)
+        self.assertEqual((number, offset), (300 // step * step, starts[300 // step * step]))
+
+    def test_no_trailing_newline(self):
+        self.write_bytes('big.txt', b'a\nb\nc')
+        self.assertEqual(self.build('big.txt').line_count, 3)
+
+    def test_cache_is_tied_to_file(self):
+        self.write_bytes('big.txt', b'a\n' * 500)
+        index = self.build('big.txt')
+        index.save_cache()
+        cached = self.app.LineIndex('big.txt')
+        self.assertTrue(cached.load_cache())
+        self.assertEqual((cached.line_count, list(cached.checkpoints)), (index.line_count, list(index.checkpoints)))
+        with open('big.txt', 'ab') as f:
+            f.write(b'b\n')
+        self.assertFalse(self.app.LineIndex('big.txt').load_cache())
+
+
+if __name__ == '__main__':
+    unittest.main()
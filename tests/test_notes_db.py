@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+import unittest
+
+from support import AppTestCase
+
+# База заметок V1.1: миграции схемы, поиск, импорт и экспорт
+
+
+class NotesDBTests(AppTestCase):
+    version = 'V1.1'
+
+    def open_db(self, codec='zlib'):
+        # Поток записи открывает базу сам и может не успеть до конца теста
+        db = self.app.NotesDB(os.path.abspath('notes.db'), codec)
+        self.addCleanup(db.close)
+        return db
+
+    def test_migrates_old_database(self):
+        conn = sqlite3.connect('notes.db')
+        conn.execute(self.app.SQL_CREATE_NOTES)
+        conn.executemany('INSERT INTO notes (content) VALUES (?)', [('old cat note',), ('old dog note',)])
+        conn.commit()
+        conn.close()
+        db = self.open_db()
+        self.assertEqual(db.query(self.app.SQL_SCHEMA_VERSION).fetchone()[0], self.app.SCHEMA_VERSION)
+        if not db.fts:
+            self.skipTest('SQLite without FTS5')
+        self.assertEqual([row[0] for row in db.search('cat')], [1])
+        hashes = db.query('SELECT content_hash FROM notes ORDER BY id').fetchall()
+        self.assertEqual(hashes, [(self.app.note_hash('old cat note'),), (self.app.note_hash('old dog note'),)])
+
+    def test_concurrent_open_migrates_once(self):
+        # Несколько копий приложения открывают старую базу одновременно
+        conn = sqlite3.connect('notes.db')
+        conn.execute(self.app.SQL_CREATE_NOTES)
+        conn.executemany('INSERT INTO notes (content) VALUES (?)', [(f'note {i}',) for i in range(2000)])
+        conn.commit()
+        conn.close()
+        start = threading.Barrier(4)
+        errors = []
+
+        def open_db():
+            start.wait()
+            try:
+                self.open_db()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=open_db) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        db = self.open_db()
+        self.assertEqual(db.query(self.app.SQL_SCHEMA_VERSION).fetchone()[0], self.app.SCHEMA_VERSION)
+        self.assertEqual(db.query('SELECT count(*) FROM notes WHERE content_hash IS NULL').fetchone()[0], 0)
+        if db.fts:
+            self.assertEqual([row[0] for row in db.search('1999')], [2000])
+
+    def test_search_finds_words_and_prefixes(self):
+        db = self.open_db()
+        db.run(lambda conn: db.insert_notes(conn, [
+            ('купить молоко', 'h1'), ('молоток в гараже', 'h2'), ('quote "like" this', 'h3')
+        ]))
+        if not db.fts:
+            self.skipTest('SQLite without FTS5')
+        self.assertEqual([row[0] for row in db.search('купить молоко')], [1])
+        self.assertEqual(sorted(row[0] for row in db.search('мол')), [1, 2])
+        self.assertEqual([row[0] for row in db.search('"like" NOT')], [])
+        self.assertEqual([row[0] for row in db.search('"like"')], [3])
+        self.assertEqual(db.search('   '), [])
+
+    def test_import_skips_duplicates_and_binary_files(self):
+        self.patch('IMPORT_BATCH_SIZE', 2)  # дубликаты и в одной пачке, и в разных
+        os.makedirs(os.path.join('in', 'sub'))
+        for name, data in [('a.txt', b'first'), ('b.txt', b'second'), ('c.txt', b'first'),
+                           (os.path.join('sub', 'd.txt'), b'second'), ('e.bin', b'\0\1\2'), ('f.txt', b'  \n')]:
+            self.write_bytes(os.path.join('in', name), data)
+        db = self.open_db()
+        stats = db.import_files('in', jobs=2)
+        self.assertEqual(stats, {'imported': 2, 'duplicates': 2, 'skipped': 2})
+        self.assertEqual(db.import_files('in'), {'imported': 0, 'duplicates': 4, 'skipped': 2})
+        self.assertEqual(sorted(row[0] for row in db.query('SELECT content FROM notes')), ['first', 'second'])
+
+    def test_export_writes_one_file_per_note(self):
+        self.patch('EXPORT_PAGE_SIZE', 2)
+        db = self.open_db()
+        notes = [f"note {i}" for i in range(5)]
+        db.run(lambda conn: db.insert_notes(conn, [(text, self.app.note_hash(text)) for text in notes]))
+        pages = []
+        self.assertEqual(db.export_notes('out', progress=pages.append, jobs=2), 5)
+        self.assertEqual(pages, [2, 4, 5])
+        files = sorted(os.listdir('out'))
+        self.assertEqual(files[0], 'note_00000001.txt')
+        with open(os.path.join('out', files[-1]), encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'note 4')
+
+    def test_compressed_notes_are_searchable_and_readable(self):
+        db = self.open_db()
+        long_note = 'длинная заметка про кота ' * 200
+        db.run(lambda conn: db.insert_notes(conn, [
+            ('short dog', 'h1'), (long_note, 'h2'), ('another dog', 'h3')
+        ]))
+        self.assertEqual(db.query('SELECT blob_hash FROM notes ORDER BY id').fetchall(), [(None,), ('h2',), (None,)])
+        self.assertEqual(db.query(self.app.SQL_NOTE_CONTENT, (2,)).fetchone()[0], long_note)
+        self.assertEqual([row[0] for page in db.iter_note_pages() for row in page], [1, 2, 3])
+        if db.fts:
+            self.assertEqual(sorted(row[0] for row in db.search('dog')), [1, 3])
+            self.assertEqual([row[0] for row in db.search('кота')], [2])
+
+    def test_schema_works_without_app_functions(self):
+        db = self.open_db()
+        db.run(lambda conn: db.insert_notes(conn, [('первая заметка ' * 200, 'h1')]))
+        conn = sqlite3.connect('notes.db')
+        self.addCleanup(conn.close)
+        conn.execute("INSERT INTO notes (content) VALUES ('plain sqlite note')")
+        conn.execute('UPDATE notes SET content = ? WHERE id = 2', ('edited sqlite note',))
+        conn.execute('DELETE FROM notes WHERE id = 1')
+        conn.commit()
+        if not db.fts:
+            return
+        self.assertEqual(conn.execute("SELECT rowid FROM notes_fts WHERE notes_fts MATCH 'edited'").fetchall(), [(2,)])
+        self.assertEqual(conn.execute("SELECT rowid FROM notes_fts WHERE notes_fts MATCH 'plain'").fetchall(), [])
+        conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('integrity-check')")
+        # Сжатая заметка удалена в обход приложения: её слова остались в индексе, но не в выдаче
+        self.assertEqual(db.search('первая'), [])
+
+    def test_index_keeps_no_copy_of_text(self):
+        db = self.open_db()
+        if not db.fts:
+            self.skipTest('SQLite without FTS5')
+        self.assertIsNone(db.query("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts_content'").fetchone())
+        db.run(lambda conn: db.insert_notes(conn, [('один два три', 'h1')]))
+        self.assertEqual(db.query('SELECT content FROM notes_fts').fetchall(), [(None,)])
+
+    def test_snippet_marks_found_words(self):
+        words = [self.app.fold_word(word) for word in ('КОТ', 'cafe', 'мол')]
+        text = 'Начало. ' + 'слово ' * 20 + 'Кот пьёт молоко в Café, а кот_2 - нет. ' + 'конец ' * 20
+        snippet = self.app.note_snippet(text, words, size=8)
+        self.assertEqual(snippet, '…слово слово «Кот» пьёт «молоко» в «Café», а…')
+        self.assertEqual(self.app.note_snippet('короткая заметка', words), 'короткая заметка')
+        self.assertEqual(self.app.note_snippet('...', words), '...')
+
+    def test_same_long_note_is_stored_once(self):
+        db = self.open_db()
+        text = 'повторяющийся текст ' * 100
+        db.run(lambda conn: db.insert_notes(conn, [(text, 'h1'), (text, 'h1')]))
+        count, size, stored = db.blob_stats()
+        self.assertEqual((count, size), (1, len(text.encode('utf-8'))))
+        self.assertLess(stored, size)
+        self.assertEqual(db.query(self.app.SQL_NOTE_CONTENT, (2,)).fetchone()[0], text)
+
+    def test_codec_none_keeps_text_in_notes(self):
+        db = self.open_db('none')
+        db.run(lambda conn: db.insert_notes(conn, [('x' * 1000, 'h1')]))
+        self.assertEqual(db.blob_stats()[0], 0)
+        self.assertEqual(db.query('SELECT content FROM notes').fetchone()[0], 'x' * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
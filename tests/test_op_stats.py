@@ -0,0 +1,52 @@
+import csv
+import json
+import unittest
+
+from support import AppTestCase
+
+# Замеры операций для --instrument
+
+
+class OpStatsTests(AppTestCase):
+    def filled(self, window=1000):
+        stats = self.app.OpStats(window)
+        for ms in range(1, 101):
+            stats.record('save', float(ms), nbytes=10, rows=1)
+        stats.record('open', 0.5, nbytes=1000)
+        return stats
+
+    def test_summary_percentiles_and_totals(self):
+        summary = self.filled().summary()
+        self.assertEqual(list(summary), ['open', 'save'])
+        save = summary['save']
+        self.assertEqual((save['count'], save['p50_ms'], save['p90_ms'], save['p99_ms'], save['max_ms']),
+                         (100, 50.0, 90.0, 99.0, 100.0))
+        self.assertEqual((save['bytes'], save['rows']), (1000, 100))
+        self.assertEqual(sum(bucket['count'] for bucket in save['histogram']), 100)
+        self.assertEqual(save['histogram'][0], {'le_ms': 1, 'count': 1})
+        self.assertEqual(save['histogram'][-1], {'le_ms': None, 'count': 0})
+        self.assertEqual(summary['open']['histogram'][0]['count'], 1)
+
+    def test_window_keeps_latest_samples(self):
+        stats = self.filled(window=10)
+        self.assertEqual(stats.summary()['save']['count'], 10)
+        self.assertEqual(stats.summary()['save']['p50_ms'], 95.0)
+        self.assertEqual(stats.last, ('open', 0.5, 1000, 0))
+
+    def test_dump_json_and_csv(self):
+        stats = self.filled()
+        stats.dump('stats.json')
+        with open('stats.json', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), stats.summary())
+        stats.dump('stats.csv')
+        with open('stats.csv', encoding='utf-8', newline='') as f:
+            rows = list(csv.reader(f))
+        buckets = len(self.app.STATS_BUCKETS_MS) + 1
+        self.assertEqual(rows[0][:3], ['operation', 'le_ms', 'count'])
+        self.assertEqual(len(rows), 1 + 2 * buckets)
+        self.assertEqual(rows[buckets + 1][:3], ['save', '1', '1'])
+        self.assertEqual(rows[-1][:3], ['save', '', '0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import queue
+import unittest
+
+from support import AppTestCase
+
+# Атомарная запись и фоновый поток сохранения
+
+
+class ReplaceAtomicTests(AppTestCase):
+    def test_keeps_mode_of_existing_file(self):
+        self.write_bytes('doc.txt', b'old')
+        os.chmod('doc.txt', 0o640)
+        self.app.write_atomic('doc.txt', 'new')
+        self.assertEqual(self.read_bytes('doc.txt'), b'new')
+        if os.name != 'nt':
+            self.assertEqual(os.stat('doc.txt').st_mode & 0o777, 0o640)
+
+    def test_new_file_mode_follows_umask(self):
+        self.app.write_atomic('doc.txt', 'new')
+        if os.name != 'nt':
+            self.assertEqual(os.stat('doc.txt').st_mode & 0o777, 0o666 & ~self.app.UMASK)
+
+    def test_failed_write_leaves_old_file(self):
+        self.write_bytes('doc.txt', b'old')
+
+        def write(f):
+            f.write(b'half')
+            raise OSError('disk full')
+
+        with self.assertRaises(OSError):
+            self.app.replace_atomic('doc.txt', write)
+        self.assertEqual(self.read_bytes('doc.txt'), b'old')
+        self.assertEqual(os.listdir('.'), ['doc.txt'])
+
+    @unittest.skipUnless(hasattr(os, 'symlink') and os.name != 'nt', 'symlinks need privileges on Windows')
+    def test_symlink_stays_a_link(self):
+        os.mkdir('real')
+        self.write_bytes(os.path.join('real', 'doc.txt'), b'old')
+        os.symlink(os.path.join('real', 'doc.txt'), 'link.txt')
+        self.app.write_atomic('link.txt', 'new')
+        self.assertTrue(os.path.islink('link.txt'))
+        self.assertEqual(self.read_bytes(os.path.join('real', 'doc.txt')), b'new')
+        self.assertEqual(sorted(os.listdir('real')), ['doc.txt'])
+
+    def test_hard_links_see_new_text(self):
+        self.write_bytes('doc.txt', b'old text')
+        os.link('doc.txt', 'other.txt')
+        self.app.write_atomic('doc.txt', 'new')
+        self.assertEqual(self.read_bytes('other.txt'), b'new')
+        self.assertEqual(os.stat('doc.txt').st_ino, os.stat('other.txt').st_ino)
+        self.assertEqual(sorted(os.listdir('.')), ['doc.txt', 'other.txt'])
+
+    def test_keeps_format(self):
+        fmt = self.app.TextFormat('utf-16-le', bom=True, newline='\r\n')
+        self.app.write_atomic('doc.txt', 'a\nb', fmt)
+        self.assertEqual(self.read_bytes('doc.txt'), '\ufeffa\r\nb'.encode('utf-16-le'))
+
+
+class SaveWorkerTests(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = self.app.SaveWorker()
+        self.done = queue.Queue()
+        self.written = []
+
+    def callback(self, path, error, written):
+        self.written.append(written)
+        self.done.put((path, error))
+
+    def wait_done(self, count=1):
+        # wait_idle не ждёт callback-ов: они вызываются уже после снятия busy
+        return [self.done.get(timeout=5) for _ in range(count)]
+
+    def test_writes_file_in_background(self):
+        self.worker.submit('doc.txt', 'hello', self.callback)
+        self.assertEqual(self.wait_done(), [('doc.txt', None)])
+        self.assertEqual(self.read_bytes('doc.txt'), b'hello')
+        self.assertFalse(self.worker.changed_on_disk('doc.txt'))
+
+    def test_pending_write_is_replaced_by_newer(self):
+        with self.worker.cond:  # поток записи не заберёт задачу, пока очередь заполняется
+            for text in ('one', 'two', 'three'):
+                self.worker.submit('doc.txt', text, self.callback)
+        self.assertTrue(self.worker.wait_idle(5))
+        self.assertEqual(self.read_bytes('doc.txt'), b'three')
+
+    def test_error_is_passed_to_callback(self):
+        self.worker.submit(os.path.join('missing', 'doc.txt'), 'hello', self.callback)
+        (_, error), = self.wait_done()
+        self.assertIsInstance(error, OSError)
+
+    def test_append_writes_only_tail(self):
+        self.write_bytes('doc.txt', b'one\n')
+        self.worker.remember('doc.txt')
+        self.worker.submit('doc.txt', 'two\n', self.callback, append=True)
+        self.assertEqual(self.wait_done(), [('doc.txt', None)])
+        self.assertEqual(self.read_bytes('doc.txt'), b'one\ntwo\n')
+        self.assertFalse(self.worker.changed_on_disk('doc.txt'))
+
+    def test_append_joins_pending_write(self):
+        with self.worker.cond:
+            self.worker.submit('doc.txt', 'one\n', self.callback)
+            self.worker.submit('doc.txt', 'two\n', self.callback, append=True)
+        self.assertTrue(self.worker.wait_idle(5))
+        self.assertEqual(self.read_bytes('doc.txt'), b'one\ntwo\n')
+
+    def test_append_to_changed_file_fails(self):
+        self.write_bytes('doc.txt', b'one\n')
+        self.worker.remember('doc.txt')
+        self.write_bytes('doc.txt', b'changed elsewhere\n')
+        self.assertTrue(self.worker.changed_on_disk('doc.txt'))
+        self.worker.submit('doc.txt', 'two\n', self.callback, append=True)
+        (_, error), = self.wait_done()
+        self.assertIsInstance(error, self.app.StaleFileError)
+        self.assertEqual(self.read_bytes('doc.txt'), b'changed elsewhere\n')
+
+    def test_every_callback_of_merged_jobs_is_called(self):
+        # По callback-ам вкладка считает незавершённые сохранения - ни один не должен потеряться
+        self.write_bytes('doc.txt', b'')
+        self.worker.remember('doc.txt')
+        with self.worker.cond:
+            self.worker.submit('doc.txt', 'a', self.callback, append=True)
+            self.worker.submit('doc.txt', 'b', self.callback, append=True)
+            self.worker.submit('doc.txt', 'full', self.callback)
+            self.worker.remove('doc.txt', self.callback)
+        self.assertEqual(self.wait_done(4), [('doc.txt', None)] * 4)
+        self.assertFalse(os.path.exists('doc.txt'))
+        self.assertTrue(self.done.empty())
+
+    def test_written_bytes_are_reported_once_per_job(self):
+        self.write_bytes('doc.txt', b'0123')
+        self.worker.remember('doc.txt')
+        with self.worker.cond:
+            for text in ('ab', 'cd', 'ef'):
+                self.worker.submit('doc.txt', text, self.callback, append=True)
+        self.wait_done(3)
+        self.assertEqual(self.written, [None, None, 6])  # одна запись на диск - один размер
+        self.worker.submit('doc.txt', 'Привет', self.callback)
+        self.wait_done()
+        self.assertEqual(self.written[-1], len('Привет'.encode('utf-8')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import codecs
+import queue
+import threading
+import unittest
+
+from support import AppTestCase
+
+# Определение кодировки и переводов строк: файл сохраняется в том виде, в каком открыт
+
+TEXT = 'Привет, мир\nвторая строка\nThird line'
+
+
+class TextFormatTests(AppTestCase):
+    def round_trip(self, fmt, text=TEXT):
+        # Записываем в формате fmt, определяем формат по началу файла и читаем обратно
+        self.app.write_atomic('doc.txt', text, fmt)
+        data = self.read_bytes('doc.txt')
+        found = self.app.detect_format(data[:self.app.ENCODING_SNIFF_SIZE])
+        self.assertEqual((found.encoding, found.bom, found.newline), (fmt.encoding, fmt.bom, fmt.newline))
+        self.assertEqual(self.app.read_text('doc.txt', found), text)
+        self.app.write_atomic('copy.txt', text, found)
+        self.assertEqual(self.read_bytes('copy.txt'), data)
+
+    def test_round_trips(self):
+        for encoding, bom, newline in [
+            ('utf-8', False, '\n'), ('utf-8', True, '\r\n'), ('cp1251', False, '\r\n'),
+            ('utf-16-le', True, '\n'), ('utf-16-be', True, '\r'), ('utf-32-le', True, '\n'),
+        ]:
+            with self.subTest(encoding=encoding, bom=bom, newline=newline):
+                self.round_trip(self.app.TextFormat(encoding, bom, newline))
+
+    def test_utf16_without_bom(self):
+        # Без BOM UTF-16 узнаётся по нулевым байтам латиницы - в тексте её должно быть много
+        text = 'Hello, мир\nsecond line 12345\nthird line'
+        for encoding, newline in [('utf-16-le', '\r\n'), ('utf-16-be', '\n')]:
+            with self.subTest(encoding=encoding):
+                self.round_trip(self.app.TextFormat(encoding, False, newline), text)
+
+    def test_file_without_newlines(self):
+        self.round_trip(self.app.TextFormat('utf-8', False, None), 'одна строка')
+
+    def test_sample_cut_inside_character(self):
+        head = ('ы' * 10).encode('utf-8')[:-1]
+        self.assertEqual(self.app.guess_encoding(head), 'utf-8')
+
+    def test_fallback_encodings(self):
+        self.assertEqual(self.app.guess_encoding('Привет'.encode('cp1251')), 'cp1251')
+        self.assertEqual(self.app.guess_encoding(b'\x98\x81'), 'latin-1')  # 0x98 в cp1251 не занят
+        self.assertEqual(self.app.guess_encoding(codecs.BOM_UTF8[:2] + b'\0\1'), 'cp1251')
+
+    def test_detect_newline(self):
+        for text, newline in [('a\nb\r\n', '\n'), ('a\r\nb\n', '\r\n'), ('a\rb', '\r'), ('a\r', '\r\n'), ('ab', None)]:
+            with self.subTest(text=text):
+                self.assertEqual(self.app.detect_newline(text), newline)
+
+
+    def load(self, data):
+        # Поток чтения открываемого файла: (формат, текст для tk.Text)
+        self.write_bytes('doc.txt', data)
+        chunks = queue.Queue()
+        self.app.FileManagerBase._load_worker('doc.txt', len(data), chunks, threading.Event())
+        items = [chunks.get_nowait() for _ in range(chunks.qsize())]
+        self.assertEqual(items[-1][0], 'done')
+        return items[-1][1], ''.join(payload for kind, payload, _ in items if kind == 'chunk')
+
+    def test_mixed_newlines_are_reported(self):
+        fmt, text = self.load(b'one\r\ntwo\nthree\r\n')
+        self.assertEqual(text, 'one\ntwo\nthree\n')
+        self.assertEqual((fmt.newline, fmt.mixed), ('\r\n', True))
+        fmt, _ = self.load(b'one\r\ntwo\r\n')
+        self.assertEqual((fmt.newline, fmt.mixed), ('\r\n', False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import io
+import os
+import codecs
+import types
+import unittest
+
+from support import AppTestCase
+
+# Потоковое перекодирование для командной строки
+
+
+class TranscodeTests(AppTestCase):
+    def transcode(self, data, encoding, **kwargs):
+        out = io.BytesIO()
+        source = self.app.transcode(io.BytesIO(data), out, encoding, **kwargs)
+        return source, out.getvalue()
+
+    def test_bom_dropped_for_non_unicode_target(self):
+        source, data = self.transcode(codecs.BOM_UTF8 + 'Привет'.encode('utf-8'), 'cp1251')
+        self.assertTrue(source.bom)
+        self.assertEqual(data, 'Привет'.encode('cp1251'))
+        _, data = self.transcode('Привет'.encode('utf-8'), 'cp1251', bom=True)
+        self.assertEqual(data, 'Привет'.encode('cp1251'))
+
+    def test_bom_kept_for_unicode_targets(self):
+        _, data = self.transcode(codecs.BOM_UTF8 + b'abc', 'utf-16-be')
+        self.assertEqual(data, codecs.BOM_UTF16_BE + 'abc'.encode('utf-16-be'))
+        _, data = self.transcode(b'abc', 'utf-16')
+        self.assertEqual(data, codecs.BOM_UTF16_LE + 'abc'.encode('utf-16-le'))
+        _, data = self.transcode(codecs.BOM_UTF8 + b'abc', 'utf-8', bom=False)
+        self.assertEqual(data, b'abc')
+
+    def test_newlines_across_chunks(self):
+        self.patch('ENCODING_SNIFF_SIZE', 7)
+        self.patch('LOAD_CHUNK_SIZE', 3)
+        text = 'один\r\nдва\rтри\nчетыре'
+        source, data = self.transcode(text.encode('cp1251'), 'utf-8', newline='\r\n', source_encoding='cp1251')
+        self.assertEqual(source.encoding, 'cp1251')
+        self.assertEqual(data.decode('utf-8'), 'один\r\nдва\r\nтри\r\nчетыре')
+        _, data = self.transcode(text.encode('utf-8'), 'utf-8')
+        self.assertEqual(data.decode('utf-8'), text)
+
+    def test_transcode_file_mode_follows_umask(self):
+        with open('src.txt', 'wb') as f:
+            f.write(b'abc')
+        self.app.transcode_file('src.txt', 'dst.txt', 'utf-16')
+        with open('dst.txt', 'rb') as f:
+            self.assertEqual(f.read(), codecs.BOM_UTF16_LE + 'abc'.encode('utf-16-le'))
+        if os.name != 'nt':
+            self.assertEqual(os.stat('dst.txt').st_mode & 0o777, 0o666 & ~self.app.UMASK)
+
+    def cli(self, sources, output, **options):
+        args = types.SimpleNamespace(
+            sources=sources, output=output, to='utf-8', bom='keep', newline='lf', source_encoding=None, jobs=1
+        )
+        vars(args).update(options)
+        return self.app.cli_transcode(args)
+
+    def test_cli_converts_several_files_into_folder(self):
+        self.write_bytes('a.txt', 'один\r\n'.encode('cp1251'))
+        self.write_bytes('b.txt', codecs.BOM_UTF8 + 'два\r'.encode('utf-8'))
+        self.assertEqual(self.cli(['a.txt', 'b.txt', 'missing.txt'], 'out'), 1)  # ошибка одного файла не прерывает остальные
+        self.assertEqual(self.read_bytes(os.path.join('out', 'a.txt')), 'один\n'.encode('utf-8'))
+        self.assertEqual(self.read_bytes(os.path.join('out', 'b.txt')), codecs.BOM_UTF8 + 'два\n'.encode('utf-8'))
+        self.assertEqual(self.cli(['a.txt'], 'c.txt', to='utf-16-le', bom='yes', newline='keep'), 0)
+        self.assertEqual(self.read_bytes('c.txt'), codecs.BOM_UTF16_LE + 'один\r\n'.encode('utf-16-le'))
+
+    def test_cli_rejects_stdin_among_several_sources(self):
+        self.assertEqual(self.cli(['-', 'a.txt'], 'out'), 2)
+        self.assertFalse(os.path.exists('out'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import queue
+import types
+import unittest
+
+from support import AppTestCase
+
+# Очередь вызовов из фоновых потоков в поток интерфейса
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+        self.errors = []
+
+    def after(self, ms, func):
+        self.scheduled.append(func)
+
+    def report_callback_exception(self, exc, value, tb):
+        self.errors.append(value)
+
+
+class UICallsTests(AppTestCase):
+    def test_failing_call_does_not_stop_the_queue(self):
+        app = types.SimpleNamespace(root=FakeRoot(), ui_calls=queue.Queue())
+        app.process_ui_calls = lambda: None
+        done = []
+
+        def fail():
+            raise RuntimeError('broken callback')
+
+        for func, args in [(fail, ()), (done.append, (1,)), (done.append, (2,))]:
+            app.ui_calls.put((func, args))
+        self.app.FileManagerBase.process_ui_calls(app)
+        self.assertEqual(done, [1, 2])
+        self.assertEqual([str(error) for error in app.root.errors], ['broken callback'])
+        self.assertEqual(app.root.scheduled, [app.process_ui_calls])
+
+
+if __name__ == '__main__':
+    unittest.main()